@@ -0,0 +1,336 @@
+#Batch generation of power strips over a sweep of parameters
+
+#A sweep is either the Cartesian product of lists of values, or the rows of a CSV file
+#Jobs are spread over a pool of processes, each one loading the plug templates once
+#Every job writes its own files, named after its parameters, so jobs never overwrite each other
+
+#Usage:
+#   python batch.py --plug-type European American --num-plugs 2 4 8 --output-dir out
+#   python batch.py --csv sweep.csv --output-dir out --workers 4
+#   python batch.py --num-plugs 4 --columns 2 4 8 --output-dir out             (grid layouts)
+
+import argparse
+import csv
+import itertools
+import operator
+import os
+import sys
+import time
+from contextlib import nullcontext
+
+from fit_check import check_fit
+from instrumentation import Recorder, recording, stage
+from mesh_generator import (PREVIEW_LOD, check_count, check_grid_parameters, check_strip_parameters,
+                            generate_bottom_enclousure, generate_grid_enclosure, generate_power_grid,
+                            generate_power_strip, plug_slots)
+from plug_registry import get_plug, plug_names
+from result_cache import shared_cache
+from template_cache import LOD_FACE_RATIOS, load_template
+
+#Parameters of a job, in the order used for naming the outputs
+PARAMETERS = ('plug_type', 'num_plugs', 'distance_between_plugs', 'lateral_gap', 'vertical_gap')
+
+#Values used for the parameters missing from a sweep
+DEFAULTS = {'plug_type': 'European', 'num_plugs': 2, 'distance_between_plugs': 5, 'lateral_gap': 5, 'vertical_gap': 5}
+
+#Optional parameters of grid layouts, num_plugs is then the number of rows
+GRID_PARAMETERS = ('columns', 'distance_between_columns')
+
+#Count of a job, from the text of a CSV or command line, or an integer of a JSON file
+#Like the generators, it must be a real integer: 5.0, '5.0' and true are refused
+def _count(value, label):
+    if isinstance(value, str):
+        try:
+            value = int(value)
+        except ValueError:
+            raise ValueError(f'Invalid {label}, must be an integer') from None
+    check_count(value, label)
+    return operator.index(value)
+
+#Convert the raw values of a job (from the command line, a CSV or a JSON file) to their types
+#and check them with the rules of the generators, so invalid jobs fail before any is run
+#plug_type can be a list with the plug type of every slot, name sets the name of the outputs
+#columns (and distance_between_columns) make a grid of num_plugs rows, see build_power_grid
+def normalize_job(job):
+    job = {**DEFAULTS, **{key: value for key, value in job.items() if value not in (None, '')}}
+    unknown = set(job) - set(PARAMETERS) - set(GRID_PARAMETERS) - {'name'}
+    if unknown:
+        raise ValueError(f'Unknown parameters: {", ".join(sorted(unknown))}')
+    plug_type = job['plug_type']
+    normalized = {'plug_type': str(plug_type) if isinstance(plug_type, str) else [str(name) for name in plug_type],
+                  'num_plugs': _count(job['num_plugs'], 'number of plugs')}
+    for key in PARAMETERS[2:]:
+        value = float(job[key])
+        normalized[key] = int(value) if value.is_integer() else value
+    if 'name' in job:
+        normalized['name'] = str(job['name'])
+        if not normalized['name'].strip('.') or any(separator in normalized['name'] for separator in '/\\'):
+            raise ValueError('Invalid name, it must be a file name without folders')
+
+    check_strip_parameters(*(normalized[key] for key in PARAMETERS[1:]))
+    for name in plug_slots(normalized['num_plugs'], normalized['plug_type'])[0]:
+        get_plug(name)
+
+    #Jobs without columns are plain strips, with the same names and outputs as before
+    columns = _count(job.get('columns', 1), 'number of columns')
+    if columns != 1 or 'distance_between_columns' in job:
+        if not isinstance(normalized['plug_type'], str):
+            raise ValueError('Invalid plug type, grids use a single plug type')
+        normalized['columns'] = columns
+        if 'distance_between_columns' in job:
+            value = float(job['distance_between_columns'])
+            normalized['distance_between_columns'] = int(value) if value.is_integer() else value
+        check_grid_parameters(normalized['num_plugs'], normalized['columns'],
+                              *(normalized[key] for key in PARAMETERS[2:]),
+                              normalized.get('distance_between_columns', normalized['distance_between_plugs']))
+    return normalized
+
+#Normalize raw jobs, as (jobs, results of the invalid jobs)
+#An invalid job becomes a failed result, like a job failing while it runs, so it does not stop the others
+def normalize_jobs(raw_jobs):
+    jobs = []
+    invalid = []
+    for number, raw in enumerate(raw_jobs, 1):
+        try:
+            jobs.append(normalize_job(raw))
+        except (TypeError, ValueError) as e:
+            invalid.append({'name': f'job {number}', 'job': raw, 'seconds': 0.0, 'error': f'Invalid job: {e}',
+                            'outputs': []})
+    return jobs, invalid
+
+#Jobs for every combination of the given values, see normalize_jobs
+#grid maps each parameter to a list of values
+def grid_jobs(grid):
+    keys = [key for key in PARAMETERS + GRID_PARAMETERS if key in grid]
+    return normalize_jobs(dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys)))
+
+#Jobs read from a CSV file, one per row, with the parameter names as header, see normalize_jobs
+def csv_jobs(file_path):
+    with open(file_path, newline='') as file:
+        return normalize_jobs(csv.DictReader(file))
+
+#Name of the outputs of a job, its name if it has one or else one built from its parameters
+#Mixed strips are named after their runs of plug types, like European4-American2
+def job_name(job):
+    if 'name' in job:
+        return job['name']
+    if isinstance(job['plug_type'], str):
+        plug_type = job['plug_type']
+    else:
+        runs = [(name, len(list(group))) for name, group in itertools.groupby(job['plug_type'])]
+        plug_type = '-'.join(f'{name}{length}' for name, length in runs)
+    plugs = f'{job["num_plugs"]}x{job["columns"]}p' if 'columns' in job else f'{job["num_plugs"]}p'
+    values = [plug_type, plugs] + [f'{prefix}{job[key]:g}' for prefix, key in zip(('d', 'l', 'v'), PARAMETERS[2:])]
+    if 'distance_between_columns' in job:
+        values.append(f'c{job["distance_between_columns"]:g}')
+    return '_'.join(values).replace(' ', '-')
+
+#Load the plug templates once in every worker
+def _init_worker():
+    for name in plug_names():
+        template = get_plug(name).model_path
+        if os.path.exists(template):
+            load_template(template)
+
+#Generate the top shell and the enclosure of one job
+#Errors are returned instead of raised, so a failing job does not stop the batch
+#With profile, the result holds the time of every stage of the generators
+#With validate, the result holds the mesh reports and an invalid mesh fails the job
+#With weld, coincident vertices are merged before writing
+#With thumbnail, a PNG preview of the top shell is rendered next to the outputs, with simplified plugs
+#lod is the level of detail of the plugs of the written top shells, 0 is the full model
+#With fit, the shell is checked against the enclosure first, a job that does not fit fails
+#without writing anything and the result holds the fit report
+#With cache_dir, the plain strips (no grid, validation, welding, thumbnail or level of detail) are
+#copied from the result cache of that folder, see result_cache.py
+def run_job(job, output_dir, profile=False, validate=False, weld=False, thumbnail=False, fit=False, lod=0,
+            cache_dir=None):
+    name = job_name(job)
+    path = os.path.join(output_dir, name + '_')
+    recorder = Recorder() if profile else None
+    start = time.perf_counter()
+    reports = {}
+    fit_report = None
+    try:
+        with recording(recorder) if profile else nullcontext():
+            if fit:
+                if 'columns' in job:
+                    raise ValueError('Invalid job, the fit check only handles strips')
+                with stage('fit'):
+                    fit_report = check_fit(job['num_plugs'], job['plug_type'], job['distance_between_plugs'],
+                                           job['lateral_gap'], job['vertical_gap'])
+            if fit_report is None or fit_report.fits:
+                if cache_dir is not None and not ('columns' in job or validate or weld or thumbnail or lod):
+                    _copy_cached(job, path, cache_dir)
+                else:
+                    reports = _generate(job, path, validate, weld, thumbnail, lod)
+        invalid = [part for part, report in reports.items() if not report.is_valid]
+        if fit_report is not None and not fit_report.fits:
+            error = f'Does not fit: clearance {fit_report.clearance:.3f} mm, slots {fit_report.offending_slots}'
+        else:
+            error = 'Invalid mesh: ' + ', '.join(invalid) if invalid else None
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    result = {'name': name, 'job': job, 'seconds': time.perf_counter() - start, 'error': error,
+              'outputs': [] if error else [path + 'output_top.obj', path + 'output_bottom.obj']}
+    if thumbnail and not error:
+        result['outputs'].append(path + 'output_top.png')
+    if profile:
+        result['profile'] = recorder.to_dict()
+    if validate:
+        result['validation'] = {part: report.to_dict() for part, report in reports.items()}
+    if fit_report is not None:
+        result['fit'] = fit_report.to_dict()
+    return result
+
+#Write the outputs of a strip from the result cache, generating the missing ones
+def _copy_cached(job, path, cache_dir):
+    cache = shared_cache(cache_dir)
+    with stage('cache'):
+        cache.power_strip(job['num_plugs'], job['plug_type'], job['distance_between_plugs'], job['lateral_gap'],
+                          job['vertical_gap'], destination=path + 'output_top.obj')
+        cache.bottom_enclosure(job['num_plugs'], job['lateral_gap'], job['vertical_gap'],
+                               job['distance_between_plugs'], destination=path + 'output_bottom.obj')
+
+#Returns the mesh reports by part when validate is set
+def _generate(job, path, validate=False, weld=False, thumbnail=False, lod=0):
+    if 'columns' in job:
+        grid = (job['num_plugs'], job['columns'])
+        top = generate_power_grid(*grid, job['plug_type'], job['distance_between_plugs'], job['lateral_gap'],
+                                  job['vertical_gap'], job.get('distance_between_columns'), path=path,
+                                  validate=validate, weld=weld, thumbnail=thumbnail, lod=lod, preview_lod=PREVIEW_LOD)
+        bottom = generate_grid_enclosure(*grid, job['lateral_gap'], job['vertical_gap'], job['distance_between_plugs'],
+                                         job.get('distance_between_columns'), path=path, validate=validate, weld=weld)
+        return {'top': top, 'bottom': bottom} if validate else {}
+    top = generate_power_strip(num_plugs=job['num_plugs'], plug_type=job['plug_type'],
+                               distance_between_plugs=job['distance_between_plugs'],
+                               lateral_gap=job['lateral_gap'], vertical_gap=job['vertical_gap'], path=path,
+                               validate=validate, weld=weld, thumbnail=thumbnail, lod=lod, preview_lod=PREVIEW_LOD)
+    bottom = generate_bottom_enclousure(num_plugs=job['num_plugs'], lateral_gap=job['lateral_gap'],
+                                        vertical_gap=job['vertical_gap'],
+                                        distance_between_plugs=job['distance_between_plugs'], path=path,
+                                        validate=validate, weld=weld)
+    return {'top': top, 'bottom': bottom} if validate else {}
+
+#Split jobs by output name, as (jobs to run, jobs using the name of a different earlier job)
+#A job identical to an earlier one is dropped, it would write the same files
+def split_collisions(jobs):
+    unique, colliding = {}, []
+    for job in jobs:
+        name = job_name(job)
+        if name not in unique:
+            unique[name] = job
+        elif job != unique[name]:
+            colliding.append(job)
+    return list(unique.values()), colliding
+
+#Run all the jobs and return a report
+#on_result is called in the main process with every result as soon as it is available
+#Duplicated jobs are run once, and a job using the output name of a different job fails
+#without running, see split_collisions
+def run_batch(jobs, output_dir, workers=None, on_result=None, profile=False, validate=False, weld=False,
+              thumbnail=False, fit=False, lod=0, cache_dir=None):
+    jobs, colliding = split_collisions(jobs)
+    names = [job_name(job) for job in jobs]
+    output_dir = os.path.abspath(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    results = []
+    collided = [{'name': job_name(job), 'job': job, 'seconds': 0.0,
+                 'error': 'Invalid job, another job has the same output name', 'outputs': []} for job in colliding]
+    if on_result is not None:
+        for result in collided:
+            on_result(result)
+    if workers == 1:
+        #In this process, without the start up cost of a pool
+        for job in jobs:
+            results.append(run_job(job, output_dir, profile, validate, weld, thumbnail, fit, lod, cache_dir))
+            if on_result is not None:
+                on_result(results[-1])
+    else:
+        #Only imported here, so single process runs start faster
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            futures = [executor.submit(run_job, job, output_dir, profile, validate, weld, thumbnail, fit, lod,
+                                       cache_dir)
+                       for job in jobs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                if on_result is not None:
+                    on_result(result)
+    elapsed = time.perf_counter() - start
+
+    #Report the results in the order of the jobs, the colliding jobs after the job they collide with
+    order = {name: i for i, name in enumerate(names)}
+    results.extend(collided)
+    results.sort(key=lambda result: order[result['name']])
+    failures = [result for result in results if result['error']]
+    report = {
+        'jobs': len(results),
+        'failures': failures,
+        'seconds': elapsed,
+        'jobs_per_second': len(results) / elapsed if elapsed > 0 else float('inf'),
+        'results': results,
+    }
+    if profile:
+        #Time of every stage summed over all the jobs
+        total = Recorder()
+        for result in results:
+            for stage_name, values in result['profile']['stages'].items():
+                total.add_stage(stage_name, values['seconds'])
+            for counter, value in result['profile']['counters'].items():
+                total.add_count(counter, value)
+        report['profile'] = total
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate power strips for a sweep of parameters.')
+    parser.add_argument('--csv', help='CSV file with one job per row, overrides the grid options')
+    parser.add_argument('--plug-type', nargs='+', default=[DEFAULTS['plug_type']])
+    parser.add_argument('--num-plugs', nargs='+', type=int, default=[DEFAULTS['num_plugs']])
+    parser.add_argument('--distance-between-plugs', nargs='+', type=float, default=[DEFAULTS['distance_between_plugs']])
+    parser.add_argument('--lateral-gap', nargs='+', type=float, default=[DEFAULTS['lateral_gap']])
+    parser.add_argument('--vertical-gap', nargs='+', type=float, default=[DEFAULTS['vertical_gap']])
+    parser.add_argument('--columns', nargs='+', type=int, default=None, help='Columns of grid layouts')
+    parser.add_argument('--distance-between-columns', nargs='+', type=float, default=None)
+    parser.add_argument('--output-dir', default='batch_output')
+    parser.add_argument('--workers', type=int, default=None, help='Number of processes, defaults to the CPU count')
+    parser.add_argument('--profile', action='store_true', help='Show the time spent in every stage')
+    parser.add_argument('--validate', action='store_true', help='Check that every mesh is watertight before writing it')
+    parser.add_argument('--weld', action='store_true', help='Merge coincident vertices before writing')
+    parser.add_argument('--thumbnails', action='store_true', help='Render a PNG preview of every strip')
+    parser.add_argument('--fit-check', action='store_true', help='Check that the plugs clear the enclosure before writing')
+    parser.add_argument('--lod', type=int, default=0, choices=range(len(LOD_FACE_RATIOS)),
+                        help='Level of detail of the plugs, 0 is the full model')
+    parser.add_argument('--cache-dir', help='Reuse the strips generated before, stored in this folder')
+    args = parser.parse_args(argv)
+
+    def show(result):
+        status = 'FAILED ' + result['error'] if result['error'] else 'ok'
+        print(f'{result["name"]}: {result["seconds"]*1000:.1f} ms {status}', flush=True)
+
+    try:
+        if args.csv:
+            jobs, invalid = csv_jobs(args.csv)
+        else:
+            jobs, invalid = grid_jobs({key: getattr(args, key) for key in PARAMETERS + GRID_PARAMETERS
+                                       if getattr(args, key) is not None})
+        for result in invalid:
+            show(result)
+        report = run_batch(jobs, args.output_dir, workers=args.workers, on_result=show, profile=args.profile,
+                           validate=args.validate, weld=args.weld,
+                           thumbnail=args.thumbnails, fit=args.fit_check, lod=args.lod,
+                           cache_dir=args.cache_dir)
+    except (OSError, ValueError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+    print(f'{report["jobs"] + len(invalid)} jobs, {len(report["failures"]) + len(invalid)} failed, '
+          f'{report["seconds"]:.2f} s, {report["jobs_per_second"]:.1f} jobs/s')
+    if args.profile:
+        print(report['profile'].summary())
+    return 1 if report['failures'] or invalid else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
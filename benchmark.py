@@ -0,0 +1,300 @@
+#Benchmarks of the mesh pipeline
+
+#Every stage is timed separately for both plug types and several plug counts:
+#   parse      read_obj on the plug template
+#   template   load_template (cached template)
+#   offset     offset_indices_faces on the plug faces
+#   assembly   assemble_power_strip
+#   write      OBJ formatting of the strip into memory
+#   stl, glb   binary exports of the strip into memory
+#   enclosure  build_bottom_enclosure + OBJ formatting
+#   validate   validate_mesh on the strip
+#   weld       weld_mesh on the strip
+#   reparameterize  vertices of the strip from its cached topology (strip_topology)
+#   fit        check_fit of the strip against its enclosure
+#   grid       build_power_grid with about the same number of plugs in a square (32 x 32 for 1000)
+#   preview    build_power_strip with the simplified plugs of the previews (PREVIEW_LOD)
+#The checks of the whole mesh (validate, weld) are also given per face, in nanoseconds: the
+#value should stay about the same from 2 to 10000 plugs, a growing one means a cost that is
+#not linear in the size of the strip.
+#The peak memory of the assembly and the writer is measured in a separate run,
+#so the memory tracing does not slow down the timings.
+#The startup is measured in fresh interpreters: the import of mesh_generator and the first
+#small strip (cold caches). The heavy modules (matplotlib, tkinter) must not be loaded by them.
+
+#Results are saved as JSON and compared against a stored baseline: a stage slower than
+#the baseline by more than the threshold is reported as a regression.
+#The golden checks hash the generated OBJ files for fixed parameters, so a change in
+#the geometry is detected even when it is faster.
+
+#Usage:
+#   python benchmark.py --save-baseline                 record the baseline of this machine
+#   python benchmark.py --threshold 0.2                 compare against it
+#   python benchmark.py --golden-only                   only check the generated geometry
+#   python benchmark.py --update-golden                 accept the current geometry
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+from exporters import glb_bytes, stl_bytes
+from fit_check import check_fit
+from mesh_generator import (PREVIEW_LOD, build_bottom_enclosure, build_power_grid, build_power_strip, european_plug_vert_idx,
+                            american_plug_vert_idx, offset_indices_faces, plug_models)
+from mesh_validation import validate_mesh
+from mesh_welding import weld_mesh
+from obj_io import read_obj, write_obj
+from strip_assembly import assemble_power_strip
+from strip_topology import strip_topology
+from template_cache import load_template
+
+BENCHMARK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks')
+GOLDEN_PATH = os.path.join(BENCHMARK_DIR, 'golden.json')
+BASELINE_PATH = os.path.join(BENCHMARK_DIR, 'baseline.json')
+RESULTS_PATH = os.path.join(BENCHMARK_DIR, 'results.json')
+
+PLUG_COUNTS = (2, 10, 100, 1000, 10000)
+
+#Modules only the preview and the window need, generating a strip must not import them
+HEAVY_MODULES = ('matplotlib', 'tkinter')
+
+#Script run in a fresh interpreter by measure_startup, prints its timings as JSON
+STARTUP_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+import mesh_generator
+imported = time.perf_counter()
+mesh_generator.build_power_strip(2, 'European')
+generated = time.perf_counter()
+print(json.dumps({'import': imported - start, 'first_strip': generated - imported,
+                  'heavy_modules': sorted(name for name in %r if name in sys.modules)}))
+''' % (HEAVY_MODULES,)
+
+#Parameters of the plug templates, as used by build_power_strip
+PLUG_TYPES = {
+    'European': (european_plug_vert_idx, -2.5),
+    'American': (american_plug_vert_idx, 0),
+}
+
+#Parameter sets of the golden checks: (plug_type, num_plugs, distance, lateral gap, vertical gap)
+GOLDEN_CASES = [
+    (plug_type, num_plugs, distance, lateral_gap, vertical_gap)
+    for plug_type in PLUG_TYPES
+    for num_plugs in (1, 2, 8)
+    for distance, lateral_gap, vertical_gap in ((5, 5, 5), (25, 15, 25), (60, 25, 25), (12.5, 7.3, 9.1))
+]
+
+#Best time of several runs of function
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+#Peak memory allocated while running function, in bytes
+def peak_memory(function):
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+#Stages also reported per face of the strip
+PER_FACE_STAGES = ('validate', 'weld')
+
+#Time every stage for one plug type and plug count
+def benchmark_case(plug_type, num_plugs, repeat):
+    plug_vert_idx, plug_offset = PLUG_TYPES[plug_type]
+    template_path = plug_models[plug_type]
+    plug_vertices, plug_faces = load_template(template_path)
+    pitch = 5 + 39.5
+
+    def assembly():
+        return assemble_power_strip(plug_vertices, plug_faces, plug_vert_idx, plug_offset, num_plugs, pitch, 5, 5)
+
+    vertices, faces = assembly()
+
+    def write():
+        write_obj(io.BytesIO(), vertices, faces)
+
+    def enclosure():
+        write_obj(io.BytesIO(), *build_bottom_enclosure(num_plugs, 5, 5, 5))
+
+    topology = strip_topology(num_plugs, plug_type)
+    columns = max(round(num_plugs ** 0.5), 1)
+    rows = -(-num_plugs // columns)
+
+    seconds = {
+        'parse': best_time(lambda: read_obj(template_path), repeat),
+        'template': best_time(lambda: load_template(template_path), repeat),
+        'offset': best_time(lambda: offset_indices_faces(plug_faces, 100), repeat),
+        'assembly': best_time(assembly, repeat),
+        'write': best_time(write, repeat),
+        'stl': best_time(lambda: stl_bytes(vertices, faces), repeat),
+        'glb': best_time(lambda: glb_bytes(vertices, faces), repeat),
+        'enclosure': best_time(enclosure, repeat),
+        'validate': best_time(lambda: validate_mesh(vertices, faces), repeat),
+        'weld': best_time(lambda: weld_mesh(vertices, faces), repeat),
+        'reparameterize': best_time(lambda: topology.vertices(5, 5, 5), repeat),
+        'fit': best_time(lambda: check_fit(num_plugs, plug_type, 5, 5, 5), repeat),
+        'grid': best_time(lambda: build_power_grid(rows, columns, plug_type), repeat),
+        'preview': best_time(lambda: build_power_strip(num_plugs, plug_type, lod=PREVIEW_LOD), repeat),
+    }
+    return {
+        'plug_type': plug_type,
+        'num_plugs': num_plugs,
+        'vertices': len(vertices),
+        'faces': len(faces),
+        'seconds': seconds,
+        'nanoseconds_per_face': {stage: seconds[stage] * 1e9 / max(len(faces), 1) for stage in PER_FACE_STAGES},
+        'peak_bytes': {'assembly': peak_memory(assembly), 'write': peak_memory(write)},
+    }
+
+#Import and first generation times in new processes, best of repeat runs
+def measure_startup(repeat=3):
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout
+        runs.append(json.loads(output))
+    return {
+        'seconds': {stage: min(run[stage] for run in runs) for stage in ('import', 'first_strip')},
+        'heavy_modules': sorted(set().union(*(run['heavy_modules'] for run in runs))),
+    }
+
+def run_benchmarks(plug_counts=PLUG_COUNTS, repeat=3, on_case=None):
+    cases = []
+    for plug_type in PLUG_TYPES:
+        for num_plugs in plug_counts:
+            case = benchmark_case(plug_type, num_plugs, repeat)
+            cases.append(case)
+            if on_case is not None:
+                on_case(case)
+    return {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'cases': cases,
+        'startup': measure_startup(repeat),
+    }
+
+#Stages slower than the baseline by more than threshold (0.25 is 25 % slower)
+#Differences smaller than min_seconds are ignored, they are measurement noise
+def compare(results, baseline, threshold, min_seconds=1e-4):
+    reference = {(case['plug_type'], case['num_plugs']): case for case in baseline['cases']}
+    regressions = []
+    for case in results['cases']:
+        base = reference.get((case['plug_type'], case['num_plugs']))
+        if base is None:
+            continue
+        for stage, seconds in case['seconds'].items():
+            base_seconds = base['seconds'].get(stage)
+            if base_seconds is None or seconds - base_seconds < min_seconds:
+                continue
+            if seconds > base_seconds * (1 + threshold):
+                regressions.append({'plug_type': case['plug_type'], 'num_plugs': case['num_plugs'], 'stage': stage,
+                                    'seconds': seconds, 'baseline': base_seconds, 'ratio': seconds / base_seconds})
+    base = baseline.get('startup')
+    if base is not None and 'startup' in results:
+        for stage, seconds in results['startup']['seconds'].items():
+            base_seconds = base['seconds'].get(stage)
+            if base_seconds is None or seconds - base_seconds < min_seconds:
+                continue
+            if seconds > base_seconds * (1 + threshold):
+                regressions.append({'plug_type': 'startup', 'num_plugs': 0, 'stage': stage,
+                                    'seconds': seconds, 'baseline': base_seconds, 'ratio': seconds / base_seconds})
+    return regressions
+
+#Hashes of the generated OBJ files for the golden cases
+def golden_hashes():
+    hashes = {}
+    for plug_type, num_plugs, distance, lateral_gap, vertical_gap in GOLDEN_CASES:
+        name = f'{plug_type}_{num_plugs}_{distance}_{lateral_gap}_{vertical_gap}'
+        for part, (vertices, faces) in (
+                ('top', build_power_strip(num_plugs, plug_type, distance, lateral_gap, vertical_gap)),
+                ('bottom', build_bottom_enclosure(num_plugs, lateral_gap, vertical_gap, distance))):
+            buffer = io.BytesIO()
+            write_obj(buffer, vertices, faces)
+            hashes[f'{name}_{part}'] = hashlib.sha256(buffer.getvalue()).hexdigest()
+    return hashes
+
+#Names of the golden cases whose output changed
+def check_golden(golden_path=GOLDEN_PATH):
+    with open(golden_path) as file:
+        expected = json.load(file)
+    current = golden_hashes()
+    return sorted(name for name in expected.keys() | current.keys() if expected.get(name) != current.get(name))
+
+def save_json(file_path, data):
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w') as file:
+        json.dump(data, file, indent=2)
+        file.write('\n')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks and golden checks of the mesh pipeline.')
+    parser.add_argument('--plug-counts', nargs='+', type=int, default=list(PLUG_COUNTS))
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the best one is kept')
+    parser.add_argument('--output', default=RESULTS_PATH, help='JSON file for the results')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', action='store_true', help='Store the results as the new baseline')
+    parser.add_argument('--threshold', type=float, default=0.25, help='Allowed slowdown, 0.25 is 25 %%')
+    parser.add_argument('--golden-only', action='store_true')
+    parser.add_argument('--update-golden', action='store_true')
+    args = parser.parse_args(argv)
+
+    failed = False
+    if args.update_golden:
+        save_json(GOLDEN_PATH, golden_hashes())
+        print(f'Golden hashes written to {GOLDEN_PATH}')
+    else:
+        changed = check_golden()
+        for name in changed:
+            print(f'GOLDEN MISMATCH {name}')
+        print(f'Golden checks: {len(GOLDEN_CASES) * 2 - len(changed)}/{len(GOLDEN_CASES) * 2} unchanged')
+        failed = bool(changed)
+    if args.golden_only:
+        return 1 if failed else 0
+
+    def show(case):
+        stages = ' '.join(f'{stage} {seconds*1000:.2f}ms' for stage, seconds in case['seconds'].items())
+        per_face = ' '.join(f'{stage} {value:.0f}ns' for stage, value in case['nanoseconds_per_face'].items())
+        peak = max(case['peak_bytes'].values()) / 2**20
+        print(f'{case["plug_type"]:>8} {case["num_plugs"]:>6} plugs: {stages} peak {peak:.1f}MiB, '
+              f'per face: {per_face}', flush=True)
+
+    results = run_benchmarks(args.plug_counts, args.repeat, show)
+    save_json(args.output, results)
+    startup = results['startup']
+    print(f'startup: import {startup["seconds"]["import"]*1000:.1f}ms '
+          f'first strip {startup["seconds"]["first_strip"]*1000:.1f}ms')
+    for name in startup['heavy_modules']:
+        print(f'STARTUP IMPORTS {name}')
+    failed = failed or bool(startup['heavy_modules'])
+
+    if args.save_baseline:
+        save_json(args.baseline, results)
+        print(f'Baseline written to {args.baseline}')
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for r in regressions:
+            print(f'REGRESSION {r["plug_type"]} {r["num_plugs"]} plugs {r["stage"]}: '
+                  f'{r["seconds"]*1000:.2f}ms vs {r["baseline"]*1000:.2f}ms (x{r["ratio"]:.2f})')
+        failed = failed or bool(regressions)
+    else:
+        print('No baseline to compare with, run with --save-baseline first')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,122 @@
+#Command line generation of power strips, for scripts, cron jobs and pipelines
+
+#Usage:
+#   python cli.py --plug-type European --num-plugs 4 --output-dir out
+#   python cli.py --plug-type European European American --num-plugs 3 --name mixed
+#   python cli.py --jobs jobs.ndjson --output-dir out --workers 4 --json
+#   python cli.py --plug-type American --num-plugs 4 --columns 6 --output-dir out
+#   python cli.py --plug-type European --num-plugs 8 --lod 2 --output-dir out     (simplified plugs, lighter files)
+#   python main.py <same options>        (main.py without options opens the window)
+
+#A job file is JSON (one job, a list of jobs, or {"jobs": [...]}) or NDJSON (one job per line),
+#'-' reads it from the standard input. A job is an object with the keys plug_type, num_plugs,
+#distance_between_plugs, lateral_gap and vertical_gap, the missing ones take the defaults of
+#batch.DEFAULTS, and an optional name for its outputs (<name>_output_top.obj...).
+#columns (and distance_between_columns) turn a job into a grid of num_plugs rows.
+#All the jobs are checked with the rules of the generators before the first one runs, identical
+#jobs are run once and different jobs with the same output name are refused.
+#One line is printed per finished job, a JSON object with --json.
+#Exit status: 0 when every job succeeded, 1 when a job failed, 2 when the jobs are invalid.
+
+import argparse
+import json
+import sys
+
+from batch import DEFAULTS, normalize_job, run_batch, split_collisions
+from template_cache import LOD_FACE_RATIOS
+
+#Raw jobs of a JSON or NDJSON text
+def parse_jobs(text):
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(data, dict):
+        data = data.get('jobs', [data])
+    if not isinstance(data, list) or not all(isinstance(job, dict) for job in data):
+        raise ValueError('Invalid job file, jobs must be JSON objects')
+    return data
+
+#Read and check the jobs of a job file
+def read_jobs(file_path):
+    if file_path == '-':
+        text = sys.stdin.read()
+    else:
+        with open(file_path) as file:
+            text = file.read()
+    return check_jobs(parse_jobs(text))
+
+#Normalize every job, the errors of all the invalid jobs are reported together
+def check_jobs(raw_jobs):
+    jobs = []
+    errors = []
+    for number, raw in enumerate(raw_jobs, 1):
+        try:
+            jobs.append(normalize_job(raw))
+        except (TypeError, ValueError) as e:
+            errors.append(f'job {number}: {e}')
+    if errors:
+        raise ValueError('\n'.join(errors))
+    return jobs
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate power strip models from the command line.')
+    parser.add_argument('--jobs', help='JSON or NDJSON job file, - for the standard input')
+    parser.add_argument('--plug-type', nargs='+', default=[DEFAULTS['plug_type']],
+                        help='Plug type, or the plug type of every slot')
+    parser.add_argument('--num-plugs', type=int, default=None)
+    parser.add_argument('--distance-between-plugs', '--d1', type=float, default=DEFAULTS['distance_between_plugs'])
+    parser.add_argument('--lateral-gap', '--d2', type=float, default=DEFAULTS['lateral_gap'])
+    parser.add_argument('--vertical-gap', '--d3', type=float, default=DEFAULTS['vertical_gap'])
+    parser.add_argument('--columns', type=int, default=None, help='Columns of a grid layout, num-plugs is then the rows')
+    parser.add_argument('--distance-between-columns', type=float, default=None)
+    parser.add_argument('--name', help='Name of the outputs, defaults to one built from the parameters')
+    parser.add_argument('--output-dir', default='.')
+    parser.add_argument('--workers', type=int, default=1, help='Number of processes running the jobs')
+    parser.add_argument('--json', action='store_true', help='Print one JSON object per finished job')
+    parser.add_argument('--validate', action='store_true', help='Check that every mesh is watertight before writing it')
+    parser.add_argument('--weld', action='store_true', help='Merge coincident vertices before writing')
+    parser.add_argument('--thumbnails', action='store_true', help='Render a PNG preview of every strip')
+    parser.add_argument('--fit-check', action='store_true', help='Check that the plugs clear the enclosure before writing')
+    parser.add_argument('--lod', type=int, default=0, choices=range(len(LOD_FACE_RATIOS)),
+                        help='Level of detail of the plugs, 0 is the full model')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.jobs:
+            jobs = read_jobs(args.jobs)
+        else:
+            plug_type = args.plug_type[0] if len(args.plug_type) == 1 else args.plug_type
+            num_plugs = args.num_plugs if args.num_plugs is not None else \
+                DEFAULTS['num_plugs'] if isinstance(plug_type, str) else len(plug_type)
+            job = {'plug_type': plug_type, 'num_plugs': num_plugs,
+                   'distance_between_plugs': args.distance_between_plugs,
+                   'lateral_gap': args.lateral_gap, 'vertical_gap': args.vertical_gap}
+            for key in ('columns', 'distance_between_columns'):
+                if getattr(args, key) is not None:
+                    job[key] = getattr(args, key)
+            if args.name:
+                job['name'] = args.name
+            jobs = check_jobs([job])
+        if split_collisions(jobs)[1]:
+            raise ValueError('Invalid jobs, several jobs have the same output name')
+    except (OSError, ValueError) as e:
+        print(f'error: {e}', file=sys.stderr)
+        return 2
+
+    def show(result):
+        if args.json:
+            print(json.dumps({key: result[key] for key in ('name', 'seconds', 'error', 'outputs', 'fit') if key in result}),
+                  flush=True)
+        else:
+            status = 'FAILED ' + result['error'] if result['error'] else 'ok'
+            print(f'{result["name"]}: {result["seconds"]*1000:.1f} ms {status}', flush=True)
+
+    report = run_batch(jobs, args.output_dir, workers=args.workers, on_result=show, validate=args.validate,
+                       weld=args.weld, thumbnail=args.thumbnails, fit=args.fit_check, lod=args.lod)
+    if not args.json:
+        print(f'{report["jobs"]} jobs, {len(report["failures"])} failed, {report["seconds"]:.2f} s')
+    return 1 if report['failures'] else 0
+
+if __name__ == '__main__':
+    raise SystemExit(main())
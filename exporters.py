@@ -0,0 +1,245 @@
+#Binary export formats for the generated meshes
+
+#Besides the text OBJ of obj_io, meshes can be written as:
+#   binary STL, with one computed normal per triangle, for the slicers
+#   GLB (binary glTF 2.0), with float32 positions and uint32 indices, for the web previews
+#Both are built directly from the NumPy arrays, without any per-vertex Python work.
+#As everywhere in the generator, faces are 1-indexed triangles.
+
+#Instanced meshes store the strip shell once and every plug template once, with the
+#translations of its copies, so their size does not grow with the number of plugs:
+#   GLB  one mesh per template and one node per copy, referencing that mesh
+#   OBJ  one group for the shell and one per template, at the template position, and a
+#        .instances.json manifest with the translations to apply to each template group
+#The prototypes of an instanced mesh are given as a list of (name, vertices, faces, translations).
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from obj_io import format_obj, read_obj, write_obj, write_obj_groups
+
+#Record of one triangle in a binary STL file (50 bytes, no padding)
+STL_RECORD = np.dtype([('normal', '<f4', (3,)), ('vertices', '<f4', (3, 3)), ('attribute', '<u2')])
+
+STL_HEADER = b'DM3D binary STL'
+
+#glTF constants
+GLB_MAGIC = b'glTF'
+GLB_JSON_CHUNK = 0x4E4F534A
+GLB_BIN_CHUNK = 0x004E4942
+GLTF_FLOAT = 5126
+GLTF_UNSIGNED_INT = 5125
+GLTF_ARRAY_BUFFER = 34962
+GLTF_ELEMENT_ARRAY_BUFFER = 34963
+GLTF_TRIANGLES = 4
+
+#Formats accepted by write_mesh, with their file extension
+FORMATS = ('obj', 'stl', 'glb')
+
+#Unit normals of triangles given as a (F, 3, 3) array, degenerate triangles get a zero normal
+def triangle_normals(triangles):
+    normals = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    lengths = np.sqrt(np.einsum('ij,ij->i', normals, normals))[:, None]
+    return np.divide(normals, lengths, out=np.zeros_like(normals), where=lengths > 0)
+
+#Unit normals of the faces of a mesh
+def face_normals(vertices, faces):
+    return triangle_normals(np.asarray(vertices, dtype=np.float64)[np.asarray(faces) - 1])
+
+#Binary STL file of a mesh
+def stl_bytes(vertices, faces):
+    triangles = np.asarray(vertices, dtype=np.float32)[np.asarray(faces) - 1]
+    records = np.zeros(len(triangles), dtype=STL_RECORD)
+    records['normal'] = triangle_normals(triangles)
+    records['vertices'] = triangles
+    return STL_HEADER.ljust(80, b' ') + struct.pack('<I', len(faces)) + records.tobytes()
+
+#Read a binary STL file as (triangles, normals), triangles has shape (F, 3, 3)
+def read_stl(file_path):
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    count, = struct.unpack_from('<I', data, 80)
+    records = np.frombuffer(data, dtype=STL_RECORD, count=count, offset=84)
+    return records['vertices'], records['normal']
+
+def _pad(data, filler):
+    return data + filler * (-len(data) % 4)
+
+#Assemble a GLB file from the glTF description and the binary buffer
+def glb_container(gltf, binary):
+    json_chunk = _pad(json.dumps(gltf, separators=(',', ':')).encode(), b' ')
+    binary = _pad(binary, b'\0')
+    length = 12 + 8 + len(json_chunk) + 8 + len(binary)
+    return b''.join((
+        struct.pack('<4sII', GLB_MAGIC, 2, length),
+        struct.pack('<II', len(json_chunk), GLB_JSON_CHUNK), json_chunk,
+        struct.pack('<II', len(binary), GLB_BIN_CHUNK), binary,
+    ))
+
+#Add the buffer views and accessors of one triangle mesh to a glTF description
+#chunks collects the binary data, the returned value is the glTF primitive
+def add_gltf_mesh(gltf, chunks, vertices, faces):
+    positions = np.ascontiguousarray(vertices, dtype='<f4')
+    indices = np.ascontiguousarray(np.asarray(faces) - 1, dtype='<u4').ravel()
+    offset = sum(len(chunk) for chunk in chunks)
+
+    views = gltf.setdefault('bufferViews', [])
+    accessors = gltf.setdefault('accessors', [])
+    for data, component, kind, target in ((indices, GLTF_UNSIGNED_INT, 'SCALAR', GLTF_ELEMENT_ARRAY_BUFFER),
+                                          (positions, GLTF_FLOAT, 'VEC3', GLTF_ARRAY_BUFFER)):
+        raw = _pad(data.tobytes(), b'\0')
+        views.append({'buffer': 0, 'byteOffset': offset, 'byteLength': data.nbytes, 'target': target})
+        accessor = {'bufferView': len(views) - 1, 'componentType': component,
+                    'count': len(data), 'type': kind}
+        if kind == 'VEC3':
+            #Positions must declare their bounds
+            accessor['min'] = positions.min(axis=0).tolist() if len(positions) else [0, 0, 0]
+            accessor['max'] = positions.max(axis=0).tolist() if len(positions) else [0, 0, 0]
+        accessors.append(accessor)
+        chunks.append(raw)
+        offset += len(raw)
+    return {'attributes': {'POSITION': len(accessors) - 1}, 'indices': len(accessors) - 2, 'mode': GLTF_TRIANGLES}
+
+#Empty glTF description
+def new_gltf():
+    return {'asset': {'version': '2.0', 'generator': 'DM3D'}, 'scene': 0, 'scenes': [{'nodes': []}],
+            'nodes': [], 'meshes': []}
+
+#Add a node to the scene of a glTF description
+def add_gltf_node(gltf, node):
+    gltf['nodes'].append(node)
+    gltf['scenes'][0]['nodes'].append(len(gltf['nodes']) - 1)
+
+#GLB file of a glTF description and its binary chunks
+def _finish_glb(gltf, chunks):
+    binary = b''.join(chunks)
+    gltf['buffers'] = [{'byteLength': len(binary)}]
+    return glb_container(gltf, binary)
+
+#GLB file of a single mesh
+def glb_bytes(vertices, faces):
+    gltf = new_gltf()
+    chunks = []
+    gltf['meshes'].append({'primitives': [add_gltf_mesh(gltf, chunks, vertices, faces)]})
+    add_gltf_node(gltf, {'mesh': 0})
+    return _finish_glb(gltf, chunks)
+
+#GLB file of an instanced mesh
+def instanced_glb_bytes(shell_vertices, shell_faces, prototypes):
+    gltf = new_gltf()
+    chunks = []
+    gltf['meshes'].append({'name': 'shell', 'primitives': [add_gltf_mesh(gltf, chunks, shell_vertices, shell_faces)]})
+    add_gltf_node(gltf, {'mesh': 0, 'name': 'shell'})
+    for name, vertices, faces, translations in prototypes:
+        gltf['meshes'].append({'name': name, 'primitives': [add_gltf_mesh(gltf, chunks, vertices, faces)]})
+        for translation in np.asarray(translations, dtype=np.float64).tolist():
+            add_gltf_node(gltf, {'mesh': len(gltf['meshes']) - 1, 'translation': translation})
+    return _finish_glb(gltf, chunks)
+
+#Manifest of an instanced OBJ file, the translations of the copies of every group
+def instance_manifest(obj_name, prototypes):
+    return {
+        'obj': obj_name,
+        'shell': 'shell',
+        'instances': [{'group': name, 'translations': np.asarray(translations, dtype=np.float64).tolist()}
+                      for name, _, _, translations in prototypes],
+    }
+
+#Write an instanced mesh as obj (with its manifest next to it) or glb
+#The format defaults to the extension of the path
+#Returns the number of bytes written
+def write_instanced(file_path, shell_vertices, shell_faces, prototypes, file_format=None, precision=None):
+    file_format = file_format or format_from_path(file_path)
+    if file_format == 'glb':
+        data = instanced_glb_bytes(shell_vertices, shell_faces, prototypes)
+        with open(file_path, 'wb') as file:
+            file.write(data)
+        return len(data)
+    if file_format != 'obj':
+        raise ValueError('Invalid file format, instanced meshes are written as obj or glb')
+    groups = [('shell', shell_vertices, shell_faces)] + [(name, vertices, faces) for name, vertices, faces, _ in prototypes]
+    written = write_obj_groups(file_path, groups, precision)
+    manifest = json.dumps(instance_manifest(os.path.basename(file_path), prototypes)).encode()
+    with open(os.path.splitext(file_path)[0] + '.instances.json', 'wb') as file:
+        file.write(manifest)
+    return written + len(manifest)
+
+#Whole mesh of an instanced mesh, with every copy of the prototypes after the shell
+def expand_instances(shell_vertices, shell_faces, prototypes):
+    vertices = [np.asarray(shell_vertices, dtype=np.float64)]
+    faces = [np.asarray(shell_faces, dtype=np.int64)]
+    offset = len(vertices[0])
+    for _, prototype_vertices, prototype_faces, translations in prototypes:
+        translations = np.asarray(translations, dtype=np.float64)
+        copies = len(translations)
+        vertices.append((np.asarray(prototype_vertices)[None] + translations[:, None, :]).reshape(-1, 3))
+        starts = offset + len(prototype_vertices) * np.arange(copies)
+        faces.append((np.asarray(prototype_faces, dtype=np.int64)[None] + starts[:, None, None]).reshape(-1, 3))
+        offset += len(prototype_vertices) * copies
+    return np.concatenate(vertices), np.concatenate(faces)
+
+#Read the first mesh of a GLB file written by glb_bytes, as (vertices, faces)
+def read_glb(file_path):
+    with open(file_path, 'rb') as file:
+        data = file.read()
+    json_length, = struct.unpack_from('<I', data, 12)
+    gltf = json.loads(data[20:20 + json_length])
+    binary_offset = 20 + json_length + 8
+
+    def accessor_array(index, dtype, width):
+        accessor = gltf['accessors'][index]
+        view = gltf['bufferViews'][accessor['bufferView']]
+        array = np.frombuffer(data, dtype=dtype, count=accessor['count'] * width,
+                              offset=binary_offset + view['byteOffset'] + accessor.get('byteOffset', 0))
+        return array.reshape(-1, width) if width > 1 else array
+
+    primitive = gltf['meshes'][0]['primitives'][0]
+    vertices = accessor_array(primitive['attributes']['POSITION'], '<f4', 3)
+    faces = accessor_array(primitive['indices'], '<u4', 1).reshape(-1, 3).astype(np.int64) + 1
+    return vertices, faces
+
+#File format from a file name, OBJ when the extension is unknown
+def format_from_path(file_path):
+    extension = str(file_path).rsplit('.', 1)[-1].lower()
+    return extension if extension in FORMATS else 'obj'
+
+#Bytes of a mesh in the given format
+def mesh_bytes(vertices, faces, file_format='obj', precision=None):
+    if file_format == 'obj':
+        return format_obj(vertices, faces, precision=precision)
+    if file_format == 'stl':
+        return stl_bytes(vertices, faces)
+    if file_format == 'glb':
+        return glb_bytes(vertices, faces)
+    raise ValueError('Invalid file format, must be one of ' + ', '.join(FORMATS))
+
+#Write a mesh in the given format, to a path or a binary stream
+#The format defaults to the extension of the path
+#Returns the number of bytes written
+def write_mesh(target, vertices, faces, file_format=None, precision=None):
+    if file_format is None:
+        file_format = 'obj' if hasattr(target, 'write') else format_from_path(target)
+    if file_format == 'obj':
+        #Written in chunks, without building the whole text
+        return write_obj(target, vertices, faces, precision=precision)
+    data = mesh_bytes(vertices, faces, file_format, precision)
+    if hasattr(target, 'write'):
+        target.write(data)
+    else:
+        with open(target, 'wb') as file:
+            file.write(data)
+    return len(data)
+
+#Read a mesh written in any of the formats, as (vertices, faces)
+#STL files have no shared vertices, every triangle gets its own three
+def read_mesh(file_path):
+    file_format = format_from_path(file_path)
+    if file_format == 'stl':
+        triangles, _ = read_stl(file_path)
+        return triangles.reshape(-1, 3), np.arange(1, len(triangles) * 3 + 1).reshape(-1, 3)
+    if file_format == 'glb':
+        return read_glb(file_path)
+    return read_obj(file_path)
@@ -0,0 +1,404 @@
+#Fit check between the top shell and the bottom enclosure
+
+#The top shell is turned over and put on the enclosure: its plate rests on the top of the
+#walls and the plug bodies hang inside the box. In the frame of the enclosure
+#(X along the strip, Y up, Z across the strip from -width to 0), a point of the shell is
+#   (z, enclosure height + SHELL_THICKNESS - y, x - width)
+#The plate rests on the walls by design, so the plug bodies are checked against the
+#enclosure and the outlines of the shell and of the enclosure are compared:
+#   clearance          smallest distance between a plug body and the enclosure
+#   intersecting pairs (plug triangle, enclosure triangle) pairs touching or crossing
+#   offending slots    plugs closer to the enclosure than min_clearance
+#   outline difference length and width of the shell minus those of the enclosure
+#The strip fits when the plug bodies clear the enclosure. The outline difference is reported
+#for information only: the enclosure is sized from the plug pitch of the original generator,
+#not from the outline of the shell, so the shell is usually shorter (covers tells whether it
+#is no more than OUTLINE_TOLERANCE shorter or narrower).
+#
+#   report = check_fit(4, 'European', 25, 15, 25)
+#   print(report.summary())
+#
+#Both meshes are put in one uniform grid of cells of about search_radius: every triangle
+#is listed in the cells its bounding box covers (the enclosure boxes grown by search_radius),
+#with array arithmetic only. Only the pairs sharing a cell are measured, with an exact
+#triangle to triangle distance, so the cost follows the number of triangles near the walls
+#instead of the product of the triangle counts. The grid holds the box of every plug rather
+#than its triangles, and as the plugs are translated copies of their templates, the triangles
+#of a template near an enclosure triangle are found once for every position of that triangle
+#relative to the plug (the long walls are at the same place for all the plugs of a strip).
+#Distances larger than search_radius are not measured, the clearance is then infinite.
+
+import numpy as np
+
+from mesh_generator import build_bottom_enclosure, check_strip_parameters, plug_slots, plug_template
+from strip_assembly import PLUG_WIDTH, slot_translations
+
+#Thickness of the plate of the top shell (Y from 0 to 5 in the shell frame)
+SHELL_THICKNESS = 5
+
+#Default clearance required between the plug bodies and the enclosure, in mm
+MIN_CLEARANCE = 1.0
+
+#Distance under which the triangle pairs are measured, in mm
+SEARCH_RADIUS = 10.0
+
+#Distance under which two triangles are considered touching
+CONTACT_TOLERANCE = 1e-9
+
+#Largest amount by which the shell can be shorter or narrower than the enclosure, in mm
+OUTLINE_TOLERANCE = 0.5
+
+#Number of triangle pairs measured at once, bounds the memory of the narrow phase
+PAIRS_PER_CHUNK = 1 << 16
+
+#Number of intersecting pairs listed in the report
+MAX_LISTED_PAIRS = 10
+
+class FitReport:
+
+    def __init__(self, clearance, closest_pair, intersecting_pairs, listed_pairs, offending_slots,
+                 outline_difference, min_clearance, search_radius):
+        self.clearance = clearance
+        self.closest_pair = closest_pair
+        self.intersecting_pairs = intersecting_pairs
+        self.listed_pairs = listed_pairs
+        self.offending_slots = offending_slots
+        self.outline_difference = outline_difference
+        self.min_clearance = min_clearance
+        self.search_radius = search_radius
+
+    #No plug body touches the enclosure, and all of them keep the required clearance
+    @property
+    def clears(self):
+        return self.intersecting_pairs == 0 and self.clearance >= self.min_clearance
+
+    #The shell closes the enclosure, a shorter or narrower shell leaves part of it open
+    #For information, it is not part of fits (see the top of the file)
+    @property
+    def covers(self):
+        return min(self.outline_difference) >= -OUTLINE_TOLERANCE
+
+    @property
+    def fits(self):
+        return self.clears
+
+    def to_dict(self):
+        return {
+            'clearance': self.clearance if np.isfinite(self.clearance) else None,
+            'closest_pair': self.closest_pair,
+            'intersecting_pairs': self.intersecting_pairs,
+            'listed_pairs': self.listed_pairs,
+            'offending_slots': self.offending_slots,
+            'outline_difference': self.outline_difference,
+            'min_clearance': self.min_clearance,
+            'search_radius': self.search_radius,
+            'clears': self.clears,
+            'covers': self.covers,
+            'fits': self.fits,
+        }
+
+    #Human readable report
+    def summary(self):
+        clearance = f'{self.clearance:.3f} mm' if np.isfinite(self.clearance) else f'more than {self.search_radius:g} mm'
+        lines = [('fits' if self.fits else 'DOES NOT FIT') + f', clearance {clearance} (required {self.min_clearance:g} mm)',
+                 f'intersecting pairs: {self.intersecting_pairs}',
+                 f'offending slots: {self.offending_slots}',
+                 'outline difference: length {:+.3f} mm, width {:+.3f} mm'.format(*self.outline_difference)
+                 + ('' if self.covers else ' (the shell does not cover the whole opening)')]
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f'FitReport({self.to_dict()!r})'
+
+def _dot(a, b):
+    return np.einsum('...i,...i->...', a, b)
+
+#Normals of triangles, shape (N, 3, 3) -> (N, 3), not normalized
+def _normals(triangles):
+    return np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+
+#Whether the points, shape (N, 3), lying in the plane of the triangles are inside them
+def _inside(points, triangles, normals):
+    inside = np.any(normals != 0, axis=1)
+    for i in range(3):
+        a, b = triangles[:, i], triangles[:, (i + 1) % 3]
+        inside &= _dot(np.cross(b - a, points - a), normals) >= 0
+    return inside
+
+#Distances between the segments p1-q1 and p2-q2, one pair per row
+#Closest points clamped on both segments (Ericson, Real-Time Collision Detection 5.1.9)
+def segment_distances(p1, q1, p2, q2):
+    d1, d2, r = q1 - p1, q2 - p2, p1 - p2
+    a, e, f = _dot(d1, d1), _dot(d2, d2), _dot(d2, r)
+    b, c = _dot(d1, d2), _dot(d1, r)
+    eps = 1e-30
+    a_safe, e_safe = np.where(a > eps, a, 1), np.where(e > eps, e, 1)
+    denom = a * e - b * b
+    s = np.where(denom > eps, np.clip((b * f - c * e) / np.where(denom > eps, denom, 1), 0, 1), 0)
+    s = np.where(a > eps, s, 0)
+    t = np.where(e > eps, (b * s + f) / e_safe, 0)
+    s = np.where(t < 0, np.where(a > eps, np.clip(-c / a_safe, 0, 1), 0), s)
+    s = np.where(t > 1, np.where(a > eps, np.clip((b - c) / a_safe, 0, 1), 0), s)
+    t = np.clip(t, 0, 1)
+    return np.linalg.norm(p1 + d1 * s[:, None] - p2 - d2 * t[:, None], axis=1)
+
+#Exact distances between triangles, one pair per row, 0 when they touch or cross
+#The closest points of two triangles are either a vertex and its projection inside the other
+#triangle, or the closest points of two edges, and two triangles cross only where an edge of
+#one goes through the other
+def triangle_distances(a, b):
+    distances = np.full(len(a), np.inf)
+    for first, second in ((a, b), (b, a)):
+        normals = _normals(second)
+        lengths = np.linalg.norm(normals, axis=1)
+        unit = normals / np.where(lengths > 0, lengths, 1)[:, None]
+        heights = [_dot(first[:, i] - second[:, 0], unit) for i in range(3)]
+        for i in range(3):
+            #Vertex over the other triangle
+            projected = first[:, i] - heights[i][:, None] * unit
+            over = _inside(projected, second, normals)
+            distances = np.where(over, np.minimum(distances, np.abs(heights[i])), distances)
+            #Edge through the other triangle
+            j = (i + 1) % 3
+            crossing = (heights[i] * heights[j] <= 0) & (heights[i] != heights[j])
+            ratio = heights[i] / np.where(crossing, heights[i] - heights[j], 1)
+            point = first[:, i] + (first[:, j] - first[:, i]) * ratio[:, None]
+            distances = np.where(crossing & _inside(point, second, normals), 0, distances)
+    for i in range(3):
+        for j in range(3):
+            distances = np.minimum(distances, segment_distances(a[:, i], a[:, (i + 1) % 3],
+                                                                 b[:, j], b[:, (j + 1) % 3]))
+    return distances
+
+#Cells covered by boxes of a uniform grid, as (cell index, box index) for every covered cell
+def _box_cells(low, high, origin, cell_size, shape):
+    first = np.clip(np.floor((low - origin) / cell_size).astype(np.int64), 0, shape - 1)
+    last = np.clip(np.floor((high - origin) / cell_size).astype(np.int64), 0, shape - 1)
+    spans = last - first + 1
+    counts = spans.prod(axis=1)
+    owner = np.repeat(np.arange(len(low)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    spans, first = spans[owner], first[owner]
+    plane = spans[:, 1] * spans[:, 2]
+    x = first[:, 0] + local // plane
+    y = first[:, 1] + local % plane // spans[:, 2]
+    z = first[:, 2] + local % spans[:, 2]
+    return (x * shape[1] + y) * shape[2] + z, owner
+
+#Pairs (index in a, index in b) of boxes closer than radius, with the distance between the boxes
+#Found with a uniform grid holding both sets of boxes
+def box_pairs(a_low, a_high, b_low, b_high, radius, cell_size=None):
+    if not len(a_low) or not len(b_low):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+    low = np.minimum(a_low.min(axis=0), b_low.min(axis=0) - radius)
+    high = np.maximum(a_high.max(axis=0), b_high.max(axis=0) + radius)
+    cell_size = cell_size or max(radius, 1e-3 * (high - low).max(), 1e-9)
+    shape = np.floor((high - low) / cell_size).astype(np.int64) + 1
+
+    a_cells, a_owner = _box_cells(a_low, a_high, low, cell_size, shape)
+    b_cells, b_owner = _box_cells(b_low - radius, b_high + radius, low, cell_size, shape)
+    order = np.argsort(b_cells, kind='stable')
+    b_cells, b_owner = b_cells[order], b_owner[order]
+
+    #Every entry of a is paired with the entries of b in the same cell
+    starts = np.searchsorted(b_cells, a_cells, 'left')
+    counts = np.searchsorted(b_cells, a_cells, 'right') - starts
+    cells = np.repeat(a_cells, counts)
+    first = np.repeat(a_owner, counts)
+    rows = np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    second = b_owner[rows]
+
+    #A pair sharing several cells is kept in the cell holding the low corner of the
+    #overlap of its boxes only
+    corner = np.maximum(a_low[first], b_low[second] - radius)
+    corner_cells, _ = _box_cells(corner, corner, low, cell_size, shape)
+    kept = corner_cells == cells
+    first, second = first[kept], second[kept]
+    gaps = _box_gaps(a_low[first], a_high[first], b_low[second], b_high[second])
+    near = gaps <= radius
+    return first[near], second[near], gaps[near]
+
+#Distances between boxes, 0 when they overlap
+def _box_gaps(a_low, a_high, b_low, b_high):
+    return np.linalg.norm(np.maximum(np.maximum(a_low - b_high, b_low - a_high), 0), axis=1)
+
+#Bounding boxes of triangles as (low corners, high corners), faster than reducing over the corners
+def _triangle_boxes(triangles):
+    return (np.minimum(np.minimum(triangles[:, 0], triangles[:, 1]), triangles[:, 2]),
+            np.maximum(np.maximum(triangles[:, 0], triangles[:, 1]), triangles[:, 2]))
+
+#Pairs (index in a, index in b) of triangles whose boxes are closer than radius, with the
+#distance between the boxes, a lower bound of the distance between the triangles
+#groups gives the group of every triangle of a, in increasing order (the plug of every
+#triangle): the groups are paired first with their bounding boxes, and only the triangles
+#of the groups near a triangle of b are compared with it, so the grid holds a few boxes per
+#plug instead of all the triangles of the strip
+#shapes gives the shape of every group (indexed by group) when the groups are translated
+#copies of a few shapes (the plug templates), see _copy_rows
+def candidate_pairs(a, b, radius, cell_size=None, groups=None, shapes=None):
+    a_low, a_high = _triangle_boxes(a)
+    b_low, b_high = _triangle_boxes(b)
+    if groups is None:
+        return box_pairs(a_low, a_high, b_low, b_high, radius, cell_size)
+    if not len(a):
+        return box_pairs(a_low, a_high, b_low, b_high, radius, cell_size)
+
+    starts = np.flatnonzero(np.concatenate(([True], groups[1:] != groups[:-1])))
+    sizes = np.diff(np.append(starts, len(a)))
+    group_low, group_high = np.minimum.reduceat(a_low, starts), np.maximum.reduceat(a_high, starts)
+    group_rows, second, _ = box_pairs(group_low, group_high, b_low, b_high, radius, cell_size)
+    if shapes is None:
+        counts = sizes[group_rows]
+        first = np.repeat(starts[group_rows] - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    else:
+        first, counts = _copy_rows(a_low, a_high, b_low[second], b_high[second], radius, starts, sizes,
+                                   group_low, group_high, group_rows, np.asarray(shapes)[groups[starts]])
+    second = np.repeat(second, counts)
+    gaps = _box_gaps(a_low[first], a_high[first], b_low[second], b_high[second])
+    near = gaps <= radius
+    return first[near], second[near], gaps[near]
+
+#Rows of the triangles of the paired groups that may be near the triangle of b of each pair,
+#with the number of rows of every pair
+#Which triangles of a group are near a box only depends on the shape of the group and on the box
+#seen from the group, clipped to the group grown by 2*radius (the parts of the box further away
+#are further than radius from every triangle of the group). Along the strip most pairs are the
+#same plug against the same long wall, so every distinct (shape, clipped box) is compared with
+#the triangles of a single group of that shape. The comparison allows for rounding (the copies
+#are translated in floating point), candidate_pairs then measures the rows with their own boxes.
+def _copy_rows(a_low, a_high, pair_low, pair_high, radius, starts, sizes, group_low, group_high, group_rows, shapes):
+    if not len(group_rows):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    #One group of every shape stands for all of them
+    _, models = np.unique(shapes, return_index=True)
+    model = models[np.searchsorted(shapes[models], shapes)]
+    extent = (group_high - group_low)[model]
+
+    origin = group_low[group_rows]
+    seen_low = np.maximum(pair_low - origin, -2 * radius)
+    seen_high = np.minimum(pair_high - origin, extent[group_rows] + 2 * radius)
+    keys = np.column_stack((model[group_rows], seen_low, seen_high))
+    keys, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+
+    key_models = keys[:, 0].astype(np.int64)
+    counts = sizes[key_models]
+    rows = np.repeat(starts[key_models] - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+    owner = np.repeat(np.arange(len(keys)), counts)
+    rounding = 1e-9 * (1 + np.abs(group_low).max() + np.abs(group_high).max())
+    near = _box_gaps(a_low[rows] - group_low[key_models[owner]], a_high[rows] - group_low[key_models[owner]],
+                     keys[owner, 1:4], keys[owner, 4:7]) <= radius + rounding
+    #Rows of the near triangles counted from the start of their group, by key
+    local, owner = (rows - starts[key_models[owner]])[near], owner[near]
+    key_counts = np.bincount(owner, minlength=len(keys))
+    key_starts = np.cumsum(key_counts) - key_counts
+
+    counts = key_counts[inverse]
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    first = np.repeat(starts[group_rows], counts) + local[np.repeat(key_starts[inverse], counts) + offsets]
+    return first, counts
+
+#Exact distances of the given pairs, PAIRS_PER_CHUNK pairs at a time
+def _pair_distances(a, b, first, second):
+    distances = np.empty(len(first))
+    for start in range(0, len(first), PAIRS_PER_CHUNK):
+        rows = slice(start, start + PAIRS_PER_CHUNK)
+        distances[rows] = triangle_distances(a[first[rows]], b[second[rows]])
+    return distances
+
+#Triangle pairs of a and b closer than threshold, and the closest pair within radius
+#groups and shapes are those of candidate_pairs
+#Returns (index in a, index in b, distance) of the close pairs, and the closest pair as
+#(index in a, index in b, distance), None when no triangles are within radius
+#Only the pairs whose boxes are closer than threshold are all measured, the others are
+#measured by increasing distance between their boxes until none can be closer
+def close_pairs(a, b, threshold, radius=SEARCH_RADIUS, cell_size=None, groups=None, shapes=None):
+    first, second, gaps = candidate_pairs(a, b, radius, cell_size, groups, shapes)
+    close = np.flatnonzero(gaps <= threshold)
+    distances = _pair_distances(a, b, first[close], second[close])
+    best = np.argmin(distances) if len(distances) else None
+    closest = (first[close[best]], second[close[best]], distances[best]) if best is not None else None
+
+    rest = np.flatnonzero(gaps > threshold)
+    rest = rest[np.argsort(gaps[rest], kind='stable')]
+    #The chunks start small, the closest pair is usually among the first ones
+    start, size = 0, 1024
+    while start < len(rest):
+        rows = rest[start:start + size]
+        start, size = start + size, min(2 * size, PAIRS_PER_CHUNK)
+        if closest is not None and gaps[rows[0]] >= closest[2]:
+            break
+        measured = _pair_distances(a, b, first[rows], second[rows])
+        best = np.argmin(measured)
+        if closest is None or measured[best] < closest[2]:
+            closest = (first[rows[best]], second[rows[best]], measured[best])
+    if closest is not None and closest[2] > radius:
+        closest = None
+
+    near = distances <= threshold
+    return first[close][near], second[close][near], distances[near], closest
+
+#Shell coordinates in the frame of the enclosure, see the top of the file
+def mate_top_shell(vertices, lateral_gap, enclosure_height):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    width = 2*lateral_gap+PLUG_WIDTH
+    return np.stack((vertices[:, 2], enclosure_height + SHELL_THICKNESS - vertices[:, 1], vertices[:, 0] - width), axis=1)
+
+#Triangles of the plug bodies of a strip in the shell frame, with the slot of every triangle
+#templates and slots are those of strip_assembly.assemble_mixed_strip
+def plug_body_triangles(templates, slots, distance_between_plugs, lateral_gap, vertical_gap):
+    translations = slot_translations(templates, slots, distance_between_plugs, lateral_gap, vertical_gap)
+    slots = np.asarray(slots)
+    triangles, owners = [], []
+    for index, (plug_vertices, plug_faces, _, _, _) in enumerate(templates):
+        selected = np.flatnonzero(slots == index)
+        template_triangles = np.asarray(plug_vertices, dtype=np.float64)[np.asarray(plug_faces, dtype=np.int64) - 1]
+        triangles.append((template_triangles[None] + translations[selected, None, None, :]).reshape(-1, 3, 3))
+        owners.append(np.repeat(selected, len(plug_faces)))
+    order = np.argsort(np.concatenate(owners), kind='stable')
+    return np.concatenate(triangles)[order], np.concatenate(owners)[order]
+
+#Check that the top shell of a strip fits its bottom enclosure, returns a FitReport
+#The triangles in the pairs of the report are 0-indexed faces of the plug templates
+#(slot, plug face, enclosure face)
+def check_fit(num_plugs, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5,
+              min_clearance=MIN_CLEARANCE, search_radius=SEARCH_RADIUS):
+    check_strip_parameters(num_plugs, distance_between_plugs, lateral_gap, vertical_gap)
+    if not 0 <= min_clearance <= search_radius:
+        raise ValueError('Invalid clearance, must be between 0 and the search radius')
+
+    enclosure_vertices, enclosure_faces = build_bottom_enclosure(num_plugs, lateral_gap, vertical_gap, distance_between_plugs)
+    enclosure = enclosure_vertices[np.asarray(enclosure_faces, dtype=np.int64) - 1]
+    height = enclosure_vertices[:, 1].max()
+
+    names, slots = plug_slots(num_plugs, plug_type)
+    templates = [plug_template(name) for name in names]
+    triangles, owners = plug_body_triangles(templates, slots, distance_between_plugs, lateral_gap, vertical_gap)
+    triangles = mate_top_shell(triangles.reshape(-1, 3), lateral_gap, height).reshape(-1, 3, 3)
+    threshold = max(min_clearance, CONTACT_TOLERANCE)
+    plug_rows, enclosure_rows, distances, closest = close_pairs(triangles, enclosure, threshold, search_radius,
+                                                                 groups=owners, shapes=slots)
+
+    #Index of every plug triangle in its template
+    template_rows = np.arange(len(owners)) - np.searchsorted(owners, owners)
+
+    def pair(plug_row, enclosure_row):
+        return int(owners[plug_row]), int(template_rows[plug_row]), int(enclosure_row)
+
+    touching = np.flatnonzero(distances <= CONTACT_TOLERANCE)
+
+    #Outlines, the shell ends at its closing vertices (see strip_assembly.closing_vertices)
+    pitches = distance_between_plugs + np.array([template[4] for template in templates])[slots]
+    shell_length = pitches.sum() + 2 * vertical_gap - 15
+    enclosure_size = enclosure_vertices.max(axis=0) - enclosure_vertices.min(axis=0)
+
+    return FitReport(
+        clearance=float(closest[2]) if closest is not None else float('inf'),
+        closest_pair=pair(closest[0], closest[1]) if closest is not None else None,
+        intersecting_pairs=len(touching),
+        listed_pairs=[pair(plug_rows[row], enclosure_rows[row]) for row in touching[:MAX_LISTED_PAIRS]],
+        offending_slots=sorted(set(owners[plug_rows[(distances < min_clearance) | (distances <= CONTACT_TOLERANCE)]].tolist())),
+        outline_difference=(float(shell_length - enclosure_size[0]), float(2*lateral_gap+PLUG_WIDTH - enclosure_size[2])),
+        min_clearance=min_clearance,
+        search_radius=search_radius,
+    )
@@ -0,0 +1,102 @@
+#Opt-in timing and counters for the mesh pipeline
+
+#The generators wrap their stages in stage('name') and report sizes with count('name', n).
+#Nothing is measured unless the caller opens a recording:
+#
+#   with recording() as recorder:
+#       generate_power_strip(4, 'European')
+#   print(recorder.summary())
+#
+#Without a recording, stage() returns a shared empty context manager and count() returns
+#immediately, so the hooks cost a context variable lookup.
+#The recording is stored in a context variable, so threads and asyncio tasks that
+#record at the same time do not mix their measurements.
+
+import contextvars
+import json
+import time
+from contextlib import contextmanager, nullcontext
+
+_current = contextvars.ContextVar('dm3d_recorder', default=None)
+_disabled = nullcontext()
+
+class Recorder:
+
+    def __init__(self):
+        self.stages = {}   #name -> [seconds, calls]
+        self.counters = {} #name -> value
+
+    def add_stage(self, name, seconds):
+        entry = self.stages.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+    def add_count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def total_seconds(self):
+        return sum(seconds for seconds, _ in self.stages.values())
+
+    def to_dict(self):
+        return {
+            'stages': {name: {'seconds': seconds, 'calls': calls} for name, (seconds, calls) in self.stages.items()},
+            'counters': dict(self.counters),
+        }
+
+    #Human readable breakdown, one line per stage
+    def summary(self):
+        total = self.total_seconds()
+        lines = []
+        for name, (seconds, calls) in self.stages.items():
+            share = 100 * seconds / total if total > 0 else 0
+            lines.append(f'{name}: {seconds*1000:.2f} ms ({share:.0f} %)' + (f' x{calls}' if calls > 1 else ''))
+        lines.extend(f'{name}: {value}' for name, value in self.counters.items())
+        return '\n'.join(lines)
+
+    #Prometheus text exposition format
+    def prometheus(self, prefix='dm3d'):
+        lines = [f'# TYPE {prefix}_stage_seconds counter', f'# TYPE {prefix}_stage_calls counter']
+        for name, (seconds, calls) in self.stages.items():
+            lines.append(f'{prefix}_stage_seconds{{stage="{name}"}} {seconds!r}')
+            lines.append(f'{prefix}_stage_calls{{stage="{name}"}} {calls}')
+        for name, value in self.counters.items():
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+        return '\n'.join(lines) + '\n'
+
+    #Send the measurements as one structured (JSON) log record, at the INFO level by default
+    def log(self, logger=None, level=None, **fields):
+        import logging
+        logger = logger or logging.getLogger('dm3d.instrumentation')
+        logger.log(logging.INFO if level is None else level, json.dumps({**fields, **self.to_dict()}))
+
+#Record the stages run inside the block
+@contextmanager
+def recording(recorder=None):
+    recorder = recorder or Recorder()
+    token = _current.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _current.reset(token)
+
+@contextmanager
+def _timed(recorder, name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        recorder.add_stage(name, time.perf_counter() - start)
+
+#Time the block as the stage name
+def stage(name):
+    recorder = _current.get()
+    if recorder is None:
+        return _disabled
+    return _timed(recorder, name)
+
+#Add value to the counter name
+def count(name, value):
+    recorder = _current.get()
+    if recorder is not None:
+        recorder.add_count(name, value)
@@ -1,39 +1,258 @@
-import tkinter as tk
-from tkinter import ttk
-from tkinter import messagebox
-from mesh_generator import generate_bottom_enclousure, generate_power_strip
+#Tkinter interface of the generator
+#Tkinter and matplotlib are imported when the window is created, so the jobs and the
+#background runner can be imported by headless processes without loading them
+
+import os
+import queue
+import threading
+
+from instrumentation import count, recording, stage
+from mesh_generator import PREVIEW_LOD, build_bottom_enclosure, build_power_strip, check_strip_parameters
+from obj_io import CHUNK_ROWS, iter_obj_chunks
+from preview import draw_mesh
+from strip_topology import reparameterize_power_strip
+
+#Delay after the last change of a field before the preview is rebuilt, in ms
+DEBOUNCE_MS = 400
+
+#Interval at which the window reads the messages of the worker thread, in ms
+POLL_MS = 50
+
+#Range of the number of plugs in the window, tighter than the generators' one since every
+#change of the field rebuilds the preview
+INTERFACE_PLUG_LIMITS = (2, 8)
+
+class Cancelled(Exception):
+    pass
+
+#Runs the generation in a background thread, so the window never freezes
+#Only one job runs at a time: the jobs are run one after the other by a single worker thread,
+#and submitting a job cancels the running one and the ones still waiting.
+#A job is a function job(progress), where progress(fraction, message) reports its state
+#and raises Cancelled once the job is cancelled, so the job stops at its next report.
+#The callbacks are always called from the Tk loop, never from the worker thread.
+class BackgroundRunner:
+
+    def __init__(self, root):
+        self.root = root
+        self.messages = queue.Queue()
+        self.jobs = queue.Queue()
+        self.token = 0
+        self.cancel_event = threading.Event()
+        self.callbacks = None
+        threading.Thread(target=self.work, daemon=True).start()
+        self.root.after(POLL_MS, self.poll)
+
+    @property
+    def busy(self):
+        return self.callbacks is not None
+
+    def submit(self, job, on_progress, on_done, on_error):
+        self.cancel()
+        self.token += 1
+        self.cancel_event = threading.Event()
+        self.callbacks = (on_progress, on_done, on_error)
+        self.jobs.put((job, self.token, self.cancel_event))
+
+    def cancel(self):
+        self.cancel_event.set()
+        self.callbacks = None
+
+    #Body of the worker thread, the jobs cancelled while waiting are skipped
+    def work(self):
+        while True:
+            job, token, cancel_event = self.jobs.get()
+            if not cancel_event.is_set():
+                self.run(job, token, cancel_event)
+
+    #Run one job in the worker thread
+    def run(self, job, token, cancel_event):
+        def progress(fraction, message):
+            if cancel_event.is_set():
+                raise Cancelled()
+            self.messages.put((token, 'progress', (fraction, message)))
+
+        try:
+            result = job(progress)
+        except Cancelled:
+            return
+        except Exception as e:
+            self.messages.put((token, 'error', e))
+        else:
+            self.messages.put((token, 'done', result))
+
+    #Forward the messages of the current job to its callbacks
+    def poll(self):
+        while True:
+            try:
+                token, kind, value = self.messages.get_nowait()
+            except queue.Empty:
+                break
+            if token != self.token or self.callbacks is None:
+                #Message of a cancelled job
+                continue
+            on_progress, on_done, on_error = self.callbacks
+            if kind == 'progress':
+                on_progress(*value)
+            else:
+                self.callbacks = None
+                (on_done if kind == 'done' else on_error)(value)
+        self.root.after(POLL_MS, self.poll)
+
+#Write a mesh as an OBJ file one chunk at a time, reporting the progress from start to end
+#A cancelled write removes the partial file
+def write_obj_with_progress(file_path, vertices, faces, progress, start, end, message):
+    total = max(-(-len(vertices) // CHUNK_ROWS) + -(-len(faces) // CHUNK_ROWS), 1)
+    written = 0
+    try:
+        with open(file_path, 'wb') as file:
+            for done, chunk in enumerate(iter_obj_chunks(vertices, faces)):
+                progress(start + (end - start) * done / total, message)
+                file.write(chunk)
+                written += len(chunk)
+    except BaseException:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+        raise
+    return written
+
+#Job building the top shell for the preview
+#The strip is evaluated on its cached topology, so only the first preview of a plug type
+#and number of plugs builds it, moving a dimension is then a single product
+#The plugs of the preview are simplified (PREVIEW_LOD), the written files use the full models
+def preview_job(parameters):
+    def job(progress):
+        progress(0, 'Building the preview...')
+        mesh = reparameterize_power_strip(**parameters, lod=PREVIEW_LOD)
+        progress(1, 'Preview ready')
+        return mesh
+    return job
+
+#Job writing the same files as generate_power_strip and generate_bottom_enclousure
+#Both files are written under temporary names and renamed only once both are complete, so a
+#cancel or an error never leaves a new top shell next to an old enclosure
+#Returns the recorder of the stages
+def generation_job(parameters, path=''):
+    def job(progress):
+        outputs = [path + 'output_top.obj', path + 'output_bottom.obj']
+        temporaries = [output + '.part' for output in outputs]
+        try:
+            with recording() as recorder:
+                progress(0, 'Building the power strip...')
+                vertices, faces = build_power_strip(**parameters)
+                with stage('write'):
+                    count('bytes_written', write_obj_with_progress(temporaries[0], vertices, faces, progress,
+                                                                   0.1, 0.8, 'Writing the power strip...'))
+                progress(0.8, 'Building the enclosure...')
+                with stage('enclosure'):
+                    vertices, faces = build_bottom_enclosure(parameters['num_plugs'], parameters['lateral_gap'],
+                                                             parameters['vertical_gap'],
+                                                             parameters['distance_between_plugs'])
+                with stage('enclosure_write'):
+                    count('bytes_written', write_obj_with_progress(temporaries[1], vertices, faces, progress,
+                                                                   0.85, 1, 'Writing the enclosure...'))
+            for temporary, output in zip(temporaries, outputs):
+                os.replace(temporary, output)
+        except BaseException:
+            for temporary in temporaries:
+                if os.path.exists(temporary):
+                    os.remove(temporary)
+            raise
+        return recorder
+    return job
 
 def create_interface():
-    def modelise():
-        
+    import tkinter as tk
+    from tkinter import ttk
+    from tkinter import messagebox
+
+    from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+    from matplotlib.figure import Figure
+
+    #Parameters of the form, raises ValueError when a field is invalid
+    #The ranges are those of the generators, see mesh_generator.PARAMETER_LIMITS,
+    #except for the number of plugs (INTERFACE_PLUG_LIMITS)
+    def read_parameters():
         plug = type_combobox.get()
-        
+        low, high = INTERFACE_PLUG_LIMITS
         try:
             number_of_plugs = int(number_of_plugs_entry.get())
-            if number_of_plugs < 2 or number_of_plugs > 8:
-                raise ValueError("Number of plugs must be an integer between 2 and 8")
-
-            di1 = float(d1.get())
-            if di1 < 5 or di1 > 60:
-                raise ValueError("D1 must be between 5 and 60")
-            
-            di2 = float(d2.get())
-            if di2 < 5 or di2 > 20:
-                raise ValueError("D2 must be between 5 and 60")
-            
-            di3 = float(d3.get())
-            if di3 < 5 or di3 > 20:
-                raise ValueError("D3 must be between 5 and 60")
+        except ValueError:
+            raise ValueError(f"Number of plugs must be an integer between {low} and {high}")
+        if not low <= number_of_plugs <= high:
+            raise ValueError(f"Number of plugs must be an integer between {low} and {high}")
+        try:
+            di1, di2, di3 = float(d1.get()), float(d2.get()), float(d3.get())
+        except ValueError:
+            raise ValueError("D1, D2 and D3 must be numbers")
+        check_strip_parameters(number_of_plugs, di1, di2, di3)
+
+        return {'num_plugs': number_of_plugs, 'plug_type': plug,
+                'distance_between_plugs': di1, 'lateral_gap': di2, 'vertical_gap': di3}
+
+    def show_progress(fraction, message):
+        progress_bar['value'] = 100 * fraction
+        status_label['text'] = message
 
+    def set_generating(generating):
+        modelise_button['state'] = 'disabled' if generating else 'normal'
+        cancel_button['state'] = 'normal' if generating else 'disabled'
 
+    def modelise():
+        try:
+            parameters = read_parameters()
         except ValueError as e:
             messagebox.showerror("Input Error", str(e))
-            return  
-        
-        
-        generate_power_strip(num_plugs=number_of_plugs, plug_type=plug,lateral_gap=di2, vertical_gap=di3, distance_between_plugs=di1)
-        generate_bottom_enclousure(num_plugs=number_of_plugs,lateral_gap=di2, vertical_gap=di3, distance_between_plugs=di1, path="")
-        messagebox.showinfo("Modelisation Completed", "Your powerstrip has been modelled successfully!")
+            return
+
+        def done(recorder):
+            set_generating(False)
+            show_progress(1, 'Done')
+            messagebox.showinfo("Modelisation Completed", "Your powerstrip has been modelled successfully!\n\n" + recorder.summary())
+            schedule_preview()
+
+        def failed(error):
+            set_generating(False)
+            show_progress(0, 'Failed')
+            messagebox.showerror("Modelisation Error", str(error))
+
+        set_generating(True)
+        runner.submit(generation_job(parameters), show_progress, done, failed)
+
+    def cancel():
+        runner.cancel()
+        set_generating(False)
+        show_progress(0, 'Cancelled')
+
+    #Rebuild the preview once the fields have not changed for DEBOUNCE_MS
+    pending_preview = [None]
+
+    def schedule_preview(event=None):
+        if pending_preview[0] is not None:
+            root.after_cancel(pending_preview[0])
+        pending_preview[0] = root.after(DEBOUNCE_MS, refresh_preview)
+
+    def refresh_preview():
+        pending_preview[0] = None
+        if cancel_button['state'] == 'normal':
+            #Files are being written, the preview is rebuilt when they are done
+            return
+        try:
+            parameters = read_parameters()
+        except ValueError as e:
+            status_label['text'] = str(e)
+            return
+
+        def done(mesh):
+            axis.clear()
+            draw_mesh(axis, *mesh)
+            canvas.draw_idle()
+            show_progress(0, 'Preview ready')
+
+        def failed(error):
+            status_label['text'] = str(error)
+
+        runner.submit(preview_job(parameters), show_progress, done, failed)
 
     # Create the main window
     root = tk.Tk()
@@ -50,7 +269,7 @@ def create_interface():
     main_image_frame.grid(row=1, column=0, padx=10, pady=10, sticky="nsew")
 
     # Load the image
-    powerstrip = tk.PhotoImage(file="Images/powerstrip.png")
+    powerstrip = tk.PhotoImage(file=os.path.join(os.path.dirname(os.path.abspath(__file__)), "Images", "powerstrip.png"))
 
     # Display the image
     powerstrip_label = tk.Label(main_image_frame, image=powerstrip)
@@ -100,4 +319,32 @@ def create_interface():
     modelise_button = ttk.Button(form_frame, text="Modelise", command=modelise)
     modelise_button.grid(row=6, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
 
+    cancel_button = ttk.Button(form_frame, text="Cancel", command=cancel, state="disabled")
+    cancel_button.grid(row=7, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
+
+    # Progress of the generation
+    progress_bar = ttk.Progressbar(form_frame, maximum=100)
+    progress_bar.grid(row=8, column=0, columnspan=2, padx=5, pady=5, sticky="nsew")
+    status_label = ttk.Label(form_frame, text="", wraplength=300)
+    status_label.grid(row=9, column=0, columnspan=2, padx=5, pady=5, sticky="w")
+
+    # Preview of the power strip, rebuilt when the parameters change
+    preview_frame = ttk.Frame(root)
+    preview_frame.grid(row=1, column=2, padx=10, pady=10, sticky="nsew")
+    figure = Figure(figsize=(5, 4))
+    axis = figure.add_subplot(111, projection='3d')
+    canvas = FigureCanvasTkAgg(figure, master=preview_frame)
+    canvas.get_tk_widget().pack(fill=tk.BOTH, expand=True)
+
+    for entry in (number_of_plugs_entry, d1, d2, d3):
+        entry.bind("<KeyRelease>", schedule_preview)
+    type_combobox.bind("<<ComboboxSelected>>", schedule_preview)
+
+    runner = BackgroundRunner(root)
+
+    def close():
+        runner.cancel()
+        root.destroy()
+
+    root.protocol("WM_DELETE_WINDOW", close)
     root.mainloop()
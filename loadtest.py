@@ -0,0 +1,84 @@
+#Load test for the generation service (server.py)
+
+#Opens several keep-alive connections and sends generation requests as fast as the
+#server answers them, then reports the latency percentiles and the throughput.
+
+#Usage:
+#   python loadtest.py --url 'http://127.0.0.1:8000/generate?num_plugs=4&part=both' --requests 500 --concurrency 16
+
+import argparse
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+#Send one GET request on an open connection and read the whole response
+#Returns the status code and the body size
+async def fetch(reader, writer, host, target):
+    writer.write(f'GET {target} HTTP/1.1\r\nHost: {host}\r\n\r\n'.encode('latin-1'))
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status, length
+
+#Value below which the given fraction of the sorted samples fall
+def percentile(samples, fraction):
+    if not samples:
+        return float('nan')
+    return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+async def run(url, total, concurrency):
+    parts = urlsplit(url)
+    target = parts.path + ('?' + parts.query if parts.query else '')
+    latencies = []
+    errors = 0
+    remaining = total
+
+    async def client():
+        nonlocal remaining, errors
+        reader, writer = await asyncio.open_connection(parts.hostname, parts.port or 80)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                status, _ = await fetch(reader, writer, parts.netloc, target)
+                latencies.append(time.perf_counter() - start)
+                if status != 200:
+                    errors += 1
+        finally:
+            writer.close()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load test for the generation service.')
+    parser.add_argument('--url', default='http://127.0.0.1:8000/generate?plug_type=European&num_plugs=4')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8)
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args.url, args.requests, args.concurrency))
+    print(f'{report["requests"]} requests, {report["errors"]} errors, {report["seconds"]:.2f} s')
+    print(f'{report["requests_per_second"]:.1f} requests/s, p50 {report["p50_ms"]:.1f} ms, p99 {report["p99_ms"]:.1f} ms')
+
+if __name__ == '__main__':
+    main()
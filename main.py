@@ -1,6 +1,12 @@
-from interface import create_interface
+import sys
 
 def main():
+    #With options, generate from the command line without opening the window
+    if len(sys.argv) > 1:
+        from cli import main as cli_main
+        raise SystemExit(cli_main())
+
+    from interface import create_interface
     create_interface()
 
 if __name__ == "__main__":
@@ -2,33 +2,44 @@
 #with the given parameters
 
 #European and American power strip models are available
-#For each plug, a model is available
+#For each plug, a model is available, and more can be added with plug_registry.register_plug
 
 #The power strip is generated by placing the plugs in the correct positions
 
+import operator
+import os
+
 import numpy as np
-import matplotlib.pyplot as plt
+
+from instrumentation import count, stage
+from mesh_validation import validate_mesh
+from mesh_welding import weld_mesh
+from exporters import write_instanced, write_mesh
+from obj_io import read_obj, write_obj_chunks
+from plug_registry import get_plug, register_plug
+from preview import PREVIEW_MAX_FACES, PREVIEW_MAX_POINTS, draw_mesh, draw_points, mesh_axis, render_png, show_or_save
+from strip_assembly import (PLUG_WIDTH, assemble_mixed_strip, assemble_plug_grid, assemble_power_strip,
+                            assemble_strip_shell, iter_strip_faces, iter_strip_vertices)
+from template_cache import check_lod, load_template
 
 #Here are the indices needed for connecting the plugs to the power strip
 european_plug_vert_idx = [528, 527, 532, 530, 526, 525, 531, 529]
 american_plug_vert_idx = [48, 50, 45, 46, 47, 49, 43, 44]
 
-#Read the OBJ file
-def read_obj(file_path):
-    vertices = []
-    faces = []
-    with open(file_path, 'r') as file:
-        for line in file:
-            if line.startswith('v '):
-                vertices.append(list(map(float, line.strip().split()[1:])))
-            elif line.startswith('f '):
-                face = line.strip().split()[1:]
-                face_indices = []
-                for vertex in face:
-                    vertex_indices = vertex.split('/')
-                    face_indices.append(int(vertex_indices[0]))
-                faces.append(face_indices)
-    return np.array(vertices), np.array(faces)
+#Template files used by the generators, found next to this file whatever the working directory
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Plug models')
+plug_models = {'European': os.path.join(MODELS_DIR, 'European modified.obj'),
+               'American': os.path.join(MODELS_DIR, 'American modified.obj')}
+bottom_enclosure_model = os.path.join(MODELS_DIR, 'Bottom_enclosure.obj')
+
+register_plug('European', plug_models['European'], european_plug_vert_idx, height=39.5, offset=-2.5)
+register_plug('American', plug_models['American'], american_plug_vert_idx, height=39.5, offset=0)
+
+#Version of the generated geometry, to be increased whenever the output changes
+GENERATOR_VERSION = 2
+
+#Level of detail of the plugs in the previews (see template_cache.LOD_FACE_RATIOS)
+PREVIEW_LOD = 2
 
 #Offset the vertices in space
 def offset_vertices(vertices, offset):
@@ -37,299 +48,305 @@ def offset_vertices(vertices, offset):
 #When the power strip is generated, the indices of the faces need to be offset
 #by the number of vertices in the power strip
 def offset_indices_faces(faces, offset):
-    faces_copy = faces.copy() #Make a copy of the faces, so the original is not modified
-    for i in range(len(faces_copy)):
-        for j in range(len(faces_copy[i])):
-            faces_copy[i][j] += offset
-    return faces_copy
-
-# Plot the vertices
-def plot_vertex(vertices):
-    fig = plt.figure()
-    ax = fig.add_subplot(111, projection='3d')
-
-    # Plot the vertices
-    ax.scatter(vertices[:, 0], vertices[:, 1], vertices[:, 2])
-
-    # Set the aspect ratio of the plot
-    max_range = np.array([vertices[:, 0].max()-vertices[:, 0].min(), vertices[:, 1].max()-vertices[:, 1].min(), vertices[:, 2].max()-vertices[:, 2].min()]).max()
-    Xb = 0.5*max_range*np.mgrid[-1:2:2,-1:2:2,-1:2:2][0].flatten() + 0.5*(vertices[:, 0].max()+vertices[:, 0].min())
-    Yb = 0.5*max_range*np.mgrid[-1:2:2,-1:2:2,-1:2:2][1].flatten() + 0.5*(vertices[:, 1].max()+vertices[:, 1].min())
-    Zb = 0.5*max_range*np.mgrid[-1:2:2,-1:2:2,-1:2:2][2].flatten() + 0.5*(vertices[:, 2].max()+vertices[:, 2].min())
-    for xb, yb, zb in zip(Xb, Yb, Zb):
-        ax.plot([xb], [yb], [zb], 'w')
-
-    # Set labels
-    ax.set_xlabel('X')
-    ax.set_ylabel('Y')
-    ax.set_zlabel('Z')
-
-    plt.show()
-
-# Plot vertex + faces
-def plot_vertex_faces(vertices, faces):
-    fig = plt.figure()
-    ax = fig.add_subplot(111, projection='3d')
-
-    # Plot the vertices
-    ax.scatter(vertices[:, 0], vertices[:, 1], vertices[:, 2])
-
-    # Faces are given as indices of the vertices to be connected
-    for face in faces:
-        face_vertices = vertices[face-1]
-        face_vertices = np.concatenate((face_vertices, [face_vertices[0]]), axis=0)
-        ax.plot(face_vertices[:, 0], face_vertices[:, 1], face_vertices[:, 2])
-
-    # Set the aspect ratio of the plot
-    max_range = np.array([vertices[:, 0].max()-vertices[:, 0].min(), vertices[:, 1].max()-vertices[:, 1].min(), vertices[:, 2].max()-vertices[:, 2].min()]).max()
-    Xb = 0.5*max_range*np.mgrid[-1:2:2,-1:2:2,-1:2:2][0].flatten() + 0.5*(vertices[:, 0].max()+vertices[:, 0].min())
-    Yb = 0.5*max_range*np.mgrid[-1:2:2,-1:2:2,-1:2:2][1].flatten() + 0.5*(vertices[:, 1].max()+vertices[:, 1].min())
-    Zb = 0.5*max_range*np.mgrid[-1:2:2,-1:2:2,-1:2:2][2].flatten() + 0.5*(vertices[:, 2].max()+vertices[:, 2].min())
-    for xb, yb, zb in zip(Xb, Yb, Zb):
-        ax.plot([xb], [yb], [zb], 'w')
-
-    # Set labels
-    ax.set_xlabel('X')
-    ax.set_ylabel('Y')
-    ax.set_zlabel('Z')
-
-    plt.show()
-#Add h-gap and v-gap
-def generate_power_strip(num_plugs, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5, visuliaze=False, path=''):
-
-    if distance_between_plugs < 5 or distance_between_plugs > 60:
-        raise ValueError('Invalid distance between plugs')
-    
-    if lateral_gap < 5 or lateral_gap > 25:
-        raise ValueError('Invalid lateral gap')
-    
-    if vertical_gap < 5 or vertical_gap > 25:
-        raise ValueError('Invalid vertical gap')
-    
-    # The actual distance we need for calculating the offset
-    # is the distance between the plugs + the height of the plug
-    # This constant is the height of the plug
-    distance_between_plugs += 39.5
-
+    return faces + offset #A new array is returned, so the original is not modified
+
+# Plot the vertices, as one scatter of at most max_points points
+#With file_path, the plot is rendered offscreen to a PNG file instead of a window
+def plot_vertex(vertices, max_points=PREVIEW_MAX_POINTS, file_path=None):
+    ax = mesh_axis(offscreen=file_path is not None)
+    draw_points(ax, vertices, max_points)
+    show_or_save(ax, file_path)
+
+# Plot vertex + faces, as one collection of at most max_faces triangles
+#With file_path, the plot is rendered offscreen to a PNG file instead of a window
+def plot_vertex_faces(vertices, faces, max_faces=PREVIEW_MAX_FACES, file_path=None):
+    ax = mesh_axis(offscreen=file_path is not None)
+    draw_mesh(ax, vertices, faces, max_faces)
+    show_or_save(ax, file_path)
+
+#Plot a power strip built with simplified plugs, lod is its level of detail
+def plot_power_strip(num_plugs, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5, lod=PREVIEW_LOD,
+                     max_faces=PREVIEW_MAX_FACES, file_path=None):
+    vertices, faces = build_power_strip(num_plugs, plug_type, distance_between_plugs, lateral_gap, vertical_gap, lod)
+    plot_vertex_faces(vertices, faces, max_faces, file_path)
+
+#Allowed ranges of the dimensions in mm (D1, D2 and D3 in the interface) and of the number of plugs
+#These rules are shared by the generators, the interface and the command line
+#The number of plugs bounds the memory of a build (a few MB per thousand plugs), it is also
+#the largest number of plugs of a grid
+PARAMETER_LIMITS = {
+    'num_plugs': (1, 10000),
+    'distance_between_plugs': (5, 60),
+    'lateral_gap': (5, 25),
+    'vertical_gap': (5, 25),
+}
+
+#Check a count against the range of the number of plugs, it must be a real integer (not 2.0)
+def check_count(value, label):
+    low, high = PARAMETER_LIMITS['num_plugs']
+    try:
+        valid = not isinstance(value, bool) and low <= operator.index(value) <= high
+    except TypeError:
+        valid = False
+    if not valid:
+        raise ValueError(f'Invalid {label}, must be an integer between {low} and {high}')
+
+#Check the dimensions of a power strip
+def check_strip_parameters(num_plugs, distance_between_plugs, lateral_gap, vertical_gap):
+
+    check_count(num_plugs, 'number of plugs')
+
+    values = {'distance_between_plugs': distance_between_plugs, 'lateral_gap': lateral_gap, 'vertical_gap': vertical_gap}
+    for name, value in values.items():
+        low, high = PARAMETER_LIMITS[name]
+        if not low <= value <= high:
+            raise ValueError(f'Invalid {name.replace("_", " ")}, must be between {low:g} and {high:g}')
+
+#Template of a registered plug type, as (vertices, faces, connector indices, offset along Y, height)
+#lod is the level of detail of the template, 0 is the full model
+def plug_template(plug_type, lod=0):
+    check_lod(lod)
+    plug = get_plug(plug_type)
     # Read the OBJ file
-    if plug_type == 'European':
-        plug_vertices, plug_faces = read_obj('Plug models/European modified.obj')
-        plug_vert_idx = european_plug_vert_idx
-        plug_offset = -2.5
-    elif plug_type == 'American':
-        plug_vertices, plug_faces = read_obj('Plug models/American modified.obj')
-        plug_vert_idx = american_plug_vert_idx
-        plug_offset = 0
-    else:
-        raise ValueError('Invalid plug type')
-    
-    final_vertices = []
-    final_faces = []
-    prev_offset = np.array([lateral_gap, plug_offset, 45+vertical_gap])
-    key_vertices_idx = None
-    key_vertices_idx_next = None
-    key_vertices_idx_next_bottom = None
-
-    top_vertices_idx = [] #1-indexed due to OBJ file format
-    bottom_vertices_idx = [] #1-indexed due to OBJ file format
-
-    for _ in range(num_plugs):
-        # Offset vertices
-        plug_vertices = offset_vertices(plug_vertices, prev_offset)
-
-        # Define key vertices and indices
-        key_vertices = [[0, 0, 0], [lateral_gap, 0, 0], [lateral_gap+45, 0, 0], [2*lateral_gap+45, 0, 0]]
-        key_vertices += [[0, 5, 0], [lateral_gap, 5, 0], [lateral_gap+45, 5, 0], [2*lateral_gap+45, 5, 0]]
-        if _ == 0:
-            final_vertices.extend(key_vertices)
-
-        # Add additional vertices for each plug, top side
-        final_vertices.extend([[0, 0, 45 + vertical_gap + distance_between_plugs * _], [2*lateral_gap+45, 0, 45 + vertical_gap + distance_between_plugs * _]])
-
-        # Update key vertices indices, top side
-        if _ == 0:
-            key_vertices_idx = [1, 2, 3, 4]
-            key_vertices_idx.extend([len(final_vertices) - 1, len(final_vertices)])
-            top_vertices_idx.extend(key_vertices_idx)
+    with stage('template_load'):
+        if lod == 0:
+            plug_vertices, plug_faces = plug.load()
+            plug_vert_idx = plug.connector_indices
         else:
-            key_vertices_idx = key_vertices_idx_next
-            key_vertices_idx.extend([len(final_vertices) - 1, len(final_vertices)])
-            top_vertices_idx.extend(key_vertices_idx[4:6])   
+            plug_vertices, plug_faces, plug_vert_idx = plug.load_lod(lod)
+    return plug_vertices, plug_faces, plug_vert_idx, plug.offset, plug.height
+
+#Build the power strip as (vertices, faces) arrays, faces are 1-indexed
+#plug_type is a plug name, or a list with the plug name of every slot for mixed strips
+#(for example ['European']*4 + ['American']*2)
+#lod is the level of detail of the plugs, 0 is the full model
+#Add h-gap and v-gap
+def build_power_strip(num_plugs, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5, lod=0):
+    check_strip_parameters(num_plugs, distance_between_plugs, lateral_gap, vertical_gap)
 
-        # Start preparing for the next iteration
-        key_vertices_idx_next = [len(final_vertices)-1, 0, 0, len(final_vertices)]
+    names, slots = plug_slots(num_plugs, plug_type)
+    if len(names) > 1:
+        templates = [plug_template(name, lod) for name in names]
+        return assemble_mixed_strip(templates, slots, distance_between_plugs, lateral_gap, vertical_gap)
+    plug_type = names[0]
 
-        # Add additional vertices for each plug, bottom side
-        final_vertices.extend([[0, 5, 45 + vertical_gap + distance_between_plugs * _], [2*lateral_gap+45, 5, 45 + vertical_gap + distance_between_plugs * _]])
+    plug_vertices, plug_faces, plug_vert_idx, plug_offset, plug_height = plug_template(plug_type, lod)
 
-        # Update key vertices indices, bottom side
-        if _ == 0:
-            key_vertices_idx.extend([5, 6, 7, 8])
-            key_vertices_idx.extend([len(final_vertices) - 1, len(final_vertices)])
-            bottom_vertices_idx.extend(key_vertices_idx[6:])
-        else:
-            key_vertices_idx.extend(key_vertices_idx_next_bottom)
-            key_vertices_idx.extend([len(final_vertices) - 1, len(final_vertices)])
-            bottom_vertices_idx.extend(key_vertices_idx[10:12])
-
-        # Continue preparing for the next iteration
-        key_vertices_idx_next_bottom = [len(final_vertices)-1, 0, 0, len(final_vertices)]
-
-        # Offset and add vertices and faces
-        vertex_offset = len(final_vertices)
-        final_vertices.extend(plug_vertices)
-        final_faces.extend(offset_indices_faces(plug_faces, vertex_offset))
-
-        # Define new faces, top side
-        new_faces = [
-            [key_vertices_idx[0], plug_vert_idx[0] + vertex_offset, key_vertices_idx[4]],
-            [key_vertices_idx[0], key_vertices_idx[1], plug_vert_idx[0] + vertex_offset],
-            [plug_vert_idx[0] + vertex_offset, plug_vert_idx[1] + vertex_offset, key_vertices_idx[4]],
-            [key_vertices_idx[1], plug_vert_idx[2] + vertex_offset, plug_vert_idx[0] + vertex_offset],
-            [key_vertices_idx[2], plug_vert_idx[2] + vertex_offset, key_vertices_idx[1]],
-            [key_vertices_idx[3], plug_vert_idx[2] + vertex_offset, key_vertices_idx[2]],
-            [key_vertices_idx[3], key_vertices_idx[5], plug_vert_idx[2] + vertex_offset],
-            [key_vertices_idx[5], plug_vert_idx[3] + vertex_offset, plug_vert_idx[2] + vertex_offset]
-        ]
-        final_faces.extend(new_faces)
-
-        # Define new faces, bottom side
-        new_faces = [
-            [key_vertices_idx[6], key_vertices_idx[10], plug_vert_idx[4] + vertex_offset],
-            [key_vertices_idx[6], plug_vert_idx[4] + vertex_offset, key_vertices_idx[7]],
-            [key_vertices_idx[10], plug_vert_idx[5] + vertex_offset, plug_vert_idx[4] + vertex_offset],
-            [key_vertices_idx[7], plug_vert_idx[4] + vertex_offset, plug_vert_idx[6] + vertex_offset],
-            [key_vertices_idx[7], plug_vert_idx[6] + vertex_offset, key_vertices_idx[8]],
-            [key_vertices_idx[8], plug_vert_idx[6] + vertex_offset, key_vertices_idx[9]],
-            [key_vertices_idx[9], plug_vert_idx[6] + vertex_offset, key_vertices_idx[11]],
-            [plug_vert_idx[6] + vertex_offset, plug_vert_idx[7] + vertex_offset, key_vertices_idx[11]]
-        ]
-        final_faces.extend(new_faces)
-
-        # Update previous offset for next iteration
-        prev_offset = np.array([0, 0, distance_between_plugs])
-        key_vertices_idx_next[1] = plug_vert_idx[1] + vertex_offset
-        key_vertices_idx_next[2] = plug_vert_idx[3] + vertex_offset
-        key_vertices_idx_next_bottom[1] = plug_vert_idx[5] + vertex_offset
-        key_vertices_idx_next_bottom[2] = plug_vert_idx[7] + vertex_offset
-
-    # Close the power strip
-    #Key for top side
-    key_vertices_idx = [len(final_vertices)-2 - len(plug_vertices) - 1] + \
-                       [plug_vert_idx[1] + vertex_offset, plug_vert_idx[3] + vertex_offset] + \
-                       [len(final_vertices)-2 - len(plug_vertices)]
-    final_vertices.extend([[0, 0, distance_between_plugs * num_plugs + 2 * vertical_gap - 15], [2*lateral_gap+45, 0, distance_between_plugs * num_plugs + 2 * vertical_gap - 15]])
-    key_vertices_idx.extend([len(final_vertices) - 1, len(final_vertices)])
-
-    top_vertices_idx.extend([key_vertices_idx[0], key_vertices_idx[3], key_vertices_idx[4], key_vertices_idx[5]])
-    #Key for bottom side
-    key_vertices_idx += [len(final_vertices)-2 - len(plug_vertices) - 1] + \
-                              [plug_vert_idx[5] + vertex_offset, plug_vert_idx[7] + vertex_offset] + \
-                              [len(final_vertices)-2 - len(plug_vertices)]
-    final_vertices.extend([[0, 5, distance_between_plugs * num_plugs + 2 * vertical_gap - 15], [2*lateral_gap+45, 5, distance_between_plugs * num_plugs + 2 * vertical_gap - 15]])
-    key_vertices_idx.extend([len(final_vertices) - 1, len(final_vertices)])
-
-    bottom_vertices_idx.extend([key_vertices_idx[6], key_vertices_idx[9], key_vertices_idx[10], key_vertices_idx[11]])
-
-    # Top side
-    new_faces = [
-        [key_vertices_idx[0], key_vertices_idx[1], key_vertices_idx[4]],
-        [key_vertices_idx[1], key_vertices_idx[2], key_vertices_idx[4]],
-        [key_vertices_idx[2], key_vertices_idx[5], key_vertices_idx[4]],
-        [key_vertices_idx[2], key_vertices_idx[3], key_vertices_idx[5]]
-    ]
-    final_faces.extend(new_faces)
-
-    # Bottom side
-    new_faces = [
-        [key_vertices_idx[6], key_vertices_idx[10], key_vertices_idx[7]],
-        [key_vertices_idx[7], key_vertices_idx[10], key_vertices_idx[8]],
-        [key_vertices_idx[8], key_vertices_idx[10], key_vertices_idx[11]],
-        [key_vertices_idx[8], key_vertices_idx[11], key_vertices_idx[9]]
-    ]
-    final_faces.extend(new_faces)
-
-    # Lateral faces
-
-    # Flatten and order the lists
-    top_vertices_idx = list(set(top_vertices_idx))
-    bottom_vertices_idx = list(set(bottom_vertices_idx))
-    top_vertices_idx.sort()
-    bottom_vertices_idx.sort()
-
-    # Z-
-    new_faces = [[top_vertices_idx[0], bottom_vertices_idx[0], top_vertices_idx[1]],
-                 [top_vertices_idx[1], bottom_vertices_idx[0], bottom_vertices_idx[1]],
-                 [top_vertices_idx[1], bottom_vertices_idx[1], top_vertices_idx[2]],
-                 [top_vertices_idx[2], bottom_vertices_idx[1], bottom_vertices_idx[2]],
-                 [top_vertices_idx[2], bottom_vertices_idx[2], top_vertices_idx[3]],
-                 [top_vertices_idx[3], bottom_vertices_idx[2], bottom_vertices_idx[3]]
-                 ]
-    final_faces.extend(new_faces)
-
-    # Z+
-    new_faces = [[top_vertices_idx[len(top_vertices_idx)-2], top_vertices_idx[len(top_vertices_idx)-1], bottom_vertices_idx[len(bottom_vertices_idx)-1]],
-                 [bottom_vertices_idx[len(bottom_vertices_idx)-2], top_vertices_idx[len(top_vertices_idx)-2], bottom_vertices_idx[len(bottom_vertices_idx)-1]]
-                ]
-    final_faces.extend(new_faces)
-
-    #Remove initial vertices not taking part anymore
-    #This way the data is cleaner for the algorithm
-    top_vertices_idx.remove(2)
-    top_vertices_idx.remove(3)
-    bottom_vertices_idx.remove(6)
-    bottom_vertices_idx.remove(7)
-    
-    # X-
-    for i in range(0, len(top_vertices_idx)-2, 2):
-        new_faces = [[top_vertices_idx[i], top_vertices_idx[i+2], bottom_vertices_idx[i]],
-                     [bottom_vertices_idx[i+2], bottom_vertices_idx[i], top_vertices_idx[i+2]]
-                    ]
-        final_faces.extend(new_faces)
-
-    # X+
-    for i in range(1, len(top_vertices_idx)-1, 2):
-        new_faces = [[top_vertices_idx[i], bottom_vertices_idx[i], top_vertices_idx[i+2]],
-                     [bottom_vertices_idx[i], bottom_vertices_idx[i+2], top_vertices_idx[i+2]]
-                    ]
-        final_faces.extend(new_faces)
+    # The actual distance we need for calculating the offset
+    # is the distance between the plugs + the height of the plug
+    distance_between_plugs += plug_height
     
-    # Convert final_vertices and final_faces to NumPy arrays
-    final_vertices = np.array(final_vertices)
-    final_faces = np.array(final_faces)
+    # Place the plugs and build the shell around them
+    return assemble_power_strip(plug_vertices, plug_faces, plug_vert_idx, plug_offset,
+                                num_plugs, distance_between_plugs, lateral_gap, vertical_gap)
+
+#Plug types of a strip, as (distinct plug names, index in the names of every slot)
+def plug_slots(num_plugs, plug_type):
+    if isinstance(plug_type, str):
+        return [plug_type], [0] * num_plugs
+    if len(plug_type) != num_plugs:
+        raise ValueError('The number of plug types must match the number of plugs')
+    names = list(dict.fromkeys(plug_type))
+    return names, [names.index(name) for name in plug_type]
+
+#Build the power strip for the instanced outputs, as (shell vertices, shell faces, prototypes)
+#The shell holds the connector vertices of every plug, the plugs themselves are the prototypes:
+#one (plug name, template vertices, template faces, translations) per plug type
+def build_instanced_power_strip(num_plugs, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5, lod=0):
+    check_strip_parameters(num_plugs, distance_between_plugs, lateral_gap, vertical_gap)
+    names, slots = plug_slots(num_plugs, plug_type)
+    templates = [plug_template(name, lod) for name in names]
+    shell_vertices, shell_faces, translations = assemble_strip_shell(templates, slots, distance_between_plugs,
+                                                                     lateral_gap, vertical_gap)
+    slots = np.asarray(slots)
+    prototypes = [(name, template[0], template[1], translations[slots == index])
+                  for index, (name, template) in enumerate(zip(names, templates))]
+    return shell_vertices, shell_faces, prototypes
+
+#Check the columns of a grid, the distance between columns follows the rule of the distance between plugs
+def check_grid_parameters(rows, columns, distance_between_plugs, lateral_gap, vertical_gap, distance_between_columns):
+    check_strip_parameters(rows, distance_between_plugs, lateral_gap, vertical_gap)
+    check_count(columns, 'number of columns')
+    if rows * columns > PARAMETER_LIMITS['num_plugs'][1]:
+        raise ValueError(f'Invalid grid, must have at most {PARAMETER_LIMITS["num_plugs"][1]} plugs')
+    low, high = PARAMETER_LIMITS['distance_between_plugs']
+    if not low <= distance_between_columns <= high:
+        raise ValueError(f'Invalid distance between columns, must be between {low:g} and {high:g}')
+
+#Build a grid of rows x columns plugs of one type (desk hubs, panels) as (vertices, faces) arrays
+#The rows run along the strip (Z) and the columns across it (X), distance_between_columns
+#is the gap between two columns, the distance between plugs by default
+#A single column is the power strip of build_power_strip
+def build_power_grid(rows, columns, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5,
+                     distance_between_columns=None, lod=0):
+    if distance_between_columns is None:
+        distance_between_columns = distance_between_plugs
+    check_grid_parameters(rows, columns, distance_between_plugs, lateral_gap, vertical_gap, distance_between_columns)
+    if not isinstance(plug_type, str):
+        raise ValueError('Invalid plug type, grids use a single plug type')
+    if columns == 1:
+        return build_power_strip(rows, plug_type, distance_between_plugs, lateral_gap, vertical_gap, lod)
+
+    plug_vertices, plug_faces, plug_vert_idx, plug_offset, plug_height = plug_template(plug_type, lod)
+    return assemble_plug_grid(plug_vertices, plug_faces, plug_vert_idx, plug_offset, rows, columns,
+                              distance_between_plugs + plug_height, distance_between_columns + PLUG_WIDTH,
+                              lateral_gap, vertical_gap)
+
+#Same mesh as build_power_strip, as two iterators of vertex and face chunks
+#Each chunk holds plugs_per_chunk plugs, so the memory used does not grow with num_plugs
+#Only strips of a single plug type can be streamed
+def stream_power_strip(num_plugs, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5, plugs_per_chunk=64,
+                       lod=0):
+    check_strip_parameters(num_plugs, distance_between_plugs, lateral_gap, vertical_gap)
+    if not isinstance(plug_type, str):
+        raise ValueError('Invalid plug type, mixed strips cannot be streamed')
+    plug_vertices, plug_faces, plug_vert_idx, plug_offset, plug_height = plug_template(plug_type, lod)
+    distance_between_plugs += plug_height
+
+    vertex_chunks = iter_strip_vertices(plug_vertices, plug_offset, num_plugs, distance_between_plugs,
+                                        lateral_gap, vertical_gap, plugs_per_chunk)
+    face_chunks = iter_strip_faces(plug_faces, plug_vert_idx, num_plugs, len(plug_vertices), plugs_per_chunk)
+    return vertex_chunks, face_chunks
+
+#precision is the number of decimals written for the coordinates, None keeps them exact
+#file_format is 'obj', 'stl' or 'glb', the output is named output_top.<file_format>
+#streaming writes the OBJ a few plugs at a time, for very long strips
+#validate checks the mesh before it is written and returns the MeshReport
+#weld merges the coincident vertices and drops the unused ones before writing
+#instanced writes every plug template once with the translations of its copies (obj with a manifest, or glb)
+#thumbnail also renders a PNG preview of the strip offscreen, named output_top.png
+#lod is the level of detail of the plugs of the written strip, 0 is the full model (lighter exports use 1 to 3)
+#preview_lod is the level of detail of the window and the thumbnail, the one of the written strip by default
+def generate_power_strip(num_plugs, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5, visuliaze=False, path='', precision=None, file_format='obj', streaming=False, validate=False, weld=False, instanced=False, thumbnail=False, lod=0, preview_lod=None):
+    if instanced:
+        if visuliaze or streaming or validate or weld or thumbnail:
+            raise ValueError('Instanced outputs are written without visualization, streaming, validation, welding or thumbnail')
+        shell_vertices, shell_faces, prototypes = build_instanced_power_strip(num_plugs, plug_type, distance_between_plugs,
+                                                                              lateral_gap, vertical_gap, lod)
+        with stage('write'):
+            count('bytes_written', write_instanced(path + 'output_top.' + file_format, shell_vertices, shell_faces,
+                                                   prototypes, file_format, precision))
+        return
+
+    if streaming:
+        if visuliaze or validate or weld or thumbnail or file_format != 'obj':
+            raise ValueError('Streaming only writes OBJ files, without visualization, validation, welding or thumbnail')
+        vertex_chunks, face_chunks = stream_power_strip(num_plugs, plug_type, distance_between_plugs, lateral_gap, vertical_gap,
+                                                        lod=lod)
+        with stage('write'):
+            count('bytes_written', write_obj_chunks(path + 'output_top.obj', vertex_chunks, face_chunks, precision))
+        return
+
+    final_vertices, final_faces = build_power_strip(num_plugs, plug_type, distance_between_plugs, lateral_gap, vertical_gap, lod)
+    if weld:
+        final_vertices, final_faces = weld_and_count(final_vertices, final_faces)
 
     # Plot the vertices and faces
+    preview_vertices, preview_faces = final_vertices, final_faces
+    if (visuliaze or thumbnail) and preview_lod is not None and preview_lod != lod:
+        preview_vertices, preview_faces = build_power_strip(num_plugs, plug_type, distance_between_plugs, lateral_gap,
+                                                            vertical_gap, preview_lod)
     if visuliaze:
-        plot_vertex_faces(final_vertices,final_faces)
+        plot_vertex_faces(preview_vertices, preview_faces)
+    if thumbnail:
+        with stage('thumbnail'):
+            render_png(path + 'output_top.png', preview_vertices, preview_faces)
 
-    # Write the OBJ file
-    with open(path + 'output_top.obj', 'w') as file:
-        for vertex in final_vertices:
-            file.write('v ' + ' '.join(map(str, vertex)) + '\n')
-        for face in final_faces:
-            file.write('f ' + ' '.join(map(str, face)) + '\n')
+    if validate:
+        with stage('validate'):
+            report = validate_mesh(final_vertices, final_faces)
 
-def generate_bottom_enclousure(num_plugs, lateral_gap, vertical_gap, distance_between_plugs, path):
-    
-    #Open the power strip file
-    with open('Plug models/Bottom_enclosure.obj', 'r') as file:
-        power_strip = file.readlines()
-
-        #Substitute the length and witdh of the power strip
-        #If line begins with v, it is a vertex
-        #Any vertex with value 20 is the length of the power strip
-        #Also take into account the inner gap
-        for i in range(len(power_strip)):
-            if power_strip[i].startswith('v '):
-                power_strip[i] = power_strip[i].replace('20.', str(2*vertical_gap + num_plugs*(distance_between_plugs+45) - distance_between_plugs) + '.')
-                power_strip[i] = power_strip[i].replace('17.', str(2*vertical_gap + num_plugs*(distance_between_plugs+45) - distance_between_plugs - 3) + '.')
-                power_strip[i] = power_strip[i].replace('-10.', str(-(2*lateral_gap+45)) + '.')
-                power_strip[i] = power_strip[i].replace('-7.', str(-(2*lateral_gap+42)) + '.')
-
-
-        with open(path + 'output_bottom.obj', 'w') as file:
-            for line in power_strip:
-                file.write(line)
+    # Write the OBJ file
+    with stage('write'):
+        count('bytes_written', write_mesh(path + 'output_top.' + file_format, final_vertices, final_faces, file_format, precision))
+    if validate:
+        return report
+
+#Weld a mesh, the size reduction is reported to the current recording
+def weld_and_count(vertices, faces):
+    with stage('weld'):
+        vertices, faces, report = weld_mesh(vertices, faces)
+    count('merged_vertices', report['merged_vertices'])
+    count('removed_vertices', report['vertices_before'] - report['vertices_after'])
+    count('removed_faces', report['faces_before'] - report['faces_after'])
+    return vertices, faces
+
+#Build the bottom enclosure as (vertices, faces) arrays
+#The template is a 20 x 10 box (X is the length, Z is the width) with a 3 mm wall
+#Vertices on the far side of each axis are moved to fit the power strip,
+#the ones on the near side and the wall thickness stay the same
+def build_bottom_enclosure(num_plugs, lateral_gap, vertical_gap, distance_between_plugs):
+    length = 2*vertical_gap + num_plugs*(distance_between_plugs+45) - distance_between_plugs
+    width = 2*lateral_gap+45
+    return stretch_enclosure(length, width)
+
+#Bottom enclosure of a grid of build_power_grid, as (vertices, faces) arrays
+def build_grid_enclosure(rows, columns, lateral_gap, vertical_gap, distance_between_plugs, distance_between_columns=None):
+    if distance_between_columns is None:
+        distance_between_columns = distance_between_plugs
+    check_grid_parameters(rows, columns, distance_between_plugs, lateral_gap, vertical_gap, distance_between_columns)
+    length = 2*vertical_gap + rows*(distance_between_plugs+45) - distance_between_plugs
+    width = 2*lateral_gap + columns*(distance_between_columns+45) - distance_between_columns
+    return stretch_enclosure(length, width)
+
+#Enclosure template stretched to the given outer length and width
+def stretch_enclosure(length, width):
+    template_vertices, template_faces = load_template(bottom_enclosure_model)
+
+    #Tag the vertices driven by the length and by the width of the power strip
+    template_length = template_vertices[:, 0].max()
+    template_width = -template_vertices[:, 2].min()
+    length_driven = template_vertices[:, 0] > template_length / 2
+    width_driven = template_vertices[:, 2] < -template_width / 2
+
+    vertices = np.array(template_vertices, dtype=np.float64)
+    #Driven vertices keep their distance to the far side, which is moved
+    vertices[:, 0] = np.where(length_driven, length - (template_length - vertices[:, 0]), vertices[:, 0])
+    vertices[:, 2] = np.where(width_driven, -width + (template_width + vertices[:, 2]), vertices[:, 2])
+    return vertices, np.array(template_faces)
+
+def generate_bottom_enclousure(num_plugs, lateral_gap, vertical_gap, distance_between_plugs, path='', precision=None, file_format='obj', validate=False, weld=False):
+    with stage('enclosure'):
+        vertices, faces = build_bottom_enclosure(num_plugs, lateral_gap, vertical_gap, distance_between_plugs)
+    return _write_part(vertices, faces, path + 'output_bottom.' + file_format, 'enclosure_write', file_format, precision,
+                       validate, weld)
+
+#Write the top of a grid of build_power_grid, named output_top.<file_format>
+#precision, file_format, validate, weld, thumbnail, lod and preview_lod are those of generate_power_strip
+def generate_power_grid(rows, columns, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5,
+                        distance_between_columns=None, path='', precision=None, file_format='obj', validate=False, weld=False,
+                        thumbnail=False, lod=0, preview_lod=None):
+    vertices, faces = build_power_grid(rows, columns, plug_type, distance_between_plugs, lateral_gap, vertical_gap,
+                                       distance_between_columns, lod)
+    if thumbnail:
+        preview_vertices, preview_faces = vertices, faces
+        if preview_lod is not None and preview_lod != lod:
+            preview_vertices, preview_faces = build_power_grid(rows, columns, plug_type, distance_between_plugs, lateral_gap,
+                                                               vertical_gap, distance_between_columns, preview_lod)
+        with stage('thumbnail'):
+            render_png(path + 'output_top.png', preview_vertices, preview_faces)
+    return _write_part(vertices, faces, path + 'output_top.' + file_format, 'write', file_format, precision, validate, weld)
+
+#Write the enclosure of a grid, named output_bottom.<file_format>
+def generate_grid_enclosure(rows, columns, lateral_gap, vertical_gap, distance_between_plugs, distance_between_columns=None,
+                            path='', precision=None, file_format='obj', validate=False, weld=False):
+    with stage('enclosure'):
+        vertices, faces = build_grid_enclosure(rows, columns, lateral_gap, vertical_gap, distance_between_plugs,
+                                               distance_between_columns)
+    return _write_part(vertices, faces, path + 'output_bottom.' + file_format, 'enclosure_write', file_format, precision,
+                       validate, weld)
+
+#Weld, validate and write one part, returns the MeshReport with validate
+def _write_part(vertices, faces, file_path, write_stage, file_format, precision, validate, weld):
+    if weld:
+        vertices, faces = weld_and_count(vertices, faces)
+    if validate:
+        with stage('validate'):
+            report = validate_mesh(vertices, faces)
+    with stage(write_stage):
+        count('bytes_written', write_mesh(file_path, vertices, faces, file_format, precision))
+    if validate:
+        return report
 
 if __name__ == '__main__':
     generate_power_strip(num_plugs=2, plug_type='American',lateral_gap=15, vertical_gap=25, distance_between_plugs=25)
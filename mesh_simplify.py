@@ -0,0 +1,158 @@
+#Simplification of the plug templates by quadric edge collapse
+
+#Every vertex holds the sum of the quadrics of the planes of its faces, weighted by their area
+#(Garland and Heckbert), so the cost of collapsing an edge is the squared distance of the merged
+#vertex to the planes around it. The cheapest edges are collapsed first, from a heap whose
+#entries are dropped when one of their vertices changed since they were pushed.
+#Locked vertices never move: an edge with one locked end collapses onto it, and an edge
+#between two locked vertices is kept. The vertices on the boundary of the mesh are always
+#locked, so the connector loops of the plug templates, and the seams of the strips, stay the same.
+#A collapse is refused when it would fold a face over or make the mesh non-manifold.
+#As everywhere in the generator, faces are 1-indexed triangles.
+
+import heapq
+
+import numpy as np
+
+#Version of the simplification, to be increased whenever its output changes (it is part of the
+#names of the cached levels of detail, see template_cache)
+SIMPLIFIER_VERSION = 1
+
+#Smallest cosine between the normals of a face before and after a collapse
+MIN_NORMAL_COSINE = 0.2
+
+#Quadric of the plane of every face, weighted by the face area, shape (F, 4, 4)
+def face_quadrics(vertices, faces):
+    normals = np.cross(vertices[faces[:, 1]] - vertices[faces[:, 0]], vertices[faces[:, 2]] - vertices[faces[:, 0]])
+    areas = np.linalg.norm(normals, axis=1)
+    normals = normals / np.where(areas > 0, areas, 1)[:, None]
+    planes = np.concatenate((normals, -np.einsum('ij,ij->i', normals, vertices[faces[:, 0]])[:, None]), axis=1)
+    return 0.5 * areas[:, None, None] * planes[:, :, None] * planes[:, None, :]
+
+#Vertices on the boundary of a mesh (edges used by a single face), 0-indexed
+def boundary_vertices(faces):
+    edges = np.sort(np.concatenate((faces[:, [0, 1]], faces[:, [1, 2]], faces[:, [2, 0]])), axis=1)
+    unique, counts = np.unique(edges, axis=0, return_counts=True)
+    return np.unique(unique[counts == 1])
+
+class _Collapser:
+
+    def __init__(self, vertices, faces, locked):
+        self.positions = np.array(vertices, dtype=np.float64)
+        self.faces = np.array(faces, dtype=np.int64)
+        self.face_alive = np.ones(len(self.faces), dtype=bool)
+        self.face_count = len(self.faces)
+        self.locked = np.zeros(len(self.positions), dtype=bool)
+        self.locked[locked] = True
+        self.quadrics = np.zeros((len(self.positions), 4, 4))
+        np.add.at(self.quadrics, self.faces.ravel(), np.repeat(face_quadrics(self.positions, self.faces), 3, axis=0))
+        self.vertex_faces = [set() for _ in range(len(self.positions))]
+        for face, corners in enumerate(self.faces):
+            for vertex in corners:
+                self.vertex_faces[vertex].add(face)
+        self.stamps = np.zeros(len(self.positions), dtype=np.int64)
+        self.heap = []
+        edges = np.unique(np.sort(np.concatenate((self.faces[:, [0, 1]], self.faces[:, [1, 2]],
+                                                  self.faces[:, [2, 0]])), axis=1), axis=0)
+        for a, b in edges:
+            self.push(a, b)
+
+    def neighbours(self, vertex):
+        return {other for face in self.vertex_faces[vertex] for other in self.faces[face]} - {vertex}
+
+    #Position and cost of the collapse of an edge, None for edges that cannot collapse
+    def collapse_target(self, a, b):
+        if self.locked[a] and self.locked[b]:
+            return None
+        quadric = self.quadrics[a] + self.quadrics[b]
+        if self.locked[a] or self.locked[b]:
+            candidates = [self.positions[a] if self.locked[a] else self.positions[b]]
+        else:
+            candidates = [self.positions[a], self.positions[b], (self.positions[a] + self.positions[b]) / 2]
+            try:
+                optimal = np.linalg.solve(quadric[:3, :3], -quadric[:3, 3])
+                #The optimum of a nearly flat neighbourhood can be far away, it must stay near the edge
+                if np.linalg.norm(optimal - candidates[2]) <= np.linalg.norm(self.positions[a] - self.positions[b]):
+                    candidates.append(optimal)
+            except np.linalg.LinAlgError:
+                pass
+        costs = [np.append(point, 1) @ quadric @ np.append(point, 1) for point in candidates]
+        best = int(np.argmin(costs))
+        return candidates[best], max(costs[best], 0.0)
+
+    def push(self, a, b):
+        target = self.collapse_target(a, b)
+        if target is not None:
+            heapq.heappush(self.heap, (target[1], int(a), int(b), self.stamps[a], self.stamps[b]))
+
+    #Collapse an edge if the result stays manifold and no face folds over
+    def collapse(self, a, b):
+        position, _ = self.collapse_target(a, b)
+        keep, removed = (b, a) if self.locked[b] else (a, b)
+        shared = self.vertex_faces[keep] & self.vertex_faces[removed]
+        if not shared:
+            return False
+        #Link condition: the only common neighbours are the opposite corners of the shared faces
+        opposite = {vertex for face in shared for vertex in self.faces[face]} - {keep, removed}
+        if self.neighbours(keep) & self.neighbours(removed) != opposite:
+            return False
+
+        moved = (self.vertex_faces[keep] | self.vertex_faces[removed]) - shared
+        for face in moved:
+            corners = self.positions[self.faces[face]]
+            before = np.cross(corners[1] - corners[0], corners[2] - corners[0])
+            corners[(self.faces[face] == keep) | (self.faces[face] == removed)] = position
+            after = np.cross(corners[1] - corners[0], corners[2] - corners[0])
+            if before @ after <= MIN_NORMAL_COSINE * np.linalg.norm(before) * np.linalg.norm(after):
+                return False
+
+        for face in shared:
+            self.face_alive[face] = False
+            self.face_count -= 1
+            for vertex in self.faces[face]:
+                self.vertex_faces[vertex].discard(face)
+        for face in self.vertex_faces[removed]:
+            self.faces[face][self.faces[face] == removed] = keep
+            self.vertex_faces[keep].add(face)
+        self.vertex_faces[removed] = set()
+        self.positions[keep] = position
+        self.quadrics[keep] += self.quadrics[removed]
+        self.stamps[keep] += 1
+        self.stamps[removed] += 1
+        for vertex in self.neighbours(keep):
+            self.push(keep, vertex)
+        return True
+
+    #Collapse the cheapest edges until at most target_faces faces are left
+    def reduce(self, target_faces):
+        while self.face_count > target_faces and self.heap:
+            _, a, b, stamp_a, stamp_b = heapq.heappop(self.heap)
+            if stamp_a == self.stamps[a] and stamp_b == self.stamps[b]:
+                self.collapse(a, b)
+
+    #Current mesh as (vertices, faces, new index of every original vertex, -1 when removed)
+    def mesh(self):
+        faces = self.faces[self.face_alive]
+        used = np.zeros(len(self.positions), dtype=bool)
+        used[faces.ravel()] = True
+        new_index = np.where(used, np.cumsum(used) - 1, -1)
+        return self.positions[used], new_index[faces] + 1, new_index
+
+#Simplify a mesh down to each number of faces of targets, in decreasing order
+#locked are the (1-indexed) vertices that must be kept as they are
+#Returns one (vertices, faces, new index) per target: new_index gives the (0-indexed) vertex of
+#the simplified mesh of every original vertex, -1 for the removed ones
+#A target can be missed when no edge can collapse anymore
+def simplify_levels(vertices, faces, targets, locked=()):
+    faces = np.asarray(faces, dtype=np.int64) - 1
+    locked = np.union1d(np.asarray(locked, dtype=np.int64) - 1, boundary_vertices(faces))
+    collapser = _Collapser(vertices, faces, locked)
+    levels = []
+    for target in targets:
+        collapser.reduce(target)
+        levels.append(collapser.mesh())
+    return levels
+
+#Simplify a mesh down to target_faces faces, see simplify_levels
+def simplify_mesh(vertices, faces, target_faces, locked=()):
+    return simplify_levels(vertices, faces, [target_faces], locked)[0]
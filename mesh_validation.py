@@ -0,0 +1,181 @@
+#Validation of the generated meshes before they are printed
+
+#A bad seam between a plug template and the shell only shows up in the slicer, so the
+#final arrays can be checked right after the generation:
+#   boundary edges      edges used by a single triangle (holes)
+#   non-manifold edges  edges used by more than two triangles
+#   winding             both triangles of an edge must run along it in opposite directions
+#   degenerate faces    triangles with a repeated vertex or a zero area
+#   duplicate vertices  vertices at the same position (within a tolerance)
+#   volume              signed volume, positive when the faces point outwards
+#Every check works on whole arrays: the edges are packed in one int64 key each and
+#sorted once, so checking a strip costs less than writing it. The groups of equal edges are
+#read from a boolean array of group starts, without gathering the keys of every group, and
+#the areas and the volume are computed on chunks of faces, one coordinate at a time, so the
+#corners of all the triangles are never held at once.
+#As everywhere in the generator, faces are 1-indexed triangles.
+
+import numpy as np
+
+#Odd constants mixing the coordinate bits into one hash
+HASH_FACTORS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9], dtype=np.uint64)
+
+#Number of faces whose geometry is computed at once
+FACES_PER_CHUNK = 1 << 14
+
+class MeshReport:
+
+    def __init__(self, vertices, faces, boundary_edges, non_manifold_edges, inconsistent_edges,
+                 degenerate_faces, duplicate_vertices, unreferenced_vertices, invalid_indices, volume):
+        self.vertices = vertices
+        self.faces = faces
+        self.boundary_edges = boundary_edges
+        self.non_manifold_edges = non_manifold_edges
+        self.inconsistent_edges = inconsistent_edges
+        self.degenerate_faces = degenerate_faces
+        self.duplicate_vertices = duplicate_vertices
+        self.unreferenced_vertices = unreferenced_vertices
+        self.invalid_indices = invalid_indices
+        self.volume = volume
+
+    #Closed surface: every edge is shared by exactly two triangles
+    @property
+    def is_watertight(self):
+        return self.invalid_indices == 0 and self.boundary_edges == 0 and self.non_manifold_edges == 0
+
+    #Watertight, consistently wound, without degenerate faces and pointing outwards
+    #Duplicate and unused vertices do not prevent printing, they are only reported
+    @property
+    def is_valid(self):
+        return self.is_watertight and self.inconsistent_edges == 0 and self.degenerate_faces == 0 and self.volume > 0
+
+    def to_dict(self):
+        return {
+            'vertices': self.vertices,
+            'faces': self.faces,
+            'boundary_edges': self.boundary_edges,
+            'non_manifold_edges': self.non_manifold_edges,
+            'inconsistent_edges': self.inconsistent_edges,
+            'degenerate_faces': self.degenerate_faces,
+            'duplicate_vertices': self.duplicate_vertices,
+            'unreferenced_vertices': self.unreferenced_vertices,
+            'invalid_indices': self.invalid_indices,
+            'volume': self.volume,
+            'watertight': self.is_watertight,
+            'valid': self.is_valid,
+        }
+
+    #Human readable report, one line per check
+    def summary(self):
+        lines = [f'{self.vertices} vertices, {self.faces} faces: ' + ('valid' if self.is_valid else 'INVALID')]
+        lines.extend(f'{name.replace("_", " ")}: {value}' for name, value in self.to_dict().items()
+                     if name not in ('vertices', 'faces', 'watertight', 'valid'))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return f'MeshReport({self.to_dict()!r})'
+
+#One 64 bit hash per position, from the bits of its coordinates (shape (N, 3), uint64)
+#Every coordinate is mixed into the product of the previous ones and the high bits are folded
+#onto the low ones: round coordinates have mostly zero low bits, which made a plain xor of
+#the products collide
+def position_hashes(bits):
+    hashes = ((bits[:, 0] * HASH_FACTORS[0] ^ bits[:, 1]) * HASH_FACTORS[1] ^ bits[:, 2]) * HASH_FACTORS[2]
+    return hashes ^ (hashes >> np.uint64(32))
+
+#Number of vertices at the same position as an earlier vertex
+#With a tolerance, positions are compared on a grid of that step
+def count_duplicate_vertices(vertices, tolerance=0.0):
+    if len(vertices) < 2:
+        return 0
+    keys = vertices if tolerance <= 0 else np.round(vertices / tolerance)
+    #Adding 0.0 turns -0.0 into 0.0, so equal positions have equal bits
+    bits = np.ascontiguousarray(keys + 0.0, dtype=np.float64).view(np.uint64)
+    hashes = position_hashes(bits)
+    #The hashes are sorted alone, much faster than ordering the vertices, and only the vertices
+    #whose hash is repeated are compared exactly
+    hashes_sorted = np.sort(hashes)
+    same = hashes_sorted[1:] == hashes_sorted[:-1]
+    if not same.any():
+        return 0
+    repeated = np.unique(hashes_sorted[1:][same])
+    candidates = repeated[np.minimum(np.searchsorted(repeated, hashes), len(repeated) - 1)] == hashes
+    rows = bits[candidates]
+    return len(rows) - len(np.unique(rows, axis=0))
+
+#Areas of the faces and signed volume of the mesh (0-indexed faces)
+def face_geometry(vertices, faces):
+    areas = np.empty(len(faces))
+    volume = 0.0
+    columns = [np.ascontiguousarray(vertices[:, axis]) for axis in range(3)]
+    for start in range(0, len(faces), FACES_PER_CHUNK):
+        chunk = faces[start:start + FACES_PER_CHUNK]
+        a, b, c = chunk[:, 0], chunk[:, 1], chunk[:, 2]
+        #Corners and edges of the triangles, by coordinate
+        origin = [column[a] for column in columns]
+        u = [column[b] - o for column, o in zip(columns, origin)]
+        w = [column[c] - o for column, o in zip(columns, origin)]
+        cross = (u[1] * w[2] - u[2] * w[1], u[2] * w[0] - u[0] * w[2], u[0] * w[1] - u[1] * w[0])
+        areas[start:start + len(chunk)] = 0.5 * np.sqrt(cross[0] * cross[0] + cross[1] * cross[1] + cross[2] * cross[2])
+        #Divergence theorem: sum of the signed volumes of the tetrahedra with the origin
+        volume += float(origin[0] @ cross[0] + origin[1] @ cross[1] + origin[2] @ cross[2]) / 6
+    return areas, volume
+
+#Check a mesh given as (vertices, faces) arrays and return a MeshReport
+#area_tolerance is the area under which a triangle counts as degenerate
+def validate_mesh(vertices, faces, tolerance=0.0, area_tolerance=1e-12):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3) - 1
+    num_vertices = len(vertices)
+    num_faces = len(faces)
+
+    invalid_indices = 0
+    if len(faces) and (faces.min() < 0 or faces.max() >= num_vertices):
+        invalid = (faces < 0) | (faces >= num_vertices)
+        invalid_indices = int(invalid.sum())
+        #The geometric checks need valid indices, drop the faces using the others
+        faces = faces[~invalid.any(axis=1)]
+
+    #Every directed edge a -> b is packed in one key: the undirected edge, then one bit for a < b
+    #The edges of the three sides of the faces fill one third of the keys each
+    keys = np.empty((3, len(faces)), dtype=np.int64)
+    for side in range(3):
+        starts, ends = faces[:, side], faces[:, (side + 1) % 3]
+        np.minimum(starts, ends, out=keys[side])
+        keys[side] *= num_vertices
+        keys[side] += np.maximum(starts, ends)
+        keys[side] *= 2
+        keys[side] += starts < ends
+    keys = keys.ravel()
+    keys.sort()
+    #Groups of equal undirected edges: first[i] tells whether key i starts a group, with two
+    #extra group starts at the end, so a group of n keys starting at i has first[i + n]
+    #as its next start
+    first = np.ones(len(keys) + 2, dtype=bool)
+    edges = keys >> 1
+    np.not_equal(edges[1:], edges[:-1], out=first[1:len(keys)])
+    single = first[:-2] & first[1:-1]
+    pair = first[:-2] & ~first[1:-1] & first[2:]
+    many = first[:-2] & ~first[1:-1] & ~first[2:]
+    #An edge shared by two triangles must be used once in each direction, its two keys differ
+    #by the direction bit, the keys of an inconsistent edge are equal
+    inconsistent = pair[:-1] & (keys[1:] == keys[:-1])
+
+    areas, volume = face_geometry(vertices, faces)
+    repeated = (faces[:, 0] == faces[:, 1]) | (faces[:, 1] == faces[:, 2]) | (faces[:, 2] == faces[:, 0])
+
+    referenced = np.zeros(num_vertices, dtype=bool)
+    referenced[faces.ravel()] = True
+
+    return MeshReport(
+        vertices=num_vertices,
+        faces=num_faces,
+        boundary_edges=int(single.sum()),
+        non_manifold_edges=int(many.sum()),
+        inconsistent_edges=int(inconsistent.sum()),
+        degenerate_faces=int((repeated | (areas <= area_tolerance)).sum()),
+        duplicate_vertices=count_duplicate_vertices(vertices, tolerance),
+        unreferenced_vertices=int(num_vertices - referenced.sum()),
+        invalid_indices=invalid_indices,
+        volume=volume,
+    )
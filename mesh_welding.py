@@ -0,0 +1,85 @@
+#Vertex welding and index compaction of the generated meshes
+
+#weld_mesh merges the vertices at the same position (within a tolerance), remaps the
+#faces on the merged vertices, drops the faces that became degenerate and the vertices
+#no face uses. It also turns a triangle soup, like a mesh read from an STL file, back
+#into an indexed mesh.
+#Positions are grouped with one 64 bit hash per vertex, sorted once, so the pass costs
+#about the same as sorting the vertices. The kept vertex of a group is the first one,
+#so its coordinates are written exactly as before. The sort does not need to be stable,
+#the first vertex of every group is its smallest index.
+#As everywhere in the generator, faces are 1-indexed triangles.
+
+import numpy as np
+
+from mesh_validation import position_hashes
+
+#Default distance under which two vertices are merged
+WELD_TOLERANCE = 1e-6
+
+#Index of the first vertex at the same position as each vertex (0-indexed)
+#With a tolerance, positions are compared on a grid of that step, so two vertices closer
+#than the tolerance but on both sides of a grid line are not merged
+def weld_map(vertices, tolerance=WELD_TOLERANCE):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    if len(vertices) < 2:
+        return np.arange(len(vertices))
+    keys = vertices if tolerance <= 0 else np.round(vertices / tolerance)
+    #Adding 0.0 turns -0.0 into 0.0, so equal positions have equal bits
+    bits = np.ascontiguousarray(keys + 0.0, dtype=np.float64).view(np.uint64)
+    hashes = position_hashes(bits)
+
+    order = np.argsort(hashes)
+    sorted_hashes = hashes[order]
+    same_hash = sorted_hashes[1:] == sorted_hashes[:-1]
+    #Only the neighbours sharing a hash are compared, without gathering all the positions
+    pairs = np.flatnonzero(same_hash)
+    same_position = same_hash.copy()
+    same_position[pairs] = (bits[order[pairs]] == bits[order[pairs + 1]]).all(axis=1)
+    if (same_hash != same_position).any():
+        #Hash collision between different positions, sort the positions themselves
+        order = np.lexsort(bits.T[::-1])
+        sorted_bits = bits[order]
+        same_position = (sorted_bits[1:] == sorted_bits[:-1]).all(axis=1)
+
+    group_starts = np.concatenate(([True], ~same_position))
+    groups = np.cumsum(group_starts) - 1
+    group_first = np.minimum.reduceat(order, np.flatnonzero(group_starts))
+    mapping = np.empty(len(vertices), dtype=np.int64)
+    mapping[order] = group_first[groups]
+    return mapping
+
+#Weld the vertices of a mesh and drop what is not used anymore
+#Returns (vertices, faces, report), the report gives the size before and after
+def weld_mesh(vertices, faces, tolerance=WELD_TOLERANCE):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64).reshape(-1, 3) - 1
+
+    mapping = weld_map(vertices, tolerance)
+    welded = mapping[faces]
+    corners = welded.T.copy()
+    kept = (corners[0] != corners[1]) & (corners[1] != corners[2]) & (corners[2] != corners[0])
+    #The copies below are skipped for meshes that were already welded
+    if not kept.all():
+        welded = welded[kept]
+
+    #Compaction: the used vertices keep their order
+    used = np.zeros(len(vertices), dtype=bool)
+    used[welded.ravel()] = True
+    if used.all():
+        new_vertices, new_faces = vertices.copy(), welded + 1
+    else:
+        new_index = np.cumsum(used) - 1
+        new_vertices = vertices[used]
+        new_faces = new_index[welded] + 1
+
+    report = {
+        'vertices_before': len(vertices),
+        'vertices_after': len(new_vertices),
+        'faces_before': len(faces),
+        'faces_after': len(new_faces),
+        'merged_vertices': int((mapping != np.arange(len(vertices))).sum()),
+        'degenerate_faces': int(len(faces) - len(new_faces)),
+        'reduction': 1 - (len(new_vertices) + len(new_faces)) / max(len(vertices) + len(faces), 1),
+    }
+    return new_vertices, new_faces, report
@@ -0,0 +1,135 @@
+#Input/output helpers for the .obj files used by the generator
+
+import operator
+
+import numpy as np
+
+#Read the OBJ file
+def read_obj(file_path):
+    vertices = []
+    faces = []
+    with open(file_path, 'r') as file:
+        for line in file:
+            if line.startswith('v '):
+                vertices.append(list(map(float, line.strip().split()[1:])))
+            elif line.startswith('f '):
+                face = line.strip().split()[1:]
+                face_indices = []
+                for vertex in face:
+                    vertex_indices = vertex.split('/')
+                    face_indices.append(int(vertex_indices[0]))
+                faces.append(face_indices)
+    return np.array(vertices), np.array(faces)
+
+#Number of rows formatted at once when writing, this bounds the size of the buffer
+CHUNK_ROWS = 1 << 16
+
+#Format a whole array as OBJ lines in one operation
+#precision=None keeps the shortest representation of each float, the same text as str()
+#value_format is repeated once per column, or once per group of columns when it holds several values
+def _format_rows(prefix, array, value_format):
+    rows, cols = array.shape
+    line = prefix + (' ' + value_format) * (cols // value_format.count('%')) + '\n'
+    return ((line * rows) % tuple(array.ravel().tolist())).encode('ascii')
+
+#Format of the coordinates, precision is None or a number of decimals
+def _float_format(precision):
+    if precision is None:
+        return '%r'
+    try:
+        decimals = operator.index(precision)
+    except TypeError:
+        decimals = -1
+    if isinstance(precision, bool) or decimals < 0:
+        raise ValueError('Invalid precision, must be None or an integer of at least 0')
+    return f'%.{decimals}f'
+
+#Generate the bytes of an OBJ file in chunks
+#normal_faces, if given, holds the normal index of every face corner (written as v//vn)
+def iter_obj_chunks(vertices, faces, precision=None, normals=None, normal_faces=None, header=None, chunk_rows=CHUNK_ROWS):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    faces = np.asarray(faces, dtype=np.int64)
+    if header:
+        yield ''.join(f'# {line}\n' for line in header.splitlines()).encode('ascii')
+
+    float_format = _float_format(precision)
+    for start in range(0, len(vertices), chunk_rows):
+        yield _format_rows('v', vertices[start:start + chunk_rows], float_format)
+
+    if normals is not None:
+        normals = np.asarray(normals, dtype=np.float64)
+        for start in range(0, len(normals), chunk_rows):
+            yield _format_rows('vn', normals[start:start + chunk_rows], float_format)
+
+    if normal_faces is None:
+        for start in range(0, len(faces), chunk_rows):
+            yield _format_rows('f', faces[start:start + chunk_rows], '%d')
+    else:
+        #Interleave the vertex and normal index of every corner
+        corners = np.stack((faces, np.asarray(normal_faces, dtype=np.int64)), axis=-1).reshape(len(faces), -1)
+        for start in range(0, len(corners), chunk_rows):
+            yield _format_rows('f', corners[start:start + chunk_rows], '%d//%d')
+
+#Generate the bytes of an OBJ file from iterables of vertex and face arrays
+#All the vertex chunks are consumed before the first face chunk, so the text is the same
+#as iter_obj_chunks on the concatenated arrays
+def iter_obj_stream(vertex_chunks, face_chunks, precision=None):
+    float_format = _float_format(precision)
+    for vertices in vertex_chunks:
+        yield _format_rows('v', np.asarray(vertices, dtype=np.float64), float_format)
+    for faces in face_chunks:
+        yield _format_rows('f', np.asarray(faces, dtype=np.int64), '%d')
+
+#Generate the bytes of an OBJ file holding several named groups
+#groups is a list of (name, vertices, faces), the faces of a group are 1-indexed on its own vertices
+def iter_obj_groups(groups, precision=None, header=None):
+    if header:
+        yield ''.join(f'# {line}\n' for line in header.splitlines()).encode('ascii')
+    float_format = _float_format(precision)
+    offset = 0
+    for name, vertices, faces in groups:
+        vertices = np.asarray(vertices, dtype=np.float64)
+        faces = np.asarray(faces, dtype=np.int64)
+        yield f'g {name}\n'.encode('ascii')
+        for start in range(0, len(vertices), CHUNK_ROWS):
+            yield _format_rows('v', vertices[start:start + CHUNK_ROWS], float_format)
+        for start in range(0, len(faces), CHUNK_ROWS):
+            yield _format_rows('f', faces[start:start + CHUNK_ROWS] + offset, '%d')
+        offset += len(vertices)
+
+#Format a whole mesh as the bytes of an OBJ file
+def format_obj(vertices, faces, precision=None, normals=None, normal_faces=None, header=None):
+    return b''.join(iter_obj_chunks(vertices, faces, precision, normals, normal_faces, header))
+
+#Write a mesh as an OBJ file
+#target can be a file path or any binary stream (open file, socket file, BytesIO...)
+#Faces are written as given, so they must already be 1-indexed
+#Returns the number of bytes written
+def write_obj(target, vertices, faces, precision=None, normals=None, normal_faces=None, header=None):
+    if hasattr(target, 'write'):
+        return _write_chunks(target, iter_obj_chunks(vertices, faces, precision, normals, normal_faces, header))
+    with open(target, 'wb') as file:
+        return _write_chunks(file, iter_obj_chunks(vertices, faces, precision, normals, normal_faces, header))
+
+#Write an OBJ file from iterables of vertex and face arrays, see iter_obj_stream
+#Returns the number of bytes written
+def write_obj_chunks(target, vertex_chunks, face_chunks, precision=None):
+    if hasattr(target, 'write'):
+        return _write_chunks(target, iter_obj_stream(vertex_chunks, face_chunks, precision))
+    with open(target, 'wb') as file:
+        return _write_chunks(file, iter_obj_stream(vertex_chunks, face_chunks, precision))
+
+#Write an OBJ file with several named groups, see iter_obj_groups
+#Returns the number of bytes written
+def write_obj_groups(target, groups, precision=None, header=None):
+    if hasattr(target, 'write'):
+        return _write_chunks(target, iter_obj_groups(groups, precision, header))
+    with open(target, 'wb') as file:
+        return _write_chunks(file, iter_obj_groups(groups, precision, header))
+
+def _write_chunks(stream, chunks):
+    written = 0
+    for chunk in chunks:
+        stream.write(chunk)
+        written += len(chunk)
+    return written
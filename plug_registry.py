@@ -0,0 +1,54 @@
+#Registry of the plug templates
+
+#Each plug type is an OBJ model plus the metadata needed to place it in a strip:
+#   connector_indices  the 8 (1-indexed) template vertices joined to the shell,
+#                      in the order top X- Z-, top X- Z+, top X+ Z-, top X+ Z+, then the same on the bottom side
+#   height             length taken by the plug along the strip, added to the distance between plugs
+#   offset             offset of the template along Y
+#The template is only read the first time the plug is used, and then kept by template_cache,
+#as are its simplified versions (levels of detail, see template_cache.LOD_FACE_RATIOS).
+
+from template_cache import load_template, load_template_lod
+
+class PlugType:
+
+    def __init__(self, name, model_path, connector_indices, height=39.5, offset=0):
+        if len(connector_indices) != 8:
+            raise ValueError('A plug needs 8 connector vertices')
+        self.name = name
+        self.model_path = model_path
+        self.connector_indices = list(connector_indices)
+        self.height = height
+        self.offset = offset
+
+    #Template arrays, as (vertices, faces)
+    def load(self):
+        return load_template(self.model_path)
+
+    #Template arrays at a level of detail, as (vertices, faces, connector indices)
+    #The connectors are kept by the simplification, so every level joins the shell the same way
+    def load_lod(self, lod=0):
+        vertices, faces, connectors = load_template_lod(self.model_path, lod, self.connector_indices)
+        return vertices, faces, connectors.tolist()
+
+    def __repr__(self):
+        return f'PlugType({self.name!r}, {self.model_path!r})'
+
+#Registered plug types, by name
+_plugs = {}
+
+#Add a plug type, replacing any type with the same name
+def register_plug(name, model_path, connector_indices, height=39.5, offset=0):
+    plug = PlugType(name, model_path, connector_indices, height, offset)
+    _plugs[name] = plug
+    return plug
+
+def get_plug(name):
+    try:
+        return _plugs[name]
+    except (KeyError, TypeError):
+        raise ValueError('Invalid plug type')
+
+#Names of the registered plug types
+def plug_names():
+    return list(_plugs)
@@ -0,0 +1,109 @@
+#Fast 3D preview of the generated meshes
+
+#The whole mesh is drawn as a single Poly3DCollection, built from one gather of the face
+#array, instead of one plot call per face. Meshes larger than max_faces triangles are
+#decimated first (level of detail), so the preview of a strip takes a fraction of a second
+#whatever its size. Faces are shaded from their normal, so the shape is readable without the edges.
+#Offscreen figures are rendered by Agg without any window, so PNG thumbnails can be made
+#in batch on machines without a display:
+#
+#   render_png('strip.png', *build_power_strip(4, 'European'))
+#
+#matplotlib is only imported by the functions that draw, so importing this module (and
+#mesh_generator, which uses it) stays cheap for the processes that never plot.
+
+import numpy as np
+
+from exporters import triangle_normals
+
+#Largest number of triangles drawn, larger meshes are decimated
+PREVIEW_MAX_FACES = 20000
+
+#Largest number of vertices drawn by draw_points
+PREVIEW_MAX_POINTS = 20000
+
+#Direction of the light used for the shading
+LIGHT = np.array([0.3, 0.8, 0.5]) / np.linalg.norm([0.3, 0.8, 0.5])
+
+#Keep the max_faces largest triangles, in their original order
+#The small details go first, the large surfaces that give the shape stay
+def decimate_faces(triangles, max_faces=PREVIEW_MAX_FACES):
+    if max_faces is None or len(triangles) <= max_faces:
+        return triangles
+    edges = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    areas = np.einsum('ij,ij->i', edges, edges)
+    kept = np.sort(np.argpartition(areas, len(areas) - max_faces)[-max_faces:])
+    return triangles[kept]
+
+#Keep every n-th point, so at most max_points points are left
+def decimate_points(points, max_points=PREVIEW_MAX_POINTS):
+    if max_points is None or len(points) <= max_points:
+        return points
+    return points[::-(-len(points) // max_points)]
+
+#Same scale on the three axes, the box of the axis takes the proportions of the mesh
+def set_equal_aspect(ax, vertices):
+    low, high = vertices.min(axis=0), vertices.max(axis=0)
+    ranges = np.maximum(high - low, 1e-3 * max((high - low).max(), 1e-9))
+    ax.set_xlim(low[0], low[0] + ranges[0])
+    ax.set_ylim(low[1], low[1] + ranges[1])
+    ax.set_zlim(low[2], low[2] + ranges[2])
+    ax.set_box_aspect(ranges)
+
+#Draw a mesh on a 3D axis, faces are 1-indexed
+#Returns the Poly3DCollection
+def draw_mesh(ax, vertices, faces, max_faces=PREVIEW_MAX_FACES, color=(0.55, 0.65, 0.8), edgecolor=None):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = decimate_faces(vertices[np.asarray(faces, dtype=np.int64) - 1], max_faces)
+
+    from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+
+    brightness = 0.35 + 0.65 * np.abs(triangle_normals(triangles) @ LIGHT)
+    colors = np.clip(brightness[:, None] * np.asarray(color), 0, 1)
+    collection = Poly3DCollection(triangles, facecolors=colors, edgecolors=edgecolor or colors, linewidths=0.2)
+    ax.add_collection3d(collection)
+
+    if len(vertices):
+        set_equal_aspect(ax, vertices)
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    ax.set_zlabel('Z')
+    return collection
+
+#Draw the vertices of a mesh as one scatter
+def draw_points(ax, vertices, max_points=PREVIEW_MAX_POINTS, color='tab:blue'):
+    vertices = np.asarray(vertices, dtype=np.float64)
+    points = decimate_points(vertices, max_points)
+    collection = ax.scatter(points[:, 0], points[:, 1], points[:, 2], color=color, s=2)
+    if len(vertices):
+        set_equal_aspect(ax, vertices)
+    ax.set_xlabel('X')
+    ax.set_ylabel('Y')
+    ax.set_zlabel('Z')
+    return collection
+
+#3D axis on a new figure, offscreen figures are never shown in a window
+def mesh_axis(offscreen=False, size=(6.4, 4.8)):
+    if offscreen:
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+        figure = Figure(figsize=size)
+        FigureCanvasAgg(figure)
+    else:
+        import matplotlib.pyplot as plt
+        figure = plt.figure(figsize=size)
+    return figure.add_subplot(111, projection='3d')
+
+#Show the figure of an axis in a window, or save it as a PNG file when file_path is given
+def show_or_save(ax, file_path=None, dpi=100):
+    if file_path is None:
+        import matplotlib.pyplot as plt
+        plt.show()
+    else:
+        ax.figure.savefig(file_path, dpi=dpi)
+
+#Render a PNG thumbnail of a mesh offscreen
+def render_png(file_path, vertices, faces, max_faces=PREVIEW_MAX_FACES, size=(4, 3), dpi=100):
+    ax = mesh_axis(offscreen=True, size=size)
+    draw_mesh(ax, vertices, faces, max_faces)
+    show_or_save(ax, file_path, dpi)
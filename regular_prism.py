@@ -0,0 +1,96 @@
+#Regular prisms (pins, holes, standoffs...) built with NumPy
+
+#A prism with n sides has 2n vertices around its axis, as (bottom, top) pairs starting on +X,
+#then the bottom and top centers: 2n + 2 vertices and 4n triangles
+#(n for the bottom, n for the top and 2 for each side).
+#prisms() builds any number of prisms with different radius, height, number of sides and
+#pose in one call, without Python loops, and returns them merged in one mesh with
+#1-indexed faces, ready for the writers:
+#
+#   vertices, faces, normals = prisms(radius=[1, 1, 2], height=3, sides=[6, 8, 32],
+#                                     position=[[0, 0, 0], [5, 0, 0], [10, 0, 0]])
+#   write_obj('pins.obj', vertices, faces)
+
+import numpy as np
+
+#Rotation matrices from Euler angles in degrees, applied around X, then Y, then Z
+#The angles can be arrays, the result then has shape angles.shape + (3, 3)
+def euler2rot(alpha, beta, gamma):
+    alpha, beta, gamma = np.broadcast_arrays(*np.radians([alpha, beta, gamma]))
+    ca, sa = np.cos(alpha), np.sin(alpha)
+    cb, sb = np.cos(beta), np.sin(beta)
+    cg, sg = np.cos(gamma), np.sin(gamma)
+    one, zero = np.ones_like(ca), np.zeros_like(ca)
+
+    rot_x = np.stack([one, zero, zero, zero, ca, -sa, zero, sa, ca], axis=-1).reshape(ca.shape + (3, 3))
+    rot_y = np.stack([cb, zero, sb, zero, one, zero, -sb, zero, cb], axis=-1).reshape(ca.shape + (3, 3))
+    rot_z = np.stack([cg, -sg, zero, sg, cg, zero, zero, zero, one], axis=-1).reshape(ca.shape + (3, 3))
+    return rot_z @ rot_y @ rot_x
+
+#Build many prisms at once
+#radius, height and sides are scalars or one value per prism, position is the (X, Y, Z)
+#of the bottom center and angles the (alpha, beta, gamma) rotation in degrees, one row per prism
+#Returns (vertices, faces, normals): faces are 1-indexed, normals holds one unit normal per face
+def prisms(radius, height, sides, position=(0, 0, 0), angles=(0, 0, 0)):
+    radius, height, sides = np.broadcast_arrays(np.atleast_1d(np.asarray(radius, dtype=np.float64)),
+                                                np.atleast_1d(np.asarray(height, dtype=np.float64)),
+                                                np.atleast_1d(np.asarray(sides)))
+    count = max(len(radius), len(np.atleast_2d(position)), len(np.atleast_2d(angles)))
+    radius, height, sides = (np.broadcast_to(values, (count,)) for values in (radius, height, sides))
+    position = np.broadcast_to(np.asarray(position, dtype=np.float64), (count, 3))
+    angles = np.broadcast_to(np.asarray(angles, dtype=np.float64), (count, 3))
+    if (sides < 3).any() or (sides != np.round(sides)).any():
+        raise ValueError('Invalid number of sides, a prism needs at least 3')
+    if (radius <= 0).any() or (height <= 0).any():
+        raise ValueError('Invalid radius or height, they must be positive')
+    sides = sides.astype(np.int64)
+
+    vertex_starts = np.concatenate(([0], np.cumsum(2 * sides + 2)[:-1]))
+    face_starts = np.concatenate(([0], np.cumsum(4 * sides)[:-1]))
+
+    #One entry per side of every prism: the prism it belongs to and its index around the axis
+    owner = np.repeat(np.arange(count), sides)
+    step = np.arange(len(owner)) - np.repeat(np.concatenate(([0], np.cumsum(sides)[:-1])), sides)
+    n = sides[owner]
+    angle = np.radians(360 / n * step)
+
+    #Vertices in the frame of each prism
+    local = np.zeros((vertex_starts[-1] + 2 * sides[-1] + 2, 3))
+    bottom = vertex_starts[owner] + 2 * step
+    local[bottom, 0] = local[bottom + 1, 0] = radius[owner] * np.cos(angle)
+    local[bottom, 1] = local[bottom + 1, 1] = radius[owner] * np.sin(angle)
+    local[bottom + 1, 2] = height[owner]
+    local[vertex_starts + 2 * sides + 1, 2] = height
+
+    #Rotation and translation of every vertex in one product
+    rotations = euler2rot(angles[:, 0], angles[:, 1], angles[:, 2])
+    vertex_owner = np.repeat(np.arange(count), 2 * sides + 2)
+    vertices = np.einsum('vij,vj->vi', rotations[vertex_owner], local) + position[vertex_owner]
+
+    #Faces, indices of the corners around the axis are taken modulo the ring size
+    a = 2 * step
+    c = (2 * step + 2) % (2 * n)
+    d = (2 * step + 3) % (2 * n)
+    base = vertex_starts[owner][:, None] + 1
+    first = face_starts[owner] + step
+    faces = np.empty((face_starts[-1] + 4 * sides[-1], 3), dtype=np.int64)
+    faces[first] = np.stack((a, 2 * n, c), axis=1) + base
+    faces[first + n] = np.stack((a + 1, d, 2 * n + 1), axis=1) + base
+    faces[first + 2 * n + step] = np.stack((a, d, a + 1), axis=1) + base
+    faces[first + 2 * n + step + 1] = np.stack((a, c, d), axis=1) + base
+
+    #Normals, the side normals point to the middle of each side
+    local_normals = np.zeros((len(faces), 3))
+    local_normals[first, 2] = -1
+    local_normals[first + n, 2] = 1
+    middle = angle + np.pi / n
+    for row in (first + 2 * n + step, first + 2 * n + step + 1):
+        local_normals[row, 0] = np.cos(middle)
+        local_normals[row, 1] = np.sin(middle)
+    face_owner = np.repeat(np.arange(count), 4 * sides)
+    normals = np.einsum('fij,fj->fi', rotations[face_owner], local_normals)
+    return vertices, faces, normals
+
+#Build one prism, see prisms
+def prism(radius, height, sides, position=(0, 0, 0), angles=(0, 0, 0)):
+    return prisms([radius], [height], [sides], [position], [angles])
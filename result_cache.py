@@ -0,0 +1,250 @@
+#Cache of the generated power strips and enclosures
+
+#A request is identified by a hash of its normalized parameters, the hashes of the
+#template files it uses, the metadata of its plugs (connectors, height and offset, which
+#register_plug can change at run time) and the generator version, so any change in one
+#of them gives a new key and old results are never returned by mistake.
+
+#The generated files are stored by the hash of their content ("objects"), and a small
+#index file maps every request key to its object. Identical outputs are stored once.
+#When the store grows over its size limit, the least recently used objects are removed.
+#The size of the store is measured once, then kept up to date as objects are added, so it
+#is only walked again when the limit is crossed, and the eviction leaves some room. Other processes sharing the store add
+#objects too, the total is measured again at every eviction.
+#An object can be evicted by another process between its lookup and its use, it is then
+#generated again as on a miss.
+
+#Used by batch.py (--cache-dir) and server.py (--cache-dir) for the plain strips:
+#   cache = shared_cache('results')
+#   cache.power_strip(4, 'European', destination='strip.obj')
+
+import hashlib
+import json
+import os
+import shutil
+import uuid
+
+from mesh_generator import GENERATOR_VERSION, bottom_enclosure_model, generate_bottom_enclousure, generate_power_strip
+from plug_registry import get_plug
+
+#Default folder of the cache, can be changed with DM3D_RESULT_CACHE
+CACHE_DIR = os.environ.get('DM3D_RESULT_CACHE',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '.result_cache'))
+
+#Default size limit of the stored objects
+MAX_BYTES = 1 << 30
+
+#An eviction brings the store down to this part of max_bytes, so a full store is not
+#walked again at every new object
+EVICTION_TARGET = 0.8
+
+#Content hashes of the template files, indexed by (path, size, mtime)
+_file_digests = {}
+
+#Hash of the content of a file, computed once per version of the file
+def file_digest(file_path):
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    digest = _file_digests.get(key)
+    if digest is None:
+        with open(file_path, 'rb') as file:
+            digest = hashlib.sha256(file.read()).hexdigest()
+        _file_digests[key] = digest
+    return digest
+
+#Parameters as they are hashed: the same values always give the same text
+#1, 1.0 and '1' are the same number for the generator, so they are stored the same way
+def normalize_parameters(parameters):
+    normalized = {}
+    for key, value in parameters.items():
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            value = float(value)
+            value = int(value) if value.is_integer() else repr(value)
+        normalized[key] = value
+    return normalized
+
+#Cache of a folder shared by all the callers of a process, so the store is measured once
+_shared_caches = {}
+
+def shared_cache(cache_dir=None, max_bytes=MAX_BYTES):
+    cache_dir = os.path.abspath(cache_dir or CACHE_DIR)
+    if (cache_dir, max_bytes) not in _shared_caches:
+        _shared_caches[cache_dir, max_bytes] = ResultCache(cache_dir, max_bytes)
+    return _shared_caches[cache_dir, max_bytes]
+
+#Metadata of a registered plug type that changes the generated geometry
+def plug_metadata(name):
+    plug = get_plug(name)
+    return [name, [int(index) for index in plug.connector_indices], float(plug.height), float(plug.offset)]
+
+class ResultCache:
+
+    def __init__(self, cache_dir=None, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir or CACHE_DIR
+        self.max_bytes = max_bytes
+        self.objects_dir = os.path.join(self.cache_dir, 'objects')
+        self.index_dir = os.path.join(self.cache_dir, 'index')
+        self.tmp_dir = os.path.join(self.cache_dir, 'tmp')
+        #Size of the stored objects, None until it is first measured
+        self.size = None
+        for folder in (self.objects_dir, self.index_dir, self.tmp_dir):
+            os.makedirs(folder, exist_ok=True)
+
+    #Key of a request
+    #kind names the generator, templates are the files the result depends on,
+    #plugs the names of the plug types it uses
+    def key(self, kind, parameters, templates, plugs=()):
+        description = {
+            'kind': kind,
+            'version': GENERATOR_VERSION,
+            'parameters': normalize_parameters(parameters),
+            'templates': [file_digest(template) for template in templates],
+            'plugs': [plug_metadata(name) for name in plugs],
+        }
+        return hashlib.sha256(json.dumps(description, sort_keys=True).encode()).hexdigest()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _index_path(self, key):
+        return os.path.join(self.index_dir, key[:2], key)
+
+    #Path of the stored result of a request, or None if it is not cached
+    def lookup(self, key):
+        try:
+            with open(self._index_path(key)) as file:
+                object_path = self._object_path(file.read().strip())
+            #Mark the object as recently used
+            os.utime(object_path)
+        except OSError:
+            return None
+        return object_path
+
+    #Move a generated file into the store and index it under key
+    def store(self, key, file_path):
+        sha = hashlib.sha256()
+        with open(file_path, 'rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                sha.update(block)
+        digest = sha.hexdigest()
+
+        object_path = self._object_path(digest)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        added = 0
+        try:
+            #Already stored, the new file is not needed
+            os.utime(object_path)
+            os.remove(file_path)
+        except FileNotFoundError:
+            added = os.path.getsize(file_path)
+            os.replace(file_path, object_path)
+
+        index_path = self._index_path(key)
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = os.path.join(self.tmp_dir, uuid.uuid4().hex)
+        with open(tmp_path, 'w') as file:
+            file.write(digest)
+        os.replace(tmp_path, index_path)
+
+        if self.size is None:
+            self.size = sum(size for _, size, _ in self._objects())
+        else:
+            self.size += added
+        if self.size > self.max_bytes:
+            self.evict(keep=object_path)
+        return object_path
+
+    #Stored objects as (last use, size, path)
+    def _objects(self):
+        objects = []
+        for root, _, names in os.walk(self.objects_dir):
+            for name in names:
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    #Evicted by another process meanwhile
+                    continue
+                objects.append((stat.st_mtime_ns, stat.st_size, os.path.join(root, name)))
+        return objects
+
+    #Remove the least recently used objects until the store fits in EVICTION_TARGET * max_bytes
+    #Index entries of removed objects are left behind and behave as misses
+    #keep is never removed, so a result bigger than the limit can still be returned
+    def evict(self, keep=None):
+        objects = self._objects()
+        total = sum(size for _, size, _ in objects)
+        for _, size, object_path in sorted(objects):
+            if total <= EVICTION_TARGET * self.max_bytes:
+                break
+            if object_path == keep:
+                continue
+            try:
+                os.remove(object_path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self.size = total
+
+    #Place a stored object at destination, a path or a binary stream, as a hard link or a copy
+    #A hard link shares the data with the cache, so it must not be modified in place
+    #Raises FileNotFoundError when the object has been evicted
+    def place(self, object_path, destination, link=False):
+        if hasattr(destination, 'write'):
+            with open(object_path, 'rb') as file:
+                shutil.copyfileobj(file, destination)
+            return destination
+        if os.path.lexists(destination):
+            os.remove(destination)
+        if link:
+            try:
+                os.link(object_path, destination)
+                return destination
+            except OSError:
+                #Different file systems, copy instead
+                pass
+        shutil.copyfile(object_path, destination)
+        return destination
+
+    #Return the cached result of a request, generating it on a miss
+    #generate receives a path prefix and must write the file returned by output_name
+    def get(self, kind, parameters, templates, generate, output_name, destination=None, link=False, plugs=()):
+        key = self.key(kind, parameters, templates, plugs)
+        object_path = self.lookup(key)
+        if object_path is not None:
+            if destination is None:
+                return object_path
+            try:
+                return self.place(object_path, destination, link)
+            except FileNotFoundError:
+                #Evicted since the lookup, generated again
+                pass
+        prefix = os.path.join(self.tmp_dir, uuid.uuid4().hex + '_')
+        generate(prefix)
+        object_path = self.store(key, prefix + output_name)
+        if destination is None:
+            return object_path
+        return self.place(object_path, destination, link)
+
+    #Cached version of generate_power_strip, plug_type can be a list of plug names for mixed strips
+    def power_strip(self, num_plugs, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5,
+                    destination=None, link=False, file_format='obj', precision=None):
+        names = [plug_type] if isinstance(plug_type, str) else list(plug_type)
+        plugs = list(dict.fromkeys(names))
+        templates = [get_plug(name).model_path for name in plugs]
+        parameters = {'num_plugs': num_plugs, 'plug_type': plug_type if isinstance(plug_type, str) else names,
+                      'distance_between_plugs': distance_between_plugs,
+                      'lateral_gap': lateral_gap, 'vertical_gap': vertical_gap,
+                      'file_format': file_format, 'precision': precision}
+        return self.get('power_strip', parameters, templates,
+                        lambda prefix: generate_power_strip(path=prefix, **parameters),
+                        'output_top.' + file_format, destination, link, plugs)
+
+    #Cached version of generate_bottom_enclousure
+    def bottom_enclosure(self, num_plugs, lateral_gap, vertical_gap, distance_between_plugs,
+                         destination=None, link=False, file_format='obj', precision=None):
+        parameters = {'num_plugs': num_plugs, 'lateral_gap': lateral_gap, 'vertical_gap': vertical_gap,
+                      'distance_between_plugs': distance_between_plugs,
+                      'file_format': file_format, 'precision': precision}
+        return self.get('bottom_enclosure', parameters, [bottom_enclosure_model],
+                        lambda prefix: generate_bottom_enclousure(path=prefix, **parameters),
+                        'output_bottom.' + file_format, destination, link)
@@ -0,0 +1,293 @@
+#Headless HTTP service generating power strips
+
+#The service runs on asyncio with the standard library only. Meshes are built in a
+#pool of worker processes that load the plug templates when they start, so requests
+#never parse a template. Nothing is written to disk: the OBJ (or a zip with the top
+#shell and the enclosure) is built in memory and streamed in the response.
+#With --cache-dir, the meshes are kept in the result cache of that folder instead, and a
+#request seen before is answered from it without building anything (see result_cache.py).
+
+#Usage:
+#   python server.py --port 8000 --workers 4
+#   python server.py --port 8000 --cache-dir results
+#   curl 'http://localhost:8000/generate?plug_type=European&num_plugs=4&part=both' -o strip.zip
+
+#Endpoints:
+#   GET /health                  -> 200 ok
+#   GET /generate?<parameters>   -> the generated mesh
+#   POST /generate with a JSON object of parameters in the body
+#Parameters: plug_type, num_plugs, distance_between_plugs, lateral_gap, vertical_gap,
+#part (top, bottom or both), format (obj, stl or glb) and precision
+#A worker killed while building (out of memory) breaks the process pool, the pool is then
+#replaced so the following requests are served again
+
+import argparse
+import asyncio
+import io
+import json
+import operator
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import parse_qsl, urlsplit
+
+from exporters import FORMATS, mesh_bytes
+from mesh_generator import (bottom_enclosure_model, build_bottom_enclosure, build_power_strip, check_strip_parameters,
+                            plug_slots)
+from plug_registry import get_plug, plug_names
+from result_cache import shared_cache
+from template_cache import load_template
+
+#Size of the pieces in which a response body is written
+STREAM_CHUNK = 1 << 16
+
+#Largest request body accepted
+MAX_BODY = 1 << 16
+
+PARTS = ('top', 'bottom', 'both')
+
+CONTENT_TYPES = {'obj': 'model/obj', 'stl': 'model/stl', 'glb': 'model/gltf-binary'}
+
+#Load every template once in a worker
+def warm_templates():
+    for name in plug_names():
+        get_plug(name).load()
+    load_template(bottom_enclosure_model)
+
+#Integer of a query string (text) or of a JSON body, 2.7, 2.0 and true are not integers
+def _integer(value):
+    if isinstance(value, str):
+        return int(value)
+    if isinstance(value, bool):
+        raise TypeError('not an integer')
+    return operator.index(value)
+
+#Number of a query string or of a JSON body
+def _number(value):
+    if isinstance(value, bool):
+        raise TypeError('not a number')
+    return float(value)
+
+#Read, convert and check the parameters of a request, raises ValueError on any invalid value
+#All the parts are checked with the rules of the generators, whatever part is requested
+def parse_parameters(raw):
+    try:
+        plug_type = raw.get('plug_type', 'European')
+        num_plugs = raw.get('num_plugs', 2)
+        parameters = {
+            #A JSON body can give a list with the plug type of every slot
+            'plug_type': [str(name) for name in plug_type] if isinstance(plug_type, list) else str(plug_type),
+            'num_plugs': _integer(num_plugs) if isinstance(num_plugs, str) else num_plugs,
+            'distance_between_plugs': _number(raw.get('distance_between_plugs', 5)),
+            'lateral_gap': _number(raw.get('lateral_gap', 5)),
+            'vertical_gap': _number(raw.get('vertical_gap', 5)),
+        }
+        part = str(raw.get('part', 'top'))
+        file_format = str(raw.get('format', 'obj'))
+        precision = raw.get('precision')
+        precision = None if precision in (None, '') else _integer(precision)
+    except (TypeError, ValueError) as e:
+        raise ValueError(f'Invalid parameter: {e}')
+    check_strip_parameters(parameters['num_plugs'], parameters['distance_between_plugs'], parameters['lateral_gap'],
+                           parameters['vertical_gap'])
+    for name in plug_slots(parameters['num_plugs'], parameters['plug_type'])[0]:
+        get_plug(name)
+    if part not in PARTS:
+        raise ValueError('Invalid part, must be one of ' + ', '.join(PARTS))
+    if file_format not in FORMATS:
+        raise ValueError('Invalid format, must be one of ' + ', '.join(FORMATS))
+    if precision is not None and precision < 0:
+        raise ValueError('Invalid precision, must be None or an integer of at least 0')
+    return parameters, part, file_format, precision
+
+#Build the response body, this runs in the executor
+#Returns (content type, file name, body)
+#With cache_dir, the meshes come from the result cache of that folder
+def render(parameters, part, file_format, precision, cache_dir=None):
+    files = {}
+    enclosure = (parameters['num_plugs'], parameters['lateral_gap'], parameters['vertical_gap'],
+                 parameters['distance_between_plugs'])
+    if cache_dir is not None:
+        cache = shared_cache(cache_dir)
+        if part in ('top', 'both'):
+            files['output_top.' + file_format] = cache.power_strip(
+                **parameters, destination=io.BytesIO(), file_format=file_format, precision=precision).getvalue()
+        if part in ('bottom', 'both'):
+            files['output_bottom.' + file_format] = cache.bottom_enclosure(
+                *enclosure, destination=io.BytesIO(), file_format=file_format, precision=precision).getvalue()
+    else:
+        if part in ('top', 'both'):
+            vertices, faces = build_power_strip(**parameters)
+            files['output_top.' + file_format] = mesh_bytes(vertices, faces, file_format, precision)
+        if part in ('bottom', 'both'):
+            vertices, faces = build_bottom_enclosure(*enclosure)
+            files['output_bottom.' + file_format] = mesh_bytes(vertices, faces, file_format, precision)
+
+    if part != 'both':
+        name, body = files.popitem()
+        return CONTENT_TYPES[file_format], name, body
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+        for name, body in files.items():
+            archive.writestr(name, body)
+    return 'application/zip', 'power_strip.zip', buffer.getvalue()
+
+class GenerationServer:
+
+    #max_pending bounds the requests waiting for or using the executor
+    #cache_dir is the folder of the result cache, None to build every request
+    def __init__(self, workers=None, max_pending=64, use_threads=False, cache_dir=None):
+        self.workers = workers
+        self.cache_dir = cache_dir
+        if use_threads:
+            warm_templates()
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ProcessPoolExecutor(max_workers=workers, initializer=warm_templates)
+        self.pending = asyncio.Semaphore(max_pending)
+
+    #Replace a broken process pool, the requests that failed with it share the same new pool
+    def replace_executor(self, broken):
+        if self.executor is broken:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers, initializer=warm_templates)
+            broken.shutdown(wait=False, cancel_futures=True)
+
+    #Request line and headers of the next request, raises ValueError when a line is too long
+    async def read_head(self, reader):
+        request_line = await reader.readline()
+        headers = {}
+        if not request_line.strip():
+            return request_line, headers
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        return request_line, headers
+
+    async def handle_connection(self, reader, writer):
+        try:
+            keep_alive = True
+            while keep_alive:
+                try:
+                    request_line, headers = await self.read_head(reader)
+                except (ValueError, asyncio.LimitOverrunError):
+                    #A line longer than the limit of the stream reader
+                    await self.respond(writer, 431, b'Request header too large', keep_alive=False)
+                    break
+                if not request_line.strip():
+                    break
+
+                try:
+                    length = int(headers.get('content-length', 0) or 0)
+                except ValueError:
+                    length = -1
+                if length < 0:
+                    await self.respond(writer, 400, b'Invalid Content-Length', keep_alive=False)
+                    break
+                if length > MAX_BODY:
+                    await self.respond(writer, 413, b'Request body too large', keep_alive=False)
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                parts = request_line.decode('latin-1').split()
+                keep_alive = headers.get('connection', '').lower() != 'close' and parts[-1:] != ['HTTP/1.0']
+                await self.handle_request(writer, parts, body, keep_alive)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, writer, request, body, keep_alive):
+        if len(request) != 3:
+            await self.respond(writer, 400, b'Malformed request', keep_alive=False)
+            return
+        method, target, _ = request
+        url = urlsplit(target)
+
+        if url.path == '/health' and method == 'GET':
+            await self.respond(writer, 200, b'ok', keep_alive=keep_alive)
+            return
+        if url.path != '/generate':
+            await self.respond(writer, 404, b'Not found', keep_alive=keep_alive)
+            return
+
+        try:
+            if method == 'GET':
+                raw = dict(parse_qsl(url.query))
+            elif method == 'POST':
+                raw = json.loads(body or b'{}')
+                if not isinstance(raw, dict):
+                    raise ValueError('The body must be a JSON object')
+            else:
+                await self.respond(writer, 405, b'Method not allowed', keep_alive=keep_alive)
+                return
+            parameters, part, file_format, precision = parse_parameters(raw)
+
+            async with self.pending:
+                loop = asyncio.get_running_loop()
+                executor = self.executor
+                try:
+                    content_type, name, data = await loop.run_in_executor(executor, render, parameters, part,
+                                                                        file_format, precision, self.cache_dir)
+                except BrokenProcessPool:
+                    self.replace_executor(executor)
+                    raise
+        except ValueError as e:
+            await self.respond(writer, 400, str(e).encode(), keep_alive=keep_alive)
+            return
+        except Exception as e:
+            await self.respond(writer, 500, f'{type(e).__name__}: {e}'.encode(), keep_alive=keep_alive)
+            return
+
+        await self.respond(writer, 200, data, content_type, keep_alive,
+                           {'Content-Disposition': f'attachment; filename="{name}"'})
+
+    #Send a response, the body is streamed in chunks so slow clients get backpressure
+    async def respond(self, writer, status, body, content_type='text/plain', keep_alive=True, extra_headers=None):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+                   413: 'Payload Too Large', 431: 'Request Header Fields Too Large', 500: 'Internal Server Error'}
+        headers = {'Content-Type': content_type, 'Content-Length': str(len(body)),
+                   'Connection': 'keep-alive' if keep_alive else 'close', **(extra_headers or {})}
+        head = f'HTTP/1.1 {status} {reasons[status]}\r\n' + ''.join(f'{k}: {v}\r\n' for k, v in headers.items()) + '\r\n'
+        writer.write(head.encode('latin-1'))
+        view = memoryview(body)
+        for start in range(0, len(view), STREAM_CHUNK):
+            writer.write(view[start:start + STREAM_CHUNK])
+            await writer.drain()
+        await writer.drain()
+
+    async def serve(self, host='127.0.0.1', port=8000):
+        server = await asyncio.start_server(self.handle_connection, host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        self.executor.shutdown(cancel_futures=True)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='HTTP service generating power strip models.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=None, help='Number of workers, defaults to the CPU count')
+    parser.add_argument('--max-pending', type=int, default=64, help='Requests allowed to wait for a worker')
+    parser.add_argument('--threads', action='store_true', help='Use threads instead of processes')
+    parser.add_argument('--cache-dir', help='Keep the generated meshes in a result cache in this folder')
+    args = parser.parse_args(argv)
+
+    async def run():
+        server = GenerationServer(args.workers, args.max_pending, args.threads, args.cache_dir)
+        try:
+            await server.serve(args.host, args.port)
+        finally:
+            server.close()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,535 @@
+#Vectorized assembly of the power strip mesh
+
+#The power strip is made of one block per plug, plus 8 key vertices at the start
+#and 4 closing vertices at the end. Every block has the same layout:
+#   2 top vertices (X- and X+ side, Y=0)
+#   2 bottom vertices (X- and X+ side, Y=5)
+#   the plug template vertices
+#Because the layout is regular, every index of the final mesh can be computed
+#with array arithmetic instead of growing Python lists plug by plug.
+
+#The vertex and face order is the same one the original loop produced,
+#so the written OBJ files are identical.
+
+#Every helper works on a range of blocks, so the same code builds the whole strip
+#at once (assemble_power_strip) or a few plugs at a time (iter_strip_vertices and
+#iter_strip_faces), which keeps the memory bounded for very long strips.
+
+import numpy as np
+
+from instrumentation import count, stage
+
+#Width of the plug templates along X
+PLUG_WIDTH = 45
+
+#Number of extra vertices in each plug block (top and bottom pairs)
+BLOCK_EXTRA_VERTICES = 4
+
+#Faces joining a plug to the shell, for each plug block
+#Indices refer to a lookup row made of the 12 key vertices of the block (0-11)
+#followed by the 8 connector vertices of the plug (12-19)
+CONNECTOR_FACES = np.array([
+    #Top side
+    [0, 12, 4], [0, 1, 12], [12, 13, 4], [1, 14, 12],
+    [2, 14, 1], [3, 14, 2], [3, 5, 14], [5, 15, 14],
+    #Bottom side
+    [6, 10, 16], [6, 16, 7], [10, 17, 16], [7, 16, 18],
+    [7, 18, 8], [8, 18, 9], [9, 18, 11], [18, 19, 11],
+])
+
+#Faces closing the strip after the last plug, indices into the last key row
+CLOSING_FACES = np.array([
+    #Top side
+    [0, 1, 4], [1, 2, 4], [2, 5, 4], [2, 3, 5],
+    #Bottom side
+    [6, 10, 7], [7, 10, 8], [8, 10, 11], [8, 11, 9],
+])
+
+#Lateral faces at Z-, they only use the 8 initial key vertices (1-indexed)
+Z_MINUS_FACES = np.array([
+    [1, 5, 2], [2, 5, 6], [2, 6, 3],
+    [3, 6, 7], [3, 7, 4], [4, 7, 8],
+])
+
+#Number of faces after the plug blocks: closing, Z-, Z+ and the X-/X+ walls
+def tail_face_count(num_plugs):
+    return len(CLOSING_FACES) + len(Z_MINUS_FACES) + 2 + 4 * (num_plugs + 1)
+
+#Number of faces added on top of the plug faces
+def extra_face_count(num_plugs):
+    return len(CONNECTOR_FACES) * num_plugs + tail_face_count(num_plugs)
+
+#Number of vertices of a strip
+def strip_vertex_count(num_plugs, plug_vertex_count):
+    return 8 + num_plugs * (plug_vertex_count + BLOCK_EXTRA_VERTICES) + BLOCK_EXTRA_VERTICES
+
+#Number of faces of a strip
+def strip_face_count(num_plugs, plug_face_count):
+    return num_plugs * plug_face_count + extra_face_count(num_plugs)
+
+#Indices (1-indexed) of the shell vertices of blocks starting after the given vertex counts
+def shell_indices(starts):
+    starts = np.asarray(starts, dtype=np.int64)
+    return {
+        'top_a': starts + 1,
+        'top_b': starts + 2,
+        'bottom_a': starts + 3,
+        'bottom_b': starts + 4,
+        #Offset to add to the (1-indexed) template indices of the plug of each block
+        'plug_offsets': starts + BLOCK_EXTRA_VERTICES,
+    }
+
+#Number of vertices before each of the given blocks, when all the plugs are the same
+def block_starts(rows, plug_vertex_count):
+    return 8 + np.asarray(rows, dtype=np.int64) * (plug_vertex_count + BLOCK_EXTRA_VERTICES)
+
+#Indices (1-indexed) of the shell vertices of the given blocks
+#The closing vertices are treated as block num_plugs, which has no plug
+def block_indices(rows, plug_vertex_count):
+    return shell_indices(block_starts(rows, plug_vertex_count))
+
+#Key vertex indices used to connect blocks to the previous one
+#starts and previous_starts are the vertex counts before each block and the block before it,
+#previous_connectors the connector indices of the plug of the block before it (one row per block)
+#Blocks marked first start from the 8 initial key vertices instead
+def key_rows_at(starts, previous_starts, previous_connectors, first):
+    blocks = shell_indices(starts)
+    previous = shell_indices(previous_starts)
+    previous_plugs = previous['plug_offsets'][:, None] + np.asarray(previous_connectors)
+    keys = np.empty((len(blocks['top_a']), 12), dtype=np.int64)
+
+    keys[:, 4] = blocks['top_a']
+    keys[:, 5] = blocks['top_b']
+    keys[:, 10] = blocks['bottom_a']
+    keys[:, 11] = blocks['bottom_b']
+
+    #The blocks start from the previous block and its plug
+    keys[:, 0] = previous['top_a']
+    keys[:, 1] = previous_plugs[:, 1]
+    keys[:, 2] = previous_plugs[:, 3]
+    keys[:, 3] = previous['top_b']
+    keys[:, 6] = previous['bottom_a']
+    keys[:, 7] = previous_plugs[:, 5]
+    keys[:, 8] = previous_plugs[:, 7]
+    keys[:, 9] = previous['bottom_b']
+
+    #The first block starts from the 8 initial key vertices
+    keys[first, :4] = [1, 2, 3, 4]
+    keys[first, 6:10] = [5, 6, 7, 8]
+    return keys
+
+#Key rows of the given blocks, when all the plugs are the same
+#Row i holds the 12 key vertices of block rows[i], block num_plugs is the closing
+def key_rows(rows, plug_vertex_count, plug_vert_idx):
+    rows = np.asarray(rows, dtype=np.int64)
+    connectors = np.broadcast_to(np.asarray(plug_vert_idx), (len(rows), len(plug_vert_idx)))
+    return key_rows_at(block_starts(rows, plug_vertex_count), block_starts(rows - 1, plug_vertex_count),
+                       connectors, rows == 0)
+
+#Faces joining plugs to the shell from their key rows, shape (len(keys), 16, 3)
+#plug_offsets and connectors are the offset and connector indices of each plug
+def connector_faces_at(keys, plug_offsets, connectors):
+    lookup = np.concatenate((keys, np.asarray(plug_offsets)[:, None] + np.asarray(connectors)), axis=1)
+    return lookup[:, CONNECTOR_FACES]
+
+#Faces joining the plugs of the given blocks to the shell, shape (len(plugs), 16, 3)
+def connector_faces(plugs, plug_vertex_count, plug_vert_idx):
+    keys = key_rows(plugs, plug_vertex_count, plug_vert_idx)
+    plug_offsets = block_indices(plugs, plug_vertex_count)['plug_offsets']
+    return connector_faces_at(keys, plug_offsets, np.broadcast_to(np.asarray(plug_vert_idx), (len(keys), 8)))
+
+#Closing faces and the Z- and Z+ walls from the key row of the closing block
+def end_faces_at(closing_keys):
+    closing = closing_keys[CLOSING_FACES]
+    top_a, top_b, bottom_a, bottom_b = closing_keys[[4, 5, 10, 11]]
+    z_plus = np.array([[top_a, top_b, bottom_b],
+                       [bottom_a, top_a, bottom_b]])
+    return np.concatenate((closing, Z_MINUS_FACES, z_plus))
+
+#Closing faces and the Z- and Z+ walls, their size does not depend on num_plugs
+def end_faces(num_plugs, plug_vertex_count, plug_vert_idx):
+    return end_faces_at(key_rows([num_plugs], plug_vertex_count, plug_vert_idx)[0])
+
+#X- (side 'minus') or X+ (side 'plus') wall faces of segments
+#A segment joins the shell vertices of the previous block (the initial corners when first)
+#to the block starting after starts. Two triangles per segment, shape (2*len(starts), 3)
+#corners are the initial (top X-, bottom X-, top X+, bottom X+) vertices
+def lateral_faces_at(starts, previous_starts, first, side, corners=(1, 5, 4, 8)):
+    current = shell_indices(starts)
+    previous = shell_indices(previous_starts)
+
+    if side == 'minus':
+        top, bottom = current['top_a'], current['bottom_a']
+        previous_top = np.where(first, corners[0], previous['top_a'])
+        previous_bottom = np.where(first, corners[1], previous['bottom_a'])
+        pair = (np.stack((previous_top, top, previous_bottom), axis=1),
+                np.stack((bottom, previous_bottom, top), axis=1))
+    else:
+        top, bottom = current['top_b'], current['bottom_b']
+        previous_top = np.where(first, corners[2], previous['top_b'])
+        previous_bottom = np.where(first, corners[3], previous['bottom_b'])
+        pair = (np.stack((previous_top, previous_bottom, top), axis=1),
+                np.stack((previous_bottom, bottom, top), axis=1))
+    return np.stack(pair, axis=1).reshape(-1, 3)
+
+#Wall faces of the given segments, when all the plugs are the same
+#Segment j joins block j-1 (the initial corners for j=0) to block j
+def lateral_faces(segments, plug_vertex_count, side):
+    segments = np.asarray(segments, dtype=np.int64)
+    return lateral_faces_at(block_starts(segments, plug_vertex_count), block_starts(segments - 1, plug_vertex_count),
+                            segments == 0, side)
+
+#Faces after the plug blocks: closing, Z-, Z+, X- and X+
+def tail_faces(num_plugs, plug_vertex_count, plug_vert_idx):
+    segments = np.arange(num_plugs + 1)
+    return np.concatenate((end_faces(num_plugs, plug_vertex_count, plug_vert_idx),
+                           lateral_faces(segments, plug_vertex_count, 'minus'),
+                           lateral_faces(segments, plug_vertex_count, 'plus')))
+
+#Key vertices at the start of the strip
+def key_vertices(lateral_gap):
+    width = 2*lateral_gap+PLUG_WIDTH
+    return np.array([[0, 0, 0], [lateral_gap, 0, 0], [lateral_gap+PLUG_WIDTH, 0, 0], [width, 0, 0],
+                     [0, 5, 0], [lateral_gap, 5, 0], [lateral_gap+PLUG_WIDTH, 5, 0], [width, 5, 0]], dtype=np.float64)
+
+#Top and bottom vertices of blocks at the given positions along Z, shape (len(z), 4, 3)
+#width is the width of the shell, that of a single column of plugs by default
+def shell_vertices_at(z, lateral_gap, width=None):
+    z = np.asarray(z, dtype=np.float64)
+    block_shell = np.zeros((len(z), 4, 3))
+    block_shell[:, [1, 3], 0] = 2*lateral_gap+PLUG_WIDTH if width is None else width
+    block_shell[:, [2, 3], 1] = 5
+    block_shell[:, :, 2] = z[:, None]
+    return block_shell
+
+#Top and bottom vertices of the given blocks, shape (len(rows), 4, 3)
+def block_shell_vertices(rows, pitch, lateral_gap, vertical_gap):
+    return shell_vertices_at(45 + vertical_gap + pitch * np.asarray(rows), lateral_gap)
+
+#Vertices closing the strip after the last plug
+def closing_vertices(num_plugs, pitch, lateral_gap, vertical_gap):
+    return closing_vertices_at(pitch * num_plugs + 2 * vertical_gap - 15, lateral_gap)
+
+#Vertices closing the strip at the position end along Z
+def closing_vertices_at(end, lateral_gap, width=None):
+    width = 2*lateral_gap+PLUG_WIDTH if width is None else width
+    return np.array([[0, 0, end], [width, 0, end], [0, 5, end], [width, 5, end]], dtype=np.float64)
+
+#Vertices of consecutive plug copies, shape (num_plugs, V, 3)
+#The copies are accumulated along Z exactly like moving the plug one pitch at a time
+#previous is the last copy placed before these ones, None to start the strip at first_offset
+def placed_plugs(plug_vertices, num_plugs, pitch, first_offset, previous=None):
+    placed = np.empty((num_plugs,) + plug_vertices.shape)
+    if previous is None:
+        placed[0] = plug_vertices + np.asarray(first_offset)
+    else:
+        placed[0] = previous + np.array([0, 0, pitch])
+    placed[1:] = [0, 0, pitch]
+    np.add.accumulate(placed, axis=0, out=placed)
+    return placed
+
+#Build the whole power strip
+#pitch is the distance between consecutive plugs, including the plug height
+#Returns the vertices and the (1-indexed) faces as NumPy arrays
+def assemble_power_strip(plug_vertices, plug_faces, plug_vert_idx, plug_offset, num_plugs, pitch, lateral_gap, vertical_gap):
+    plug_vertices = np.asarray(plug_vertices, dtype=np.float64)
+    plug_faces = np.asarray(plug_faces, dtype=np.int64)
+    num_vertices, num_faces = len(plug_vertices), len(plug_faces)
+    block_size = num_vertices + BLOCK_EXTRA_VERTICES
+    plugs = np.arange(num_plugs)
+
+    vertices = np.empty((strip_vertex_count(num_plugs, num_vertices), 3))
+    faces = np.empty((strip_face_count(num_plugs, num_faces), 3), dtype=np.int64)
+
+    #Vertices
+    blocks = vertices[8:8 + num_plugs * block_size].reshape(num_plugs, block_size, 3)
+    with stage('shell_vertices'):
+        vertices[:8] = key_vertices(lateral_gap)
+        blocks[:, :BLOCK_EXTRA_VERTICES] = block_shell_vertices(plugs, pitch, lateral_gap, vertical_gap)
+        vertices[-BLOCK_EXTRA_VERTICES:] = closing_vertices(num_plugs, pitch, lateral_gap, vertical_gap)
+
+    #Plug copies
+    body = faces[:num_plugs * (num_faces + len(CONNECTOR_FACES))].reshape(num_plugs, -1, 3)
+    with stage('plug_placement'):
+        blocks[:, BLOCK_EXTRA_VERTICES:] = placed_plugs(plug_vertices, num_plugs, pitch,
+                                                        [lateral_gap, plug_offset, 45+vertical_gap])
+        plug_offsets = block_indices(plugs, num_vertices)['plug_offsets']
+        body[:, :num_faces] = plug_faces[None] + plug_offsets[:, None, None]
+
+    #Shell faces
+    with stage('connector_faces'):
+        body[:, num_faces:] = connector_faces(plugs, num_vertices, plug_vert_idx)
+    with stage('lateral_faces'):
+        faces[num_plugs * (num_faces + len(CONNECTOR_FACES)):] = tail_faces(num_plugs, num_vertices, plug_vert_idx)
+
+    count('vertices', len(vertices))
+    count('faces', len(faces))
+    return vertices, faces
+
+#Vertices of the strip in the same order as assemble_power_strip, in chunks of
+#plugs_per_chunk plugs, so only one chunk is in memory at a time
+def iter_strip_vertices(plug_vertices, plug_offset, num_plugs, pitch, lateral_gap, vertical_gap, plugs_per_chunk=64):
+    plug_vertices = np.asarray(plug_vertices, dtype=np.float64)
+    yield key_vertices(lateral_gap)
+
+    previous = None
+    for first in range(0, num_plugs, plugs_per_chunk):
+        plugs = np.arange(first, min(first + plugs_per_chunk, num_plugs))
+        placed = placed_plugs(plug_vertices, len(plugs), pitch, [lateral_gap, plug_offset, 45+vertical_gap], previous)
+        previous = placed[-1]
+        chunk = np.concatenate((block_shell_vertices(plugs, pitch, lateral_gap, vertical_gap), placed), axis=1)
+        yield chunk.reshape(-1, 3)
+
+    yield closing_vertices(num_plugs, pitch, lateral_gap, vertical_gap)
+
+#Faces of the strip in the same order as assemble_power_strip, in chunks
+def iter_strip_faces(plug_faces, plug_vert_idx, num_plugs, plug_vertex_count, plugs_per_chunk=64):
+    plug_faces = np.asarray(plug_faces, dtype=np.int64)
+    for first in range(0, num_plugs, plugs_per_chunk):
+        plugs = np.arange(first, min(first + plugs_per_chunk, num_plugs))
+        plug_offsets = block_indices(plugs, plug_vertex_count)['plug_offsets']
+        chunk = np.concatenate((plug_faces[None] + plug_offsets[:, None, None],
+                                connector_faces(plugs, plug_vertex_count, plug_vert_idx)), axis=1)
+        yield chunk.reshape(-1, 3)
+
+    yield end_faces(num_plugs, plug_vertex_count, plug_vert_idx)
+
+    #The walls have one segment more than there are plugs
+    for side in ('minus', 'plus'):
+        for first in range(0, num_plugs + 1, plugs_per_chunk):
+            segments = np.arange(first, min(first + plugs_per_chunk, num_plugs + 1))
+            yield lateral_faces(segments, plug_vertex_count, side)
+
+#Translation of the template of every slot, shape (len(slots), 3)
+def slot_translations(templates, slots, distance_between_plugs, lateral_gap, vertical_gap):
+    slots = np.asarray(slots, dtype=np.int64)
+    pitches = distance_between_plugs + np.array([template[4] for template in templates], dtype=np.float64)[slots]
+    translations = np.empty((len(slots), 3))
+    translations[:, 0] = lateral_gap
+    translations[:, 1] = np.array([template[3] for template in templates], dtype=np.float64)[slots]
+    translations[:, 2] = 45 + vertical_gap + np.concatenate(([0], np.cumsum(pitches[:-1])))
+    return translations
+
+#Build a strip mixing several plug templates
+#templates is a list of (vertices, faces, connector indices, offset along Y, height),
+#slots gives the template of every plug along the strip
+#Plugs of the same template are placed together with one broadcast operation,
+#so a mixed strip costs about the same as a uniform one
+def assemble_mixed_strip(templates, slots, distance_between_plugs, lateral_gap, vertical_gap):
+    slots = np.asarray(slots, dtype=np.int64)
+    num_plugs = len(slots)
+    vertex_counts = np.array([len(template[0]) for template in templates], dtype=np.int64)[slots]
+    face_counts = np.array([len(template[1]) for template in templates], dtype=np.int64)[slots]
+    connectors = np.array([template[2] for template in templates], dtype=np.int64)[slots]
+    pitches = distance_between_plugs + np.array([template[4] for template in templates], dtype=np.float64)[slots]
+
+    #Vertices and faces before every block, the last entries are those of the closing
+    starts = 8 + np.concatenate(([0], np.cumsum(vertex_counts + BLOCK_EXTRA_VERTICES)))
+    face_starts = np.concatenate(([0], np.cumsum(face_counts + len(CONNECTOR_FACES))))
+    translations = slot_translations(templates, slots, distance_between_plugs, lateral_gap, vertical_gap)
+    positions = translations[:, 2]
+    plug_offsets = starts[:-1] + BLOCK_EXTRA_VERTICES
+
+    vertices = np.empty((starts[-1] + BLOCK_EXTRA_VERTICES, 3))
+    faces = np.empty((face_starts[-1] + tail_face_count(num_plugs), 3), dtype=np.int64)
+
+    with stage('shell_vertices'):
+        vertices[:8] = key_vertices(lateral_gap)
+        vertices[starts[:-1, None] + np.arange(BLOCK_EXTRA_VERTICES)] = shell_vertices_at(positions, lateral_gap)
+        vertices[-BLOCK_EXTRA_VERTICES:] = closing_vertices_at(pitches.sum() + 2 * vertical_gap - 15, lateral_gap)
+
+    with stage('plug_placement'):
+        for index, (plug_vertices, plug_faces, _, _, _) in enumerate(templates):
+            selected = np.flatnonzero(slots == index)
+            if not len(selected):
+                continue
+            vertex_rows = plug_offsets[selected, None] + np.arange(len(plug_vertices))
+            vertices[vertex_rows] = np.asarray(plug_vertices)[None] + translations[selected, None, :]
+            face_rows = face_starts[selected, None] + np.arange(len(plug_faces))
+            faces[face_rows] = np.asarray(plug_faces, dtype=np.int64)[None] + plug_offsets[selected, None, None]
+
+    #Every block connects to the block before it, the closing is block num_plugs
+    previous_starts = np.concatenate((starts[:1], starts[:-1]))
+    previous_connectors = np.concatenate((connectors[:1], connectors))
+    first = np.arange(num_plugs + 1) == 0
+    keys = key_rows_at(starts, previous_starts, previous_connectors, first)
+
+    with stage('connector_faces'):
+        connector_rows = (face_starts[:-1] + face_counts)[:, None] + np.arange(len(CONNECTOR_FACES))
+        faces[connector_rows] = connector_faces_at(keys[:-1], plug_offsets, connectors)
+
+    with stage('lateral_faces'):
+        faces[face_starts[-1]:] = np.concatenate((end_faces_at(keys[-1]),
+                                                  lateral_faces_at(starts, previous_starts, first, 'minus'),
+                                                  lateral_faces_at(starts, previous_starts, first, 'plus')))
+
+    count('vertices', len(vertices))
+    count('faces', len(faces))
+    return vertices, faces
+
+#Shell of a strip without the plug copies, for the instanced outputs
+#templates and slots are those of assemble_mixed_strip. Only the connector vertices of every
+#plug are kept in the shell, each plug is given by the translation of its template instead,
+#so the plug geometry is stored once whatever the number of plugs
+#Returns (vertices, faces, translations), translations has shape (len(slots), 3)
+def assemble_strip_shell(templates, slots, distance_between_plugs, lateral_gap, vertical_gap):
+    #Templates reduced to their 8 connector vertices, without faces
+    connector_templates = [(np.asarray(plug_vertices, dtype=np.float64)[np.asarray(plug_vert_idx) - 1],
+                            np.zeros((0, 3), dtype=np.int64), np.arange(1, 9), plug_offset, height)
+                           for plug_vertices, _, plug_vert_idx, plug_offset, height in templates]
+    vertices, faces = assemble_mixed_strip(connector_templates, slots, distance_between_plugs, lateral_gap, vertical_gap)
+    return vertices, faces, slot_translations(templates, slots, distance_between_plugs, lateral_gap, vertical_gap)
+
+#Grid layouts: rows x columns copies of one plug template (desk hubs, panels)
+#The rows run along Z like the plugs of a strip, the columns along X. The layout extends
+#the one of the strip:
+#   2 key lines at Z=0 (top then bottom), each with the X- corner, the X- and X+ edges of
+#   every column and the X+ corner: 2*columns + 2 vertices per line
+#   one block per row: the 4 shell vertices of the row, then one plug copy per column
+#   the 4 closing vertices
+#The line of a row goes through the Z+ corners of all its plugs, so the faces of every row
+#come from one table of indices into a lookup row (grid_lookup), the same for all the rows:
+#the 16 connector faces of the strip, plus 8 faces between every two neighbouring plugs.
+#The faces of all the rows are then a single gather from the lookup rows.
+
+#Number of vertices on each key line of a grid
+def grid_line_length(columns):
+    return 2 * columns + 2
+
+#Key vertices of a grid, top line then bottom line, plug_x is the X- edge of every column
+def grid_key_vertices(plug_x, width):
+    line = np.concatenate(([0], np.stack((plug_x, plug_x + PLUG_WIDTH), axis=1).ravel(), [width]))
+    keys = np.zeros((2 * len(line), 3))
+    keys[:len(line), 0] = keys[len(line):, 0] = line
+    keys[len(line):, 1] = 5
+    return keys
+
+#Lookup rows of the given rows of a grid, row `rows` is the closing
+#Each row holds the previous top line, the previous bottom line (the key lines for row 0),
+#the 4 shell vertices of the row and the 8 connector vertices of every plug of the row
+def grid_lookup(rows, columns, plug_vertex_count, plug_vert_idx):
+    rows = np.asarray(rows, dtype=np.int64)
+    length = grid_line_length(columns)
+    block_size = BLOCK_EXTRA_VERTICES + columns * plug_vertex_count
+    starts = 2 * length + rows * block_size
+    previous = starts - block_size
+    connectors = np.asarray(plug_vert_idx, dtype=np.int64)
+    plug_offsets = starts[:, None] + BLOCK_EXTRA_VERTICES + np.arange(columns) * plug_vertex_count
+    previous_plugs = plug_offsets - block_size
+
+    lookup = np.empty((len(rows), 2 * length + BLOCK_EXTRA_VERTICES + 8 * columns), dtype=np.int64)
+    lookup[:, 0] = previous + 1
+    lookup[:, 1:length - 1] = (previous_plugs[:, :, None] + connectors[[1, 3]]).reshape(len(rows), -1)
+    lookup[:, length - 1] = previous + 2
+    lookup[:, length] = previous + 3
+    lookup[:, length + 1:2 * length - 1] = (previous_plugs[:, :, None] + connectors[[5, 7]]).reshape(len(rows), -1)
+    lookup[:, 2 * length - 1] = previous + 4
+    lookup[rows == 0, :2 * length] = np.arange(1, 2 * length + 1)
+    lookup[:, 2 * length:2 * length + BLOCK_EXTRA_VERTICES] = starts[:, None] + np.arange(1, BLOCK_EXTRA_VERTICES + 1)
+    lookup[:, 2 * length + BLOCK_EXTRA_VERTICES:] = (plug_offsets[:, :, None] + connectors).reshape(len(rows), -1)
+    return lookup
+
+#Bottom side of top side faces: the same faces on the bottom vertices, wound the other way
+def _grid_bottom_faces(top_faces, length):
+    bottom = np.where(top_faces < length, top_faces + length,
+                      np.where(top_faces < 2 * length + BLOCK_EXTRA_VERTICES, top_faces + 2, top_faces + 4))
+    return bottom[:, ::-1]
+
+#Faces of a grid row, as indices into its lookup row, shape (12*columns + 4, 3)
+def grid_row_faces(columns):
+    length = grid_line_length(columns)
+    top_a, top_b = 2 * length, 2 * length + 1
+    column = np.arange(columns)
+
+    def line(i):
+        return np.asarray(i)
+
+    def connector(c, j):
+        return 2 * length + BLOCK_EXTRA_VERTICES + 8 * np.asarray(c) + j
+
+    first, last = connector(0, np.arange(4)), connector(columns - 1, np.arange(4))
+    left = np.array([[0, first[0], top_a], [0, 1, first[0]], [first[0], first[1], top_a]])
+    #Between the previous line and the Z- edge of every plug
+    middle = np.stack((np.stack((line(2*column + 1), connector(column, 2), connector(column, 0)), axis=1),
+                       np.stack((line(2*column + 2), connector(column, 2), line(2*column + 1)), axis=1)), axis=1)
+    #Between every two neighbouring plugs of the row, split at the Z- edge of the plugs
+    c = column[:-1]
+    between = np.stack((np.stack((line(2*c + 2), line(2*c + 3), connector(c + 1, 0)), axis=1),
+                        np.stack((line(2*c + 2), connector(c + 1, 0), connector(c, 2)), axis=1),
+                        np.stack((connector(c, 2), connector(c + 1, 0), connector(c + 1, 1)), axis=1),
+                        np.stack((connector(c, 2), connector(c + 1, 1), connector(c, 3)), axis=1)), axis=1)
+    right = np.array([[length - 1, last[2], length - 2], [length - 1, top_b, last[2]], [top_b, last[3], last[2]]])
+    top = np.concatenate((left, middle.reshape(-1, 3), between.reshape(-1, 3), right))
+    return np.concatenate((top, _grid_bottom_faces(top, length)))
+
+#Faces closing a grid and its Z- and Z+ walls, from the lookup row of the closing
+def grid_end_faces(closing_lookup, columns):
+    length = grid_line_length(columns)
+    top_a, top_b, bottom_a, bottom_b = closing_lookup[2 * length:2 * length + BLOCK_EXTRA_VERTICES]
+    #Fan from the closing corners over the previous line
+    fan = np.arange(length - 2)
+    top = np.concatenate((np.stack((fan, fan + 1, np.full(length - 2, 2 * length)), axis=1),
+                          [[length - 2, 2 * length + 1, 2 * length], [length - 2, length - 1, 2 * length + 1]]))
+    closing = closing_lookup[np.concatenate((top, _grid_bottom_faces(top, length)))]
+    #Z- wall between the two key lines
+    i = np.arange(1, length)
+    z_minus = np.stack((np.stack((i, length + i, i + 1), axis=1),
+                        np.stack((i + 1, length + i, length + i + 1), axis=1)), axis=1).reshape(-1, 3)
+    z_plus = np.array([[top_a, top_b, bottom_b],
+                       [bottom_a, top_a, bottom_b]])
+    return np.concatenate((closing, z_minus, z_plus))
+
+#Build a grid of rows x columns plugs
+#pitch is the distance between consecutive rows and column_pitch between consecutive columns,
+#both including the plug size
+#Returns the vertices and the (1-indexed) faces as NumPy arrays
+def assemble_plug_grid(plug_vertices, plug_faces, plug_vert_idx, plug_offset, rows, columns, pitch, column_pitch,
+                       lateral_gap, vertical_gap):
+    plug_vertices = np.asarray(plug_vertices, dtype=np.float64)
+    plug_faces = np.asarray(plug_faces, dtype=np.int64)
+    num_vertices, num_faces = len(plug_vertices), len(plug_faces)
+    length = grid_line_length(columns)
+    block_size = BLOCK_EXTRA_VERTICES + columns * num_vertices
+    row_faces = grid_row_faces(columns)
+    plug_x = lateral_gap + column_pitch * np.arange(columns)
+    width = 2 * lateral_gap + PLUG_WIDTH + column_pitch * (columns - 1)
+    row_z = 45 + vertical_gap + pitch * np.arange(rows)
+
+    vertices = np.empty((2 * length + rows * block_size + BLOCK_EXTRA_VERTICES, 3))
+    body_size = columns * num_faces + len(row_faces)
+    faces = np.empty((rows * body_size + 2 * length + 2 * (length - 1) + 2 + 4 * (rows + 1), 3), dtype=np.int64)
+
+    #Vertices
+    blocks = vertices[2 * length:2 * length + rows * block_size].reshape(rows, block_size, 3)
+    with stage('shell_vertices'):
+        vertices[:2 * length] = grid_key_vertices(plug_x, width)
+        blocks[:, :BLOCK_EXTRA_VERTICES] = shell_vertices_at(row_z, lateral_gap, width)
+        vertices[-BLOCK_EXTRA_VERTICES:] = closing_vertices_at(pitch * rows + 2 * vertical_gap - 15, lateral_gap, width)
+
+    #Plug copies, one broadcast over the rows and the columns
+    body = faces[:rows * body_size].reshape(rows, body_size, 3)
+    with stage('plug_placement'):
+        translations = np.zeros((rows, columns, 3))
+        translations[:, :, 0] = plug_x
+        translations[:, :, 1] = plug_offset
+        translations[:, :, 2] = row_z[:, None]
+        blocks[:, BLOCK_EXTRA_VERTICES:] = (plug_vertices[None, None] + translations[:, :, None]).reshape(rows, -1, 3)
+        plug_offsets = 2 * length + np.arange(rows)[:, None] * block_size + BLOCK_EXTRA_VERTICES + \
+            np.arange(columns) * num_vertices
+        body[:, :columns * num_faces] = (plug_faces[None, None] + plug_offsets[:, :, None, None]).reshape(rows, -1, 3)
+
+    #Shell faces
+    lookup = grid_lookup(np.arange(rows + 1), columns, num_vertices, plug_vert_idx)
+    with stage('connector_faces'):
+        body[:, columns * num_faces:] = lookup[:-1, row_faces]
+    with stage('lateral_faces'):
+        starts = 2 * length + np.arange(rows + 1) * block_size
+        first = np.arange(rows + 1) == 0
+        corners = (1, length + 1, length, 2 * length)
+        faces[rows * body_size:] = np.concatenate((grid_end_faces(lookup[-1], columns),
+                                                   lateral_faces_at(starts, starts - block_size, first, 'minus', corners),
+                                                   lateral_faces_at(starts, starts - block_size, first, 'plus', corners)))
+
+    count('vertices', len(vertices))
+    count('faces', len(faces))
+    return vertices, faces
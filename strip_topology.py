@@ -0,0 +1,145 @@
+#Topology cache of the power strips, for instant regeneration
+
+#For a given plug type (or list of slot types) and number of plugs, the faces of the strip
+#never change, and every vertex coordinate is an affine function of the three dimensions:
+#   vertex = base + distance_between_plugs * B_d + lateral_gap * B_lg + vertical_gap * B_vg
+#The faces and this basis are computed once, from strips built by build_power_strip, so a
+#new set of dimensions is one product of the basis by the dimensions over the vertex array:
+#
+#   topology = strip_topology(4, 'European')
+#   vertices, faces = topology.build(25, 15, 25)
+#   sweep = topology.vertices_many([[5, 5, 5], [25, 15, 25], [60, 25, 25]])
+#
+#Only the slopes that are not zero are stored (the lateral gap only moves X, the distance
+#and the vertical gap only move Z), which halves the memory and the evaluation time
+#compared to a dense basis.
+#The coordinates match build_power_strip up to floating point rounding (the generator adds
+#the pitches one plug at a time), so the files written by the generators still come from
+#build_power_strip, and the topology is meant for previews and parameter sweeps.
+#The basis is checked against one more strip when it is made, so a geometry that stops being
+#affine in its dimensions is reported instead of being cached.
+#The cache key holds the plug templates and their metadata, so editing a template or
+#registering a plug again invalidates the entries that used it.
+#Every level of detail of the plugs has its own topology, the previews use a simplified one.
+
+from collections import OrderedDict
+
+import numpy as np
+
+from mesh_generator import PARAMETER_LIMITS, build_power_strip, check_strip_parameters, plug_slots
+from plug_registry import get_plug
+from template_cache import template_key
+
+#Order of the dimensions in the basis
+PARAMETERS = ('distance_between_plugs', 'lateral_gap', 'vertical_gap')
+
+#Largest difference allowed between the basis and the generator, relative to the strip size
+LINEARITY_TOLERANCE = 1e-9
+
+#Memory kept by the cached topologies, the least recently used ones are dropped first
+#(the last topology made is always kept)
+MAX_CACHE_BYTES = 256 * 2**20
+
+#Topologies already made by this process, by key
+_topologies = OrderedDict()
+
+class StripTopology:
+
+    #faces are 1-indexed, constant is the (V, 3) vertex array of all the dimensions at 0,
+    #slopes a list of (axis, index of the dimension in PARAMETERS, slope of every vertex)
+    def __init__(self, faces, constant, slopes):
+        self.faces = faces
+        self.constant = constant
+        self.slopes = slopes
+        for array in [faces, constant] + [slope for _, _, slope in slopes]:
+            array.flags.writeable = False
+
+    @property
+    def vertex_count(self):
+        return len(self.constant)
+
+    @property
+    def nbytes(self):
+        return self.faces.nbytes + self.constant.nbytes + sum(slope.nbytes for _, _, slope in self.slopes)
+
+    #Vertices of the strip for one set of dimensions
+    def vertices(self, distance_between_plugs, lateral_gap, vertical_gap):
+        return self.vertices_many([[distance_between_plugs, lateral_gap, vertical_gap]])[0]
+
+    #Vertices of the strip for many sets of dimensions, one row of parameters per strip,
+    #shape (len(parameters), vertex_count, 3)
+    def vertices_many(self, parameters):
+        parameters = np.atleast_2d(np.asarray(parameters, dtype=np.float64))
+        vertices = np.repeat(self.constant[None], len(parameters), axis=0)
+        for axis, parameter, slope in self.slopes:
+            vertices[:, :, axis] += parameters[:, parameter, None] * slope
+        return vertices
+
+    #Same (vertices, faces) as build_power_strip, the faces are shared and read-only
+    def build(self, distance_between_plugs, lateral_gap, vertical_gap):
+        return self.vertices(distance_between_plugs, lateral_gap, vertical_gap), self.faces
+
+    def __repr__(self):
+        return f'StripTopology({self.vertex_count} vertices, {len(self.faces)} faces)'
+
+#Key of the topology of a strip, changes when a template or a plug definition changes
+def topology_key(num_plugs, plug_type, lod=0):
+    names, slots = plug_slots(num_plugs, plug_type)
+    plugs = []
+    for name in names:
+        plug = get_plug(name)
+        plugs.append((name, template_key(plug.model_path), tuple(plug.connector_indices), plug.height, plug.offset))
+    return tuple(plugs), tuple(slots), lod
+
+#Faces and basis of a strip, from strips built at the lower limits of the dimensions
+#and one step along each dimension
+def make_topology(num_plugs, plug_type, lod=0):
+    low = np.array([PARAMETER_LIMITS[name][0] for name in PARAMETERS], dtype=np.float64)
+    high = np.array([PARAMETER_LIMITS[name][1] for name in PARAMETERS], dtype=np.float64)
+
+    origin, faces = build_power_strip(num_plugs, plug_type, *low, lod)
+    constant = np.array(origin, dtype=np.float64)
+    slopes = []
+    for parameter in range(len(PARAMETERS)):
+        point = low.copy()
+        point[parameter] = high[parameter]
+        vertices, point_faces = build_power_strip(num_plugs, plug_type, *point, lod)
+        if not np.array_equal(point_faces, faces):
+            raise ValueError('Invalid topology, the faces of the strip depend on its dimensions')
+        for axis in range(3):
+            slope = (vertices[:, axis] - origin[:, axis]) / (high[parameter] - low[parameter])
+            if slope.any():
+                constant[:, axis] -= low[parameter] * slope
+                slopes.append((axis, parameter, slope))
+    topology = StripTopology(np.array(faces, dtype=np.int64), constant, slopes)
+
+    #Check the basis on a strip it was not made from
+    middle = (low + high) / 2
+    expected, _ = build_power_strip(num_plugs, plug_type, *middle, lod)
+    error = np.abs(topology.vertices(*middle) - expected).max(initial=0)
+    if error > LINEARITY_TOLERANCE * max(np.abs(expected).max(initial=0), 1):
+        raise ValueError('Invalid topology, the strip is not affine in its dimensions')
+    return topology
+
+#Cached topology of a strip, plug_type is a plug name or the list of slot types,
+#lod the level of detail of the plugs
+def strip_topology(num_plugs, plug_type, lod=0):
+    key = topology_key(num_plugs, plug_type, lod)
+    topology = _topologies.get(key)
+    if topology is None:
+        topology = make_topology(num_plugs, plug_type, lod)
+        _topologies[key] = topology
+        while sum(cached.nbytes for cached in _topologies.values()) > MAX_CACHE_BYTES and len(_topologies) > 1:
+            _topologies.popitem(last=False)
+    else:
+        _topologies.move_to_end(key)
+    return topology
+
+#Same as build_power_strip, evaluated on the cached topology
+def reparameterize_power_strip(num_plugs, plug_type, distance_between_plugs=5, lateral_gap=5, vertical_gap=5, lod=0):
+    check_strip_parameters(num_plugs, distance_between_plugs, lateral_gap, vertical_gap)
+    return strip_topology(num_plugs, plug_type, lod).build(distance_between_plugs, lateral_gap, vertical_gap)
+
+#Forget the topologies made by this process
+def clear_topology_cache():
+    _topologies.clear()
@@ -0,0 +1,179 @@
+#Cache for the parsed plug templates
+
+#Parsing an OBJ file line by line is slow compared to the rest of the generation,
+#so every template is parsed once per process and kept in memory.
+#The parsed arrays are also stored on disk as .npy files, which later processes
+#memory-map instead of parsing the OBJ again.
+
+#The cache key is built from the absolute path, size and modification time of
+#the source OBJ, so editing a template invalidates its cache entry automatically.
+
+#Simplified versions of the templates (levels of detail) are cached the same way, for the
+#previews and the light exports. Level 0 is the template itself, level n keeps about
+#LOD_FACE_RATIOS[n] of its faces. The locked vertices (the connectors of a plug) and the open
+#boundary of the template are kept as they are, so the simplified plugs join the shell exactly
+#like the full ones. All the levels of a template are made by one run of mesh_simplify.
+
+import hashlib
+import os
+
+import numpy as np
+
+from mesh_simplify import SIMPLIFIER_VERSION, simplify_levels
+from obj_io import read_obj
+
+#Default folder for the cached templates, can be changed with DM3D_TEMPLATE_CACHE
+CACHE_DIR = os.environ.get('DM3D_TEMPLATE_CACHE',
+                           os.path.join(os.path.dirname(os.path.abspath(__file__)), '.template_cache'))
+
+#Share of the faces kept by every level of detail, level 0 is the full template
+LOD_FACE_RATIOS = (1, 0.5, 0.25, 0.125)
+
+#Smallest number of faces of a level of detail, below it small templates turn inside out
+MIN_LOD_FACES = 48
+
+#Templates already loaded by this process, indexed by source key
+_templates = {}
+
+#Levels of detail already made by this process, indexed by source key and locked vertices
+_lods = {}
+
+#Build the key identifying the current version of an OBJ file
+def template_key(file_path):
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    return file_path, stat.st_size, stat.st_mtime_ns
+
+#Paths of the .npy files for a given key, suffix tells the levels of detail apart
+def _cache_paths(key, cache_dir, suffix=''):
+    file_path, size, mtime = key
+    digest = hashlib.sha1(f'{file_path}|{size}|{mtime}'.encode()).hexdigest()[:16]
+    stem = os.path.splitext(os.path.basename(file_path))[0].replace(' ', '_')
+    base = os.path.join(cache_dir, f'{stem}-{digest}{suffix}')
+    return base + '.vertices.npy', base + '.faces.npy'
+
+#Save an array so that other processes never see a partially written file
+def _save_atomic(file_path, array):
+    tmp_path = f'{file_path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as file:
+        np.save(file, array)
+    os.replace(tmp_path, file_path)
+
+#Read the template from the disk cache, or parse the OBJ and store it there
+def _load_from_disk(key, cache_dir):
+    vertices_path, faces_path = _cache_paths(key, cache_dir)
+    try:
+        #Plain array views on the mapping, the memmap subclass is slow to index
+        return (np.asarray(np.load(vertices_path, mmap_mode='r')),
+                np.asarray(np.load(faces_path, mmap_mode='r')))
+    except (OSError, ValueError):
+        pass
+
+    vertices, faces = read_obj(key[0])
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        _save_atomic(vertices_path, vertices)
+        _save_atomic(faces_path, faces)
+    except OSError:
+        #A read-only cache folder only costs the parsing time
+        pass
+    return vertices, faces
+
+#Load a template as (vertices, faces) arrays
+#The arrays are shared between calls, so they are returned read-only
+def load_template(file_path, cache_dir=None, use_disk=True):
+    key = template_key(file_path)
+    template = _templates.get(key)
+    if template is None:
+        if use_disk:
+            vertices, faces = _load_from_disk(key, cache_dir or CACHE_DIR)
+        else:
+            vertices, faces = read_obj(key[0])
+        for array in (vertices, faces):
+            if array.flags.writeable:
+                array.flags.writeable = False
+        template = (vertices, faces)
+        _templates[key] = template
+    return template
+
+#Check a level of detail
+def check_lod(lod):
+    if isinstance(lod, bool) or not isinstance(lod, (int, np.integer)) or not 0 <= lod < len(LOD_FACE_RATIOS):
+        raise ValueError(f'Invalid level of detail, must be an integer between 0 and {len(LOD_FACE_RATIOS) - 1}')
+
+#Suffix of the cache files of a level of detail, changes with the locked vertices, the ratios
+#and the version of the simplifier
+def _lod_suffix(level, locked):
+    description = f'{tuple(locked)}|{LOD_FACE_RATIOS}|{MIN_LOD_FACES}|{SIMPLIFIER_VERSION}'
+    digest = hashlib.sha1(description.encode()).hexdigest()[:8]
+    return f'.lod{level}-{digest}'
+
+#Simplify a template to all its levels of detail, as a list of (vertices, faces, locked indices)
+def _make_lods(vertices, faces, locked):
+    targets = [max(int(len(faces) * ratio), MIN_LOD_FACES) for ratio in LOD_FACE_RATIOS[1:]]
+    locked = np.asarray(locked, dtype=np.int64)
+    return [(lod_vertices, lod_faces, new_index[locked - 1] + 1)
+            for lod_vertices, lod_faces, new_index in simplify_levels(vertices, faces, targets, locked)]
+
+#Read the levels of detail from the disk cache, or make them and store them there
+def _load_lods_from_disk(key, locked, vertices, faces, cache_dir):
+    paths = [_cache_paths(key, cache_dir, _lod_suffix(level, locked)) for level in range(1, len(LOD_FACE_RATIOS))]
+    try:
+        #The locked vertices are stored first, see _store_lod
+        return [(np.asarray(np.load(vertices_path, mmap_mode='r')), np.asarray(np.load(faces_path, mmap_mode='r')),
+                 np.arange(1, len(locked) + 1)) for vertices_path, faces_path in paths]
+    except (OSError, ValueError):
+        pass
+
+    lods = [_store_lod(*lod) for lod in _make_lods(vertices, faces, locked)]
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        for (vertices_path, faces_path), (lod_vertices, lod_faces, _) in zip(paths, lods):
+            _save_atomic(vertices_path, lod_vertices)
+            _save_atomic(faces_path, lod_faces)
+    except OSError:
+        pass
+    return lods
+
+#Move the locked vertices of a level first, in the order of locked, so their indices are 1 to 8
+#and do not need to be stored with the level
+def _store_lod(vertices, faces, locked):
+    order = np.concatenate((locked - 1, np.setdiff1d(np.arange(len(vertices)), locked - 1)))
+    new_index = np.empty(len(vertices), dtype=np.int64)
+    new_index[order] = np.arange(len(vertices))
+    return vertices[order], (new_index[faces - 1] + 1).astype(faces.dtype), np.arange(1, len(locked) + 1)
+
+#Load a level of detail of a template as (vertices, faces, locked indices) arrays
+#locked are the (1-indexed) template vertices to keep, the returned indices are their
+#indices in the simplified template, in the same order
+#Level 0 is the template of load_template, the arrays are shared and read-only
+def load_template_lod(file_path, lod, locked=(), cache_dir=None, use_disk=True):
+    check_lod(lod)
+    vertices, faces = load_template(file_path, cache_dir, use_disk)
+    if lod == 0:
+        return vertices, faces, np.asarray(locked, dtype=np.int64)
+
+    key = (template_key(file_path), tuple(int(index) for index in locked))
+    lods = _lods.get(key)
+    if lods is None:
+        if use_disk:
+            lods = _load_lods_from_disk(key[0], key[1], vertices, faces, cache_dir or CACHE_DIR)
+        else:
+            lods = [_store_lod(*lod) for lod in _make_lods(vertices, faces, key[1])]
+        for level in lods:
+            for array in level:
+                if array.flags.writeable:
+                    array.flags.writeable = False
+        _lods[key] = lods
+    return lods[lod - 1]
+
+#Forget the templates loaded by this process, and optionally the disk cache
+def clear_template_cache(disk=False, cache_dir=None):
+    _templates.clear()
+    _lods.clear()
+    if disk:
+        cache_dir = cache_dir or CACHE_DIR
+        if os.path.isdir(cache_dir):
+            for name in os.listdir(cache_dir):
+                if name.endswith('.npy'):
+                    os.remove(os.path.join(cache_dir, name))
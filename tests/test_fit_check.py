@@ -0,0 +1,55 @@
+import numpy as np
+
+import fit_check
+from fit_check import check_fit, close_pairs, triangle_distances
+
+def test_default_strip_fits():
+    report = check_fit(4, 'European', 5, 5, 5)
+    assert report.fits
+    assert report.intersecting_pairs == 0
+    assert report.offending_slots == []
+    assert np.isclose(report.clearance, 2.0)
+
+def test_outline_difference_does_not_decide_the_fit():
+    report = check_fit(2, 'European', 5, 5, 5)
+    assert not report.covers
+    assert report.fits
+    assert report.to_dict()['fits']
+
+def test_plugs_pushed_into_the_enclosure_interfere(monkeypatch):
+    #A thinner plate lowers the plug bodies through the floor of the enclosure
+    monkeypatch.setattr(fit_check, 'SHELL_THICKNESS', -30)
+    report = check_fit(3, ['European', 'American', 'European'], 5, 5, 5)
+    assert not report.fits
+    assert report.clearance == 0
+    assert report.intersecting_pairs > 0
+    assert report.offending_slots == [0, 1, 2]
+    assert len(report.listed_pairs) == min(report.intersecting_pairs, fit_check.MAX_LISTED_PAIRS)
+    assert 'DOES NOT FIT' in report.summary()
+
+def test_required_clearance_above_the_actual_one():
+    report = check_fit(2, 'American', 5, 5, 5, min_clearance=3)
+    assert not report.fits
+    assert report.intersecting_pairs == 0
+    assert report.offending_slots == [0, 1]
+
+def test_triangle_distances():
+    triangle = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float64)
+    above = triangle + [0, 0, 2]
+    crossing = np.array([[0.2, 0.2, -1], [0.2, 0.2, 1], [5, 5, 0.5]], dtype=np.float64)
+    beside = triangle + [3, 0, 0]
+    distances = triangle_distances(np.array([triangle] * 3), np.array([above, crossing, beside]))
+    assert np.allclose(distances, [2, 0, 2])
+
+def test_copies_give_the_same_pairs_as_the_triangles():
+    #Two translated copies of a tetrahedron against a wall and a floor
+    shape = np.array([[[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 0, 0], [0, 1, 0], [0, 0, 1]],
+                      [[0, 0, 0], [0, 0, 1], [1, 0, 0]], [[1, 0, 0], [0, 0, 1], [0, 1, 0]]], dtype=np.float64)
+    a = np.concatenate((shape + [0, 0.5, 0.5], shape + [3, 0.5, 0.25]))
+    groups = np.repeat([0, 1], len(shape))
+    b = np.array([[[-5, 0, -5], [20, 0, -5], [-5, 0, 20]], [[-5, -5, 0], [-5, 20, 0], [20, -5, 0]]], dtype=np.float64)
+    plain = close_pairs(a, b, 0.3, 2, groups=groups)
+    copies = close_pairs(a, b, 0.3, 2, groups=groups, shapes=[0, 0])
+    for expected, actual in zip(plain[:3], copies[:3]):
+        assert np.array_equal(expected, actual)
+    assert plain[3][2] == copies[3][2] == 0.25
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+import template_cache
+from mesh_generator import build_power_strip
+from mesh_simplify import simplify_levels, simplify_mesh
+from mesh_validation import validate_mesh
+from regular_prism import prism
+
+@pytest.fixture
+def empty_template_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(template_cache, 'CACHE_DIR', str(tmp_path))
+    template_cache.clear_template_cache()
+    yield tmp_path
+    template_cache.clear_template_cache()
+
+def test_simplified_prism_stays_closed():
+    vertices, faces, _ = prism(2, 5, 64)
+    for target in (200, 100, 48):
+        simple_vertices, simple_faces, _ = simplify_mesh(vertices, faces, target)
+        assert len(simple_faces) < len(faces)
+        report = validate_mesh(simple_vertices, simple_faces)
+        assert report.is_valid, report.summary()
+
+def test_locked_vertices_are_kept():
+    vertices, faces, _ = prism(2, 5, 32)
+    locked = [1, 2, 3, 40]
+    levels = simplify_levels(vertices, faces, [64, 32], locked)
+    previous = len(faces)
+    for simple_vertices, simple_faces, new_index in levels:
+        assert len(simple_faces) < previous
+        previous = len(simple_faces)
+        assert np.all(new_index[np.array(locked) - 1] >= 0)
+        assert np.array_equal(simple_vertices[new_index[np.array(locked) - 1]], vertices[np.array(locked) - 1])
+
+@pytest.mark.parametrize('plug_type', ['European', 'American'])
+def test_levels_of_detail_stay_watertight(plug_type, empty_template_cache):
+    full_faces = len(build_power_strip(2, plug_type)[1])
+    previous = full_faces
+    for lod in range(1, len(template_cache.LOD_FACE_RATIOS)):
+        vertices, faces = build_power_strip(2, plug_type, lod=lod)
+        #Small templates stop at MIN_LOD_FACES, so the last levels can be the same
+        assert len(faces) <= previous
+        previous = len(faces)
+        report = validate_mesh(vertices, faces)
+        assert report.is_valid, f'lod {lod}: {report.summary()}'
+    assert previous < full_faces
+
+def test_cached_levels_match_the_fresh_ones(empty_template_cache):
+    fresh = build_power_strip(2, 'European', lod=2)
+    assert any(name.endswith('.npy') for name in map(str, empty_template_cache.iterdir()))
+    template_cache.clear_template_cache()
+    cached = build_power_strip(2, 'European', lod=2)
+    assert np.array_equal(fresh[0], cached[0])
+    assert np.array_equal(fresh[1], cached[1])
+
+def test_invalid_level_of_detail():
+    with pytest.raises(ValueError):
+        build_power_strip(2, 'European', lod=len(template_cache.LOD_FACE_RATIOS))
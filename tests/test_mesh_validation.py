@@ -0,0 +1,59 @@
+import numpy as np
+
+from mesh_generator import build_bottom_enclosure, build_power_strip
+from mesh_validation import count_duplicate_vertices, validate_mesh
+
+#Unit cube, 1-indexed faces pointing outwards
+CUBE_VERTICES = np.array([[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0],
+                          [0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]], dtype=np.float64)
+CUBE_FACES = np.array([[1, 3, 2], [1, 4, 3], [5, 6, 7], [5, 7, 8], [1, 2, 6], [1, 6, 5],
+                       [2, 3, 7], [2, 7, 6], [3, 4, 8], [3, 8, 7], [4, 1, 5], [4, 5, 8]])
+
+def test_closed_cube_is_valid():
+    report = validate_mesh(CUBE_VERTICES, CUBE_FACES)
+    assert report.is_valid
+    assert np.isclose(report.volume, 1)
+
+def test_open_mesh_is_not_watertight():
+    report = validate_mesh(CUBE_VERTICES, CUBE_FACES[:-1])
+    assert not report.is_watertight
+    assert report.boundary_edges == 3
+
+def test_edge_shared_by_three_faces_is_non_manifold():
+    vertices = np.vstack((CUBE_VERTICES, [[0.5, 0.5, -1]]))
+    #A fin on the edge 1-2 of the bottom face
+    faces = np.vstack((CUBE_FACES, [[1, 2, 9]]))
+    report = validate_mesh(vertices, faces)
+    assert not report.is_watertight
+    assert report.non_manifold_edges == 1
+    assert report.boundary_edges == 2
+
+def test_flipped_face_is_inconsistent():
+    faces = CUBE_FACES.copy()
+    faces[0] = faces[0, ::-1]
+    report = validate_mesh(CUBE_VERTICES, faces)
+    assert report.is_watertight
+    assert report.inconsistent_edges == 3
+    assert not report.is_valid
+
+def test_inside_out_mesh_is_invalid():
+    report = validate_mesh(CUBE_VERTICES, CUBE_FACES[:, ::-1])
+    assert report.volume < 0
+    assert not report.is_valid
+
+def test_degenerate_and_invalid_faces_are_reported():
+    faces = np.vstack((CUBE_FACES, [[1, 1, 2], [1, 2, 42]]))
+    report = validate_mesh(CUBE_VERTICES, faces)
+    assert report.degenerate_faces == 1
+    assert report.invalid_indices == 1
+
+def test_duplicate_vertices():
+    vertices = np.vstack((CUBE_VERTICES, CUBE_VERTICES[:3], [[-0.0, 0, 0]], [[1e-9, 1, 1]]))
+    assert count_duplicate_vertices(vertices) == 4
+    assert count_duplicate_vertices(vertices, tolerance=1e-6) == 5
+
+def test_generated_meshes_are_valid():
+    for vertices, faces in (build_power_strip(3, 'European'), build_power_strip(2, ['American', 'European']),
+                            build_bottom_enclosure(3, 5, 5, 5)):
+        report = validate_mesh(vertices, faces)
+        assert report.is_valid, report.summary()
@@ -0,0 +1,40 @@
+import numpy as np
+
+from mesh_generator import build_power_strip
+from mesh_validation import validate_mesh
+from mesh_welding import weld_map, weld_mesh
+
+from test_mesh_validation import CUBE_FACES, CUBE_VERTICES
+
+def test_triangle_soup_is_welded_back():
+    soup = CUBE_VERTICES[CUBE_FACES - 1].reshape(-1, 3)
+    faces = np.arange(1, len(soup) + 1).reshape(-1, 3)
+    assert not validate_mesh(soup, faces).is_watertight
+
+    vertices, welded, report = weld_mesh(soup, faces)
+    assert len(vertices) == 8
+    assert report['merged_vertices'] == len(soup) - 8
+    assert validate_mesh(vertices, welded).is_valid
+    #Same triangles as before, on the merged vertices
+    assert np.array_equal(vertices[welded - 1], soup.reshape(-1, 3, 3))
+
+def test_first_vertex_of_a_group_is_kept():
+    vertices = np.array([[1, 2, 3], [0, 0, 0], [1, 2, 3], [-0.0, 0, 0], [1, 2, 3 + 1e-9]])
+    assert weld_map(vertices).tolist() == [0, 1, 0, 1, 0]
+    assert weld_map(vertices, tolerance=0).tolist() == [0, 1, 0, 1, 4]
+
+def test_faces_collapsed_by_the_weld_are_dropped():
+    vertices = np.vstack((CUBE_VERTICES, [[1, 0, 1e-9]]))
+    #A sliver between vertices 1, 2 and a copy of 2
+    faces = np.vstack((CUBE_FACES, [[1, 2, 9]]))
+    vertices, welded, report = weld_mesh(vertices, faces)
+    assert report['degenerate_faces'] == 1
+    assert report['vertices_after'] == 8
+    assert validate_mesh(vertices, welded).is_valid
+
+def test_welded_strip_is_unchanged():
+    vertices, faces = build_power_strip(2, 'European')
+    welded_vertices, welded_faces, report = weld_mesh(vertices, faces)
+    assert report['merged_vertices'] == 0
+    assert np.array_equal(welded_vertices, vertices)
+    assert np.array_equal(welded_faces, faces)
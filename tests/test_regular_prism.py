@@ -0,0 +1,32 @@
+import numpy as np
+import pytest
+
+from mesh_validation import validate_mesh
+from regular_prism import prism, prisms
+
+@pytest.mark.parametrize('sides', [3, 4, 6, 32])
+def test_prism_is_closed_and_points_outwards(sides):
+    vertices, faces, normals = prism(2, 3, sides, position=(1, 2, 3), angles=(30, 45, 60))
+    assert len(vertices) == 2 * sides + 2
+    assert len(faces) == 4 * sides
+    report = validate_mesh(vertices, faces)
+    assert report.is_valid, report.summary()
+    #Area of the regular polygon times the height
+    assert np.isclose(report.volume, 0.5 * sides * 4 * np.sin(2 * np.pi / sides) * 3)
+
+def test_normals_follow_the_winding():
+    vertices, faces, normals = prism(1, 2, 8, angles=(10, 20, 30))
+    triangles = vertices[faces - 1]
+    cross = np.cross(triangles[:, 1] - triangles[:, 0], triangles[:, 2] - triangles[:, 0])
+    assert np.allclose(cross / np.linalg.norm(cross, axis=1)[:, None], normals)
+
+def test_many_prisms_in_one_mesh():
+    vertices, faces, _ = prisms(radius=[1, 1, 2], height=3, sides=[6, 8, 32],
+                                position=[[0, 0, 0], [5, 0, 0], [10, 0, 0]])
+    assert len(faces) == 4 * (6 + 8 + 32)
+    assert validate_mesh(vertices, faces).is_valid
+
+@pytest.mark.parametrize('arguments', [(1, 1, 2), (1, 1, 4.5), (0, 1, 6), (1, -1, 6)])
+def test_invalid_prisms_are_refused(arguments):
+    with pytest.raises(ValueError):
+        prism(*arguments)
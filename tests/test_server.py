@@ -0,0 +1,92 @@
+import asyncio
+import json
+import re
+
+import pytest
+
+from server import GenerationServer, parse_parameters
+
+#Stream writer that keeps what the server sends
+class FakeWriter:
+
+    def __init__(self):
+        self.data = bytearray()
+        self.closed = False
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+@pytest.fixture
+def server():
+    server = GenerationServer(workers=1, use_threads=True)
+    yield server
+    server.close()
+
+#Send raw requests to the server, returns the status line of every response and the whole output
+def exchange(server, data, limit=1 << 16):
+    async def run():
+        reader = asyncio.StreamReader(limit=limit)
+        reader.feed_data(data)
+        reader.feed_eof()
+        writer = FakeWriter()
+        await server.handle_connection(reader, writer)
+        assert writer.closed
+        return bytes(writer.data)
+    output = asyncio.run(run())
+    return [line.decode() for line in re.findall(rb'HTTP/1\.1 \d{3} [^\r]*', output)], output
+
+@pytest.mark.parametrize('raw', [
+    {'num_plugs': 'two'},
+    {'num_plugs': 0},
+    {'num_plugs': 2.5},
+    {'num_plugs': True},
+    {'lateral_gap': -100},
+    {'distance_between_plugs': 'nan'},
+    {'plug_type': 'Martian'},
+    {'plug_type': ['European', 'Martian'], 'num_plugs': 2},
+    {'part': 'side'},
+    {'format': 'dxf'},
+    {'precision': -1},
+])
+def test_invalid_parameters_are_refused(raw):
+    with pytest.raises(ValueError):
+        parse_parameters(raw)
+
+def test_default_parameters():
+    parameters, part, file_format, precision = parse_parameters({'num_plugs': '3', 'lateral_gap': '7.5'})
+    assert parameters['num_plugs'] == 3
+    assert parameters['lateral_gap'] == 7.5
+    assert (part, file_format, precision) == ('top', 'obj', None)
+
+def test_bad_query_gets_400(server):
+    statuses, output = exchange(server, b'GET /generate?num_plugs=3&lateral_gap=-100 HTTP/1.1\r\n\r\n')
+    assert statuses == ['HTTP/1.1 400 Bad Request']
+    assert b'lateral' in output.lower()
+
+def test_bad_json_body_gets_400(server):
+    body = json.dumps(['not', 'an', 'object']).encode()
+    request = b'POST /generate HTTP/1.1\r\nContent-Length: %d\r\n\r\n%s' % (len(body), body)
+    statuses, _ = exchange(server, request + b'POST /generate HTTP/1.1\r\nContent-Length: 5\r\n\r\n{nope')
+    assert statuses == ['HTTP/1.1 400 Bad Request'] * 2
+
+def test_malformed_requests(server):
+    assert exchange(server, b'GET\r\n\r\n')[0] == ['HTTP/1.1 400 Bad Request']
+    assert exchange(server, b'POST /generate HTTP/1.1\r\nContent-Length: -3\r\n\r\n')[0] == ['HTTP/1.1 400 Bad Request']
+    assert exchange(server, b'GET /missing HTTP/1.1\r\n\r\n')[0] == ['HTTP/1.1 404 Not Found']
+
+def test_oversized_header_gets_431(server):
+    request = b'GET /health HTTP/1.1\r\nCookie: ' + b'x' * 4096 + b'\r\n\r\n'
+    statuses, _ = exchange(server, request, limit=1024)
+    assert statuses == ['HTTP/1.1 431 Request Header Fields Too Large']
+
+def test_valid_request_after_a_bad_one(server):
+    statuses, output = exchange(server, b'GET /generate?num_plugs=0 HTTP/1.1\r\n\r\n'
+                                        b'GET /generate?num_plugs=1&part=bottom HTTP/1.1\r\nConnection: close\r\n\r\n')
+    assert statuses == ['HTTP/1.1 400 Bad Request', 'HTTP/1.1 200 OK']
+    assert b'filename="output_bottom.obj"' in output